@@ -0,0 +1,235 @@
+import io
+import sys
+import time
+import wave
+
+import numpy as np
+
+from loop_generator import DRUM_MAP, TICKS_PER_BEAT
+import note_events
+
+# --- PRÉVIA DE ÁUDIO (SÍNTESE VETORIZADA COM NUMPY) ---
+
+DEFAULT_SAMPLE_RATE = 22050
+WAVETABLE_SIZE = 2048
+
+def _wavetable(harmonics: list[float]) -> np.ndarray:
+    """Uma forma de onda de um período, somando harmônicos com as amplitudes dadas (síntese aditiva)."""
+    phase = np.arange(WAVETABLE_SIZE) / WAVETABLE_SIZE
+    k = np.arange(1, len(harmonics) + 1)[:, np.newaxis]
+    table = (np.asarray(harmonics)[:, np.newaxis] * np.sin(2 * np.pi * k * phase)).sum(axis=0)
+    return (table / np.abs(table).max()).astype(np.float32)
+
+# Baixo: dente-de-serra com poucos harmônicos (som "filtrado"); piano: fundamental forte e harmônicos pares suaves
+BASS_TABLE = _wavetable([1.0, 0.5, 0.33, 0.2, 0.1, 0.05])
+PIANO_TABLE = _wavetable([1.0, 0.35, 0.2, 0.08, 0.05, 0.03, 0.02])
+
+# Timbres de bateria indexados pelas notas de DRUM_MAP
+# tone_hz / sweep_hz: seno com queda de afinação; noise: mistura de ruído; highpass: ruído "brilhante"
+DRUM_VOICES = {
+    DRUM_MAP['kick']: {'length': 0.30, 'decay': 0.080, 'tone_hz': 50.0, 'sweep_hz': 110.0, 'noise': 0.05, 'highpass': False, 'gain': 1.0},
+    DRUM_MAP['snare']: {'length': 0.20, 'decay': 0.050, 'tone_hz': 185.0, 'sweep_hz': 0.0, 'noise': 0.70, 'highpass': False, 'gain': 0.7},
+    DRUM_MAP['closed_hat']: {'length': 0.06, 'decay': 0.015, 'tone_hz': 0.0, 'sweep_hz': 0.0, 'noise': 1.0, 'highpass': True, 'gain': 0.30},
+    DRUM_MAP['open_hat']: {'length': 0.30, 'decay': 0.100, 'tone_hz': 0.0, 'sweep_hz': 0.0, 'noise': 1.0, 'highpass': True, 'gain': 0.30},
+    DRUM_MAP['crash']: {'length': 1.00, 'decay': 0.400, 'tone_hz': 0.0, 'sweep_hz': 0.0, 'noise': 1.0, 'highpass': True, 'gain': 0.35},
+    DRUM_MAP['ride']: {'length': 0.50, 'decay': 0.200, 'tone_hz': 2400.0, 'sweep_hz': 0.0, 'noise': 0.6, 'highpass': True, 'gain': 0.25},
+}
+
+# Quantas versões de cada golpe de bateria (com ruídos diferentes) são sintetizadas
+DRUM_VARIANTS = 8
+
+def _segments(lengths: np.ndarray):
+    """
+    Para N segmentos concatenados, devolve (índice_do_segmento, amostra_local) por amostra.
+    É o que permite sintetizar todas as notas de uma vez, sem laço em Python.
+    """
+    total = int(lengths.sum())
+    owner = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+    offsets = (np.cumsum(lengths) - lengths).astype(np.int32)
+    local = np.arange(total, dtype=np.int32) - offsets[owner]
+    return owner, local
+
+def _place(length: int, templates: np.ndarray, template_offsets: np.ndarray, which: np.ndarray,
+           starts: np.ndarray, lengths: np.ndarray, gains: np.ndarray) -> np.ndarray:
+    """
+    Soma, em um buffer de `length` amostras, uma cópia do modelo which[i] (de `templates`, concatenados)
+    em starts[i], com lengths[i] amostras e ganho gains[i]. Tudo com operações sobre arrays e um único bincount.
+    """
+    if len(starts) == 0:
+        return np.zeros(length)
+    offsets = np.cumsum(lengths) - lengths
+    ramp = np.arange(int(lengths.sum()), dtype=np.int64)
+    positions = np.repeat(starts - offsets, lengths) + ramp
+    values = templates[np.repeat(template_offsets[which] - offsets, lengths) + ramp]
+    values *= np.repeat(gains.astype(np.float32), lengths)
+    return np.bincount(positions, weights=values, minlength=length)[:length]
+
+def _render_tonal(length, events, table, sample_rate, seconds_per_tick, decay, release, gain):
+    starts = np.round(events['start'] * seconds_per_tick * sample_rate).astype(np.int64)
+    held = np.round((events['end'] - events['start']) * seconds_per_tick * sample_rate).astype(np.int64)
+    release_len = int(release * sample_rate)
+    # Depois de ~5 constantes de tempo a nota já é inaudível: não vale a pena sintetizá-la
+    lengths = np.minimum(held + release_len, int(5 * decay * sample_rate))
+
+    # Notas com a mesma altura e duração soam iguais (a menos da dinâmica): cada combinação
+    # distinta é sintetizada uma única vez como "modelo", e as notas só copiam o modelo escalado
+    combo = events['note'].astype(np.int64) << 32 | held
+    unique_combo, which = np.unique(combo, return_inverse=True)
+    first = np.zeros(len(unique_combo), dtype=np.int64)
+    first[which[::-1]] = np.arange(len(which))[::-1]
+    template_lengths = lengths[first]
+    template_owner, template_local = _segments(template_lengths)
+
+    t = template_local.astype(np.float32) / sample_rate
+    freq = (440.0 * 2.0 ** ((events['note'][first] - 69) / 12) * WAVETABLE_SIZE / sample_rate).astype(np.float32)
+    index = (freq[template_owner] * template_local.astype(np.float32)).astype(np.int32) & (WAVETABLE_SIZE - 1)
+    # Ataque curto, queda exponencial e soltura linear depois do note_off
+    envelope = np.minimum(t / 0.005, 1.0) * np.exp(-t / decay)
+    envelope *= np.clip(1.0 - (template_local - held[first][template_owner]) / release_len, 0.0, 1.0)
+    templates = (table[index] * envelope * (gain / 127.0)).astype(np.float32)
+    template_offsets = np.cumsum(template_lengths) - template_lengths
+
+    return _place(length, templates, template_offsets, which, starts, lengths, events['velocity'])
+
+def _render_drums(length, events, sample_rate, seconds_per_tick, rng):
+    out = np.zeros(length)
+    for note, voice in DRUM_VOICES.items():
+        hits = events[events['note'] == note]
+        if len(hits) == 0:
+            continue
+        starts = np.round(hits['start'] * seconds_per_tick * sample_rate).astype(np.int64)
+        hit_length = int(voice['length'] * sample_rate)
+
+        # O timbre é sintetizado uma vez, em algumas variantes de ruído sorteadas por golpe
+        t = np.arange(hit_length, dtype=np.float32) / sample_rate
+        tone = np.zeros(hit_length, dtype=np.float32)
+        if voice['tone_hz']:
+            # Frequência decai de tone_hz + sweep_hz para tone_hz; a fase é a integral analítica
+            tau = voice['decay'] / 2
+            phase = voice['tone_hz'] * t + voice['sweep_hz'] * tau * (1.0 - np.exp(-t / tau))
+            tone += np.sin(2 * np.pi * phase)
+        noise = rng.standard_normal((DRUM_VARIANTS, hit_length + 1)).astype(np.float32)
+        noise = np.diff(noise, axis=1) * 0.5 if voice['highpass'] else noise[:, 1:]
+        variants = (tone + voice['noise'] * noise) * (np.exp(-t / voice['decay']) * voice['gain'] / 127.0)
+
+        which = rng.integers(0, DRUM_VARIANTS, len(hits))
+        template_offsets = np.arange(DRUM_VARIANTS) * hit_length
+        out += _place(length, variants.astype(np.float32).ravel(), template_offsets, which,
+                      starts, np.full(len(hits), hit_length, dtype=np.int64), hits['velocity'])
+    return out
+
+def _render_track(name: str, events: np.ndarray, duration_ticks: int, seconds_per_tick: float, sample_rate: int, rng) -> np.ndarray:
+    # Folga no fim para as caudas das notas que começam perto do final
+    length = int(duration_ticks * seconds_per_tick * sample_rate) + 4 * sample_rate
+    if len(events) == 0:
+        return np.zeros(length)
+    if name == 'drums':
+        return _render_drums(length, events, sample_rate, seconds_per_tick, rng)
+    if name == 'bass':
+        return _render_tonal(length, events, BASS_TABLE, sample_rate, seconds_per_tick, decay=0.35, release=0.03, gain=0.6)
+    return _render_tonal(length, events, PIANO_TABLE, sample_rate, seconds_per_tick, decay=0.60, release=0.08, gain=0.25)
+
+def _loop_events(events: np.ndarray, loop_ticks: int, total_ticks: int) -> np.ndarray:
+    """Repete as notas do loop até cobrir total_ticks."""
+    events = events[events['start'] < loop_ticks]
+    repeats = -(-total_ticks // loop_ticks)
+    if repeats > 1 and len(events):
+        shift = np.repeat(np.arange(repeats, dtype=np.int64) * loop_ticks, len(events))
+        events = np.tile(events, repeats)
+        events['start'] += shift
+        events['end'] += shift
+    return events[events['start'] < total_ticks]
+
+def _period_bars(events: np.ndarray, bars: int) -> int:
+    """
+    Menor número de compassos p com que a trilha se repete exatamente ao longo de toda a prévia.
+    Partes determinísticas (o piano, por exemplo) repetem a cada ciclo da progressão e só precisam
+    ser sintetizadas uma vez por ciclo.
+    """
+    bar_ticks = TICKS_PER_BEAT * 4
+    for period in range(1, bars):
+        shift = period * bar_ticks
+        head = events[events['start'] < (bars - period) * bar_ticks]
+        tail = events[events['start'] >= shift]
+        if len(head) != len(tail):
+            continue
+        if (np.array_equal(head['start'] + shift, tail['start']) and np.array_equal(head['end'] + shift, tail['end'])
+                and np.array_equal(head['note'], tail['note']) and np.array_equal(head['velocity'], tail['velocity'])):
+            return period
+    return bars
+
+def render_preview(tracks: dict, bpm: float, bars: int | None = None, loop_bars: int | None = None,
+                   sample_rate: int = DEFAULT_SAMPLE_RATE, seed: int | None = None) -> np.ndarray:
+    """
+    Renderiza baixo, piano e bateria em um sinal mono float32 (-1..1).
+
+    tracks: {'bass', 'piano', 'drums'} -> mido.MidiTrack (ou arrays de note_events).
+    bars: duração da prévia; se maior que o loop (loop_bars), o loop se repete até completar.
+    Cada trilha é sintetizada só pelo trecho que realmente se repete (o loop, ou um ciclo menor
+    dentro dele) e o áudio é replicado somando as caudas.
+    """
+    events = {name: track if isinstance(track, np.ndarray) else note_events.track_to_events(track)
+              for name, track in tracks.items()}
+    bar_ticks = TICKS_PER_BEAT * 4
+    if loop_bars is None:
+        last_end = max((int(e['end'].max()) for e in events.values() if len(e)), default=bar_ticks)
+        loop_bars = max(1, -(-last_end // bar_ticks))
+    bars = bars or loop_bars
+    seconds_per_tick = 60.0 / (bpm * TICKS_PER_BEAT)
+    rng = np.random.default_rng(seed)
+
+    total = int(bars * bar_ticks * seconds_per_tick * sample_rate)
+    out = np.zeros(total + 5 * sample_rate)
+    for name, track_events in events.items():
+        track_events = _loop_events(track_events, loop_bars * bar_ticks, bars * bar_ticks)
+        period = _period_bars(track_events, bars)
+        period_ticks = period * bar_ticks
+        period_events = track_events[track_events['start'] < period_ticks]
+        audio = _render_track(name, period_events, period_ticks, seconds_per_tick, sample_rate, rng)
+        period_samples = period_ticks * seconds_per_tick * sample_rate
+        for repeat in range(-(-bars // period)):
+            position = int(round(repeat * period_samples))
+            end = min(position + len(audio), len(out))
+            out[position:end] += audio[:end - position]
+    out = out[:total]
+
+    peak = np.abs(out).max() if total else 0.0
+    if peak > 1.0:
+        out /= peak
+    return out.astype(np.float32)
+
+def samples_to_wav_bytes(samples: np.ndarray, sample_rate: int = DEFAULT_SAMPLE_RATE) -> bytes:
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+def render_preview_wav(tracks: dict, bpm: float, bars: int | None = None, loop_bars: int | None = None,
+                       sample_rate: int = DEFAULT_SAMPLE_RATE, seed: int | None = None) -> bytes:
+    samples = render_preview(tracks, bpm, bars=bars, loop_bars=loop_bars, sample_rate=sample_rate, seed=seed)
+    return samples_to_wav_bytes(samples, sample_rate)
+
+def save_folder_preview(folder_path: str, output_path: str, bars: int | None = None,
+                        sample_rate: int = DEFAULT_SAMPLE_RATE) -> float:
+    """Renderiza a prévia de uma pasta de pack existente em output_path. Retorna o tempo de renderização (s)."""
+    tracks, bpm = note_events.load_pack_tracks(folder_path)
+    start = time.perf_counter()
+    wav_bytes = render_preview_wav(tracks, bpm, bars=bars, sample_rate=sample_rate)
+    elapsed = time.perf_counter() - start
+    with open(output_path, "wb") as f: f.write(wav_bytes)
+    return elapsed
+
+if __name__ == "__main__":
+    # Uso: python audio_preview.py <pasta_do_pack> [saida.wav] [compassos]
+    if len(sys.argv) < 2:
+        print("Uso: python audio_preview.py <pasta_do_pack> [saida.wav] [compassos]")
+        sys.exit(1)
+    folder = sys.argv[1]
+    output = sys.argv[2] if len(sys.argv) > 2 else f"{folder.rstrip('/')}_preview.wav"
+    preview_bars = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    elapsed = save_folder_preview(folder, output, bars=preview_bars)
+    print(f"Prévia de áudio salva em '{output}' ({elapsed * 1000:.0f} ms de renderização).")
@@ -0,0 +1,459 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import mido
+import numpy as np
+
+import loop_generator
+from loop_generator import TICKS_PER_BEAT
+import note_events
+
+# --- MODELO DE MARKOV PARA O BAIXO (N-GRAMAS + TABELAS DE ALIAS) ---
+
+MODEL_FORMAT_VERSION = 1
+DEFAULT_MODEL_PATH = "bass_model.npz"
+DEFAULT_ORDER = 3
+STEP_TICKS = TICKS_PER_BEAT // 4
+BAR_STEPS = 16
+# Durações possíveis de um evento, em semicolcheias
+DURATIONS = np.array([1, 2, 3, 4, 6, 8, 12, 16])
+# Intervalo da nota em relação à fundamental do compasso (na oitava 2), de -12 a +24; REST_CODE = pausa
+INTERVAL_MIN, INTERVAL_MAX = -12, 24
+REST_CODE = INTERVAL_MAX - INTERVAL_MIN + 1
+NUM_TOKENS = (REST_CODE + 1) * len(DURATIONS)
+# Nos contextos, 0 marca o início da sequência; os tokens entram como token + 1
+CONTEXT_BASE = NUM_TOKENS + 1
+# Maior order cujas chaves (posição + order-1 tokens em base CONTEXT_BASE, vezes NUM_TOKENS) cabem em int64
+MAX_ORDER = max(order for order in range(1, 64) if BAR_STEPS * CONTEXT_BASE ** (order - 1) * NUM_TOKENS < 2 ** 63)
+BASS_RANGE = (28, 64)
+BLUES_DEGREES = [0, 0, 0, 0, 3, 3, 0, 0, 4, 3, 0, 4]
+LILYPOND_DURATIONS = {1: '16', 2: '8', 3: '8.', 4: '4', 6: '4.', 8: '2', 12: '2.', 16: '1'}
+
+def bar_roots(style: str, key: str, scale: str, bars: int, progression: list) -> np.ndarray:
+    """Fundamental de cada compasso na oitava 2 (a progressão já expandida; no blues, a forma de 12 compassos)."""
+    if style == 'blues':
+        notes = loop_generator.get_scale_notes(key, 'major', octave=2)
+        return np.array([notes[BLUES_DEGREES[i % 12]] for i in range(bars)])
+    scale_notes = loop_generator.get_scale_notes(key, scale, octave=2)
+    return np.array([scale_notes[degree - 1] for degree, _ in progression[:bars]])
+
+def _heuristic_roots(starts: np.ndarray, notes: np.ndarray, bars: int) -> np.ndarray:
+    """Sem metadados (MIDIs externos): a fundamental de cada compasso é a primeira nota do compasso (ou a anterior)."""
+    roots = np.full(bars, notes[0] if len(notes) else 36)
+    bar_of = starts // (BAR_STEPS * STEP_TICKS)
+    first = np.unique(bar_of, return_index=True)
+    roots[first[0]] = notes[first[1]]
+    filled = np.maximum.accumulate(np.where(np.isin(np.arange(bars), first[0]), np.arange(bars), 0))
+    return roots[filled]
+
+def tokenize(starts: np.ndarray, ends: np.ndarray, notes: np.ndarray, roots: np.ndarray, sequence: np.ndarray):
+    """
+    Converte notas de várias sequências concatenadas (ordenadas por sequência e início) em tokens
+    (intervalo ou pausa, duração) e posições no compasso, tudo vetorizado. roots: fundamental de cada nota.
+    Retorna (tokens, posições, ids_de_sequência), com as pausas intercaladas.
+    """
+    if len(starts) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    s = np.rint(starts / STEP_TICKS).astype(np.int64)
+    e = np.maximum(np.rint(ends / STEP_TICKS).astype(np.int64), s + 1)
+    # Uma nota por início (a mais grave), ordenado por sequência e tempo
+    order = np.lexsort((notes, s, sequence))
+    s, e, notes, roots, sequence = s[order], e[order], notes[order], roots[order], sequence[order]
+    unique = np.ones(len(s), dtype=bool)
+    unique[1:] = (s[1:] != s[:-1]) | (sequence[1:] != sequence[:-1])
+    s, e, notes, roots, sequence = s[unique], e[unique], notes[unique], roots[unique], sequence[unique]
+
+    same_next = np.append(sequence[1:] == sequence[:-1], False)
+    next_start = np.where(same_next, np.append(s[1:], 0), e)
+    duration = np.clip(np.minimum(e, next_start) - s, 1, BAR_STEPS)
+    duration_code = np.searchsorted(DURATIONS, duration, side='right') - 1
+    interval = np.clip(notes.astype(np.int64) - roots, INTERVAL_MIN, INTERVAL_MAX) - INTERVAL_MIN
+    note_tokens = interval * len(DURATIONS) + duration_code
+
+    same_previous = np.insert(sequence[1:] == sequence[:-1], 0, False)
+    previous_end = np.where(same_previous, np.insert(s[:-1] + DURATIONS[duration_code[:-1]], 0, 0), 0)
+    gap = s - previous_end
+    has_rest = gap > 0
+    rest_duration = np.searchsorted(DURATIONS, np.minimum(gap[has_rest], BAR_STEPS), side='right') - 1
+    rest_tokens = REST_CODE * len(DURATIONS) + rest_duration
+
+    tokens = np.concatenate([note_tokens, rest_tokens])
+    positions = np.concatenate([s % BAR_STEPS, previous_end[has_rest] % BAR_STEPS])
+    times = np.concatenate([s, previous_end[has_rest]])
+    sequences = np.concatenate([sequence, sequence[has_rest]])
+    order = np.lexsort((times, sequences))
+    return tokens[order], positions[order], sequences[order]
+
+def check_order(order: int):
+    if not 1 <= order <= MAX_ORDER:
+        raise ValueError(f"order deve estar entre 1 e {MAX_ORDER} (acima disso as chaves dos contextos não cabem em int64).")
+
+def count_ngrams(tokens: np.ndarray, positions: np.ndarray, sequences: np.ndarray, order: int) -> list[tuple[np.ndarray, np.ndarray]]:
+    """
+    Conta (contexto, próximo_token) para contextos de 0 a order-1 tokens anteriores, mais a posição no compasso.
+    Retorna, por tamanho de contexto, (chaves combinadas contexto * NUM_TOKENS + token, contagens).
+    """
+    check_order(order)
+    tables = []
+    context = positions.astype(np.int64)
+    weight = BAR_STEPS
+    for length in range(order):
+        combined = context * NUM_TOKENS + tokens
+        keys, counts = np.unique(combined, return_counts=True)
+        tables.append((keys, counts))
+        # Acrescenta mais um token anterior (0 no início da sequência)
+        shifted = np.zeros(len(tokens), dtype=np.int64)
+        valid = np.zeros(len(tokens), dtype=bool)
+        valid[length + 1:] = sequences[length + 1:] == sequences[:-(length + 1)] if len(tokens) > length + 1 else False
+        shifted[length + 1:] = tokens[:-(length + 1)] + 1 if len(tokens) > length + 1 else 0
+        context = context + np.where(valid, shifted, 0) * weight
+        weight *= CONTEXT_BASE
+    return tables
+
+def _merge_tables(a: list, b: list) -> list:
+    merged = []
+    for (keys_a, counts_a), (keys_b, counts_b) in zip(a, b):
+        keys, inverse = np.unique(np.concatenate([keys_a, keys_b]), return_inverse=True)
+        merged.append((keys, np.bincount(inverse, weights=np.concatenate([counts_a, counts_b])).astype(np.int64)))
+    return merged
+
+def _build_alias(probabilities: list[float]) -> tuple[list[float], list[int]]:
+    """Método de Vose: cada sorteio vira um índice uniforme e uma comparação, em tempo constante."""
+    n = len(probabilities)
+    scaled = [p * n for p in probabilities]
+    prob, alias = [1.0] * n, list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1.0]
+    large = [i for i, p in enumerate(scaled) if p >= 1.0]
+    while small and large:
+        lesser, greater = small.pop(), large.pop()
+        prob[lesser], alias[lesser] = scaled[lesser], greater
+        scaled[greater] -= 1.0 - scaled[lesser]
+        (small if scaled[greater] < 1.0 else large).append(greater)
+    return prob, alias
+
+class BassModel:
+    """
+    Modelo de n-gramas do baixo: cada evento é (intervalo em relação à fundamental do compasso ou pausa,
+    duração), e o contexto é a posição no compasso mais os order-1 eventos anteriores. Contextos nunca
+    vistos recuam para contextos menores (até só a posição no compasso).
+
+    As contagens são gravadas em um .npz compacto; as tabelas de alias são montadas ao carregar, então
+    cada sorteio custa O(1), independente de quantos tokens o contexto tem.
+    """
+
+    def __init__(self, tables: list, order: int = DEFAULT_ORDER):
+        self.order = order
+        self.tables = tables
+        self._alias = None
+
+    @property
+    def digest(self) -> str:
+        """Hash das contagens (entra na chave do cache de packs)."""
+        h = hashlib.sha256(str(self.order).encode())
+        for keys, counts in self.tables:
+            h.update(np.ascontiguousarray(keys, dtype=np.int64).tobytes())
+            h.update(np.ascontiguousarray(counts, dtype=np.int64).tobytes())
+        return h.hexdigest()[:16]
+
+    @property
+    def ngram_count(self) -> int:
+        return int(len(self.tables[-1][0]))
+
+    def save(self, path: str = DEFAULT_MODEL_PATH):
+        arrays = {'format': np.array(MODEL_FORMAT_VERSION), 'order': np.array(self.order)}
+        for length, (keys, counts) in enumerate(self.tables):
+            arrays[f"keys_{length}"] = keys.astype(np.int64)
+            arrays[f"counts_{length}"] = counts.astype(np.uint32)
+        with open(path, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_MODEL_PATH) -> "BassModel":
+        with np.load(path) as data:
+            if int(data['format']) != MODEL_FORMAT_VERSION:
+                raise ValueError(f"Formato de modelo {int(data['format'])} não suportado.")
+            order = int(data['order'])
+            tables = [(data[f"keys_{length}"], data[f"counts_{length}"].astype(np.int64)) for length in range(order)]
+        return cls(tables, order)
+
+    def _alias_tables(self) -> list:
+        """Por tamanho de contexto: {contexto: (início, tamanho)} e os arrays planos de tokens, prob e alias."""
+        if self._alias is None:
+            self._alias = []
+            for keys, counts in self.tables:
+                contexts, tokens = keys // NUM_TOKENS, (keys % NUM_TOKENS).tolist()
+                unique, starts = np.unique(contexts, return_index=True)
+                bounds = np.append(starts, len(keys)).tolist()
+                counts = counts.tolist()
+                prob, alias, index = [], [], {}
+                for context, start, end in zip(unique.tolist(), bounds[:-1], bounds[1:]):
+                    total = sum(counts[start:end])
+                    group_prob, group_alias = _build_alias([c / total for c in counts[start:end]])
+                    prob.extend(group_prob)
+                    alias.extend(start + a for a in group_alias)
+                    index[context] = (start, end - start)
+                self._alias.append((index, tokens, prob, alias))
+        return self._alias
+
+    def sample_token(self, position: int, history: list[int], uniform) -> int:
+        """Sorteia o próximo token: contexto mais longo conhecido, tabela de alias, O(1). uniform() -> [0, 1)."""
+        tables = self._alias_tables()
+        # No início da sequência, os eventos que faltam valem 0 na chave, como no treino
+        for length in range(self.order - 1, -1, -1):
+            context, weight = position, BAR_STEPS
+            for previous in reversed(history[-length:] if length else []):
+                context += (previous + 1) * weight
+                weight *= CONTEXT_BASE
+            index, tokens, prob, alias = tables[length]
+            found = index.get(context)
+            if found is not None:
+                start, size = found
+                slot = start + int(uniform() * size)
+                return tokens[slot] if uniform() < prob[slot] else tokens[alias[slot]]
+        return REST_CODE * len(DURATIONS) + 3
+
+    def generate(self, roots: np.ndarray, rng: np.random.Generator, velocity_range=(85, 105)) -> list[tuple[int, int, int, int]]:
+        """
+        Gera um baixo para os compassos de `roots` (fundamentais na oitava 2).
+        Retorna [(início, duração, nota ou None, dinâmica), ...] em semicolcheias; nenhuma nota cruza a barra.
+        """
+        bars = len(roots)
+        total = bars * BAR_STEPS
+        # Números aleatórios sorteados de uma vez: dois por evento no máximo, mais as dinâmicas
+        uniforms = iter(rng.random(4 * total + 8).tolist())
+        velocities = iter(rng.integers(velocity_range[0], velocity_range[1] + 1, total).tolist())
+        uniform = uniforms.__next__
+        events, history, cursor = [], [], 0
+        while cursor < total:
+            position = cursor % BAR_STEPS
+            token = self.sample_token(position, history, uniform)
+            history.append(token)
+            code, duration = divmod(token, len(DURATIONS))
+            duration = min(int(DURATIONS[duration]), BAR_STEPS - position)
+            if code == REST_CODE:
+                events.append((cursor, duration, None, 0))
+            else:
+                note = int(roots[cursor // BAR_STEPS]) + code + INTERVAL_MIN
+                while note < BASS_RANGE[0]: note += 12
+                while note > BASS_RANGE[1]: note -= 12
+                events.append((cursor, duration, note, next(velocities)))
+            cursor += duration
+        return events
+
+    def generate_bass(self, roots: np.ndarray, rng: np.random.Generator) -> tuple[mido.MidiTrack, str]:
+        """Trilha MIDI e trecho LilyPond com as mesmas notas (o .ly transcreve exatamente o que foi sorteado)."""
+        events = self.generate(roots, rng)
+        track = mido.MidiTrack()
+        pending = 0
+        for _, duration, note, velocity in events:
+            if note is None:
+                pending += duration * STEP_TICKS
+                continue
+            track.append(mido.Message('note_on', note=note, velocity=velocity, time=pending))
+            track.append(mido.Message('note_off', note=note, velocity=64, time=duration * STEP_TICKS))
+            pending = 0
+        if pending:
+            track.append(mido.Message('note_on', note=1, velocity=0, time=pending))
+        return track, events_to_lilypond(events)
+
+def events_to_lilypond(events: list) -> str:
+    """Transcreve [(início, duração, nota, dinâmica), ...] em semicolcheias; durações fora da tabela viram notas ligadas."""
+    score = ""
+    for start, duration, note, _ in events:
+        pieces, remaining = [], duration
+        while remaining:
+            value = max(d for d in LILYPOND_DURATIONS if d <= remaining)
+            pieces.append(LILYPOND_DURATIONS[value])
+            remaining -= value
+        name = "r" if note is None else loop_generator.midi_to_lilypond(note)
+        score += (" " if note is None else "~ ").join(f"{name}{d}" for d in pieces) + " "
+        if (start + duration) % BAR_STEPS == 0:
+            score += "| "
+    return score
+
+# --- TREINO ---
+
+def _read_folder(path: str):
+    """(inícios, fins, notas, fundamentais por nota) do baixo de uma pasta de pack ou de um arquivo .mid."""
+    if os.path.isdir(path):
+        tracks, _ = note_events.load_pack_tracks(path)
+        events = note_events.track_to_events(tracks['bass'])
+        info_path = os.path.join(path, loop_generator.PACK_INFO_FILENAME)
+        bars = int(events['start'].max() // (BAR_STEPS * STEP_TICKS)) + 1 if len(events) else 0
+        if os.path.exists(info_path):
+            with open(info_path, encoding='utf-8') as f:
+                info = json.load(f)
+            roots = bar_roots(info['style'], info['key'], info['scale'], info['bars'], info['progression'])
+            bars = len(roots)
+        else:
+            roots = _heuristic_roots(events['start'], events['note'], bars)
+    else:
+        mid = mido.MidiFile(path)
+        scale = TICKS_PER_BEAT / mid.ticks_per_beat
+        candidates = [note_events.track_to_events(track) for track in mid.tracks]
+        candidates = [e[e['channel'] != 9] for e in candidates]
+        candidates = [e for e in candidates if len(e)]
+        if not candidates:
+            return None
+        # A trilha mais grave é tratada como baixo
+        events = min(candidates, key=lambda e: np.median(e['note']))
+        events = events.copy()
+        events['start'] = np.rint(events['start'] * scale)
+        events['end'] = np.rint(events['end'] * scale)
+        bars = int(events['start'].max() // (BAR_STEPS * STEP_TICKS)) + 1
+        roots = _heuristic_roots(events['start'], events['note'], bars)
+    if len(events) == 0 or len(roots) == 0:
+        return None
+    bar_of = np.minimum(events['start'] // (BAR_STEPS * STEP_TICKS), len(roots) - 1)
+    return events['start'], events['end'], events['note'], roots[bar_of]
+
+def _read_batch(paths: list[str]):
+    starts, ends, notes, roots, sequence = [], [], [], [], []
+    for i, path in enumerate(paths):
+        try:
+            item = _read_folder(path)
+        except (OSError, ValueError, KeyError, EOFError) as e:
+            print(f"Ignorando '{path}': {e}")
+            continue
+        if item is None:
+            continue
+        for target, values in zip((starts, ends, notes, roots), item):
+            target.append(np.asarray(values, dtype=np.int64))
+        sequence.append(np.full(len(item[0]), i, dtype=np.int64))
+    if not starts:
+        return None
+    return tuple(np.concatenate(values) for values in (starts, ends, notes, roots, sequence))
+
+def _dataset_batches(path: str):
+    """Lê um dataset de dataset_export shard a shard, sem passar pelo mido (o caminho mais rápido para treinos grandes)."""
+    with open(os.path.join(path, "manifest.json"), encoding='utf-8') as f:
+        manifest = json.load(f)
+    bass_track = manifest['tracks'].index('bass')
+    for shard in manifest['shards']:
+        events = np.load(os.path.join(path, f"{shard['name']}.events.npy"))
+        index = np.load(os.path.join(path, f"{shard['name']}.index.npy"))
+        loop_of = np.repeat(np.arange(len(index)), index['event_count'])
+        is_bass = events['track'] == bass_track
+        events, loop_of = events[is_bass], loop_of[is_bass]
+        # Fundamentais por combinação distinta de estilo/tonalidade/escala/progressão
+        combos, combo_of_loop = np.unique(index[['style', 'key', 'scale', 'bars', 'progression']], return_inverse=True)
+        max_bars = int(index['bars'].max())
+        table = np.zeros((len(combos), max_bars), dtype=np.int64)
+        for c, combo in enumerate(combos):
+            style, key, scale = manifest['styles'][combo['style']], manifest['keys'][combo['key']], manifest['scales'][combo['scale']]
+            progression = []
+            if style != 'blues':
+                progression, _ = loop_generator.parse_progression_string(str(combo['progression']))
+            progression = loop_generator.expand_progression(progression, int(combo['bars']))
+            roots = bar_roots(style, key, scale, int(combo['bars']), progression)
+            table[c, :len(roots)] = roots
+        bar_of = np.minimum(events['start'] // (BAR_STEPS * STEP_TICKS), max_bars - 1)
+        roots = table[combo_of_loop.ravel()[loop_of], bar_of]
+        yield (events['start'].astype(np.int64), events['end'].astype(np.int64), events['note'].astype(np.int64), roots, loop_of)
+
+def train(inputs: list[str], order: int = DEFAULT_ORDER, workers: int | None = None, batch_size: int = 256) -> BassModel:
+    """
+    Treina um BassModel a partir de pastas de packs (com pack_info.json, as fundamentais vêm da progressão),
+    arquivos .mid avulsos (fundamental = primeira nota de cada compasso), diretórios contendo esses itens ou
+    datasets de dataset_export (manifest.json). A leitura dos MIDIs é dividida entre processos; a tokenização
+    e a contagem de n-gramas são vetorizadas por lote.
+    """
+    check_order(order)
+    paths, datasets = [], []
+    for item in inputs:
+        if os.path.isdir(item) and os.path.exists(os.path.join(item, "manifest.json")):
+            datasets.append(item)
+        elif os.path.isdir(item) and not glob.glob(os.path.join(item, "*_full_mix.mid")):
+            paths.extend(sorted(p for p in glob.glob(os.path.join(item, "*")) if os.path.isdir(p) or p.endswith('.mid')))
+        else:
+            paths.append(item)
+
+    def batches():
+        chunks = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+        if (workers or os.cpu_count() or 1) <= 1 or len(chunks) <= 1:
+            yield from (_read_batch(chunk) for chunk in chunks)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                yield from executor.map(_read_batch, chunks)
+        for dataset in datasets:
+            yield from _dataset_batches(dataset)
+
+    tables = None
+    for batch in batches():
+        if batch is None:
+            continue
+        counted = count_ngrams(*tokenize(*batch), order)
+        tables = counted if tables is None else _merge_tables(tables, counted)
+    if tables is None:
+        raise ValueError("Nenhuma linha de baixo encontrada nas entradas.")
+    return BassModel(tables, order)
+
+@lru_cache(maxsize=4)
+def _load_cached(path: str, mtime: float) -> BassModel:
+    return BassModel.load(path)
+
+def resolve_model(model=None) -> tuple[BassModel | None, str | None]:
+    """Aceita um BassModel ou o caminho de um .npz (padrão: DEFAULT_MODEL_PATH). Retorna (modelo, None) ou (None, erro)."""
+    if isinstance(model, BassModel):
+        return model, None
+    path = model or DEFAULT_MODEL_PATH
+    if not os.path.exists(path):
+        return None, f"Modelo de baixo '{path}' não encontrado. Treine com: python bass_model.py train <pastas_de_packs>"
+    try:
+        return _load_cached(path, os.path.getmtime(path)), None
+    except (OSError, ValueError, KeyError) as e:
+        return None, f"Não foi possível carregar o modelo de baixo '{path}': {e}"
+
+def _order_argument(value: str) -> int:
+    try:
+        order = int(value)
+        check_order(order)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e) if value.lstrip('-').isdigit() else f"order inválido: '{value}'")
+    return order
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Modelo de Markov (n-gramas) para linhas de baixo.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    train_parser = sub.add_parser('train', help="treina a partir de pastas de packs, .mid ou datasets")
+    train_parser.add_argument('inputs', nargs='+')
+    train_parser.add_argument('--out', default=DEFAULT_MODEL_PATH)
+    train_parser.add_argument('--order', type=_order_argument, default=DEFAULT_ORDER, help="tamanho do n-grama (contexto = order-1 eventos)")
+    train_parser.add_argument('--workers', type=int)
+    sample_parser = sub.add_parser('sample', help="mede a amostragem e mostra um baixo gerado")
+    sample_parser.add_argument('model', nargs='?', default=DEFAULT_MODEL_PATH)
+    sample_parser.add_argument('--bars', type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    if args.command == 'train':
+        started = time.perf_counter()
+        model = train(args.inputs, order=args.order, workers=args.workers)
+        model.save(args.out)
+        print(f"Modelo treinado em {time.perf_counter() - started:.2f}s: {model.ngram_count} n-gramas, "
+              f"{os.path.getsize(args.out) / 1024:.1f} KB em '{args.out}'.")
+        return
+    model, error = resolve_model(args.model)
+    if error:
+        print(f"Erro: {error}")
+        sys.exit(1)
+    started = time.perf_counter()
+    model._alias_tables()
+    built = time.perf_counter() - started
+    roots = bar_roots('funk', 'E', 'minor', args.bars, loop_generator.expand_progression([(1, 'minor'), (4, 'minor'), (5, 'dominant7'), (1, 'minor')], args.bars))
+    started = time.perf_counter()
+    events = model.generate(roots, np.random.default_rng(0))
+    elapsed = time.perf_counter() - started
+    print(f"Tabelas de alias em {built * 1000:.1f} ms; {len(events)} eventos em {elapsed * 1000:.1f} ms "
+          f"({elapsed / len(events) * 1e6:.1f} µs/evento).")
+    print(events_to_lilypond(events[:24]))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
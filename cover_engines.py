@@ -0,0 +1,378 @@
+import math
+import random
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from loop_generator import COVER_REFERENCE_SIZE, STYLE_PALETTES
+import loop_generator
+
+# --- MOTORES DE ARTE DA CAPA (RUÍDO, FLUXO, VORONOI E RETÍCULA) ---
+
+COVER_ENGINES = ('blobs', 'noise', 'flow', 'voronoi')
+COVER_OVERLAYS = ('halftone', 'grain')
+# engine='style' usa o motor e o acabamento de cada estilo
+STYLE_COVER_ENGINES = {
+    'rock': ('voronoi', 'grain'),
+    'funk': ('flow', None),
+    'jazz': ('noise', 'halftone'),
+    'blues': ('flow', 'grain'),
+    'reggae': ('voronoi', 'halftone'),
+}
+# Orçamentos (segundos por imagem) usados pelo benchmark; em cover_export, 'budget' aceita um número ou {tamanho: segundos}
+DEFAULT_BUDGETS = {800: 0.25, 3000: 2.0}
+# Tamanhos em que o custo de cada motor é medido (uma vez por processo) para respeitar o orçamento
+CALIBRATION_SIZES = (160, 320)
+# Fração do orçamento usada na estimativa (a medição é curta e o custo por pixel cresce um pouco em tamanhos grandes)
+BUDGET_MARGIN = 0.8
+# Menor resolução de renderização aceita quando o orçamento é curto (a imagem é ampliada depois)
+MIN_RENDER_SIZE = 200
+# Elementos float32 por faixa de linhas: limita a memória intermediária em capas de 3000x3000
+BAND_ELEMENTS = 1 << 22
+
+FLOW_PARTICLES = 1200
+FLOW_STEPS = 64
+FLOW_STEP = 0.005
+VORONOI_LINE = 0.004
+HALFTONE_CELLS = 120
+GRAIN_SIGMA = 10.0
+
+def _rngs(seed: int) -> tuple[random.Random, np.random.Generator]:
+    # Todos os sorteios vêm do seed e são feitos em coordenadas relativas: a mesma arte em qualquer tamanho
+    return random.Random(seed), np.random.default_rng(seed)
+
+def _palette(style: str, rng: random.Random) -> np.ndarray:
+    palette = list(STYLE_PALETTES.get(style, [(0, 0, 0), (255, 255, 255)]))
+    rng.shuffle(palette)
+    return np.array(palette, dtype=np.float32)
+
+def palette_lut(palette: np.ndarray, steps: int = 256) -> np.ndarray:
+    """Gradiente contínuo passando pelas cores da paleta, na ordem: tabela (steps, 3) em float32."""
+    positions = np.linspace(0, 1, len(palette))
+    t = np.linspace(0, 1, steps)
+    return np.stack([np.interp(t, positions, palette[:, channel]) for channel in range(3)], axis=1).astype(np.float32)
+
+def _bands(height: int, width: int, depth: int = 1):
+    rows = max(1, BAND_ELEMENTS // (width * depth))
+    for start in range(0, height, rows):
+        yield start, min(start + rows, height)
+
+def _output(out: np.ndarray | None, width: int, height: int) -> np.ndarray:
+    # Os motores escrevem em out quando recebem um (ex.: uma view de memória compartilhada, veja cover_shm)
+    return np.empty((height, width, 3), dtype=np.uint8) if out is None else out
+
+def _smoothstep(t: np.ndarray) -> np.ndarray:
+    return t * t * (3 - 2 * t)
+
+# --- RUÍDO DE VALOR (fBm) ---
+
+def _lattices(nprng: np.random.Generator, base_cells: int, octaves: int, persistence: float = 0.5) -> list[tuple]:
+    """Grades de valores aleatórios de cada oitava: [(células, valores (c+1)x(c+1), amplitude)], amplitudes somando 1."""
+    amplitudes = np.array([persistence ** octave for octave in range(octaves)], dtype=np.float32)
+    amplitudes /= amplitudes.sum()
+    return [(base_cells << octave, nprng.random(((base_cells << octave) + 1,) * 2, dtype=np.float32), amplitude)
+            for octave, amplitude in enumerate(amplitudes)]
+
+def _axis_weights(start: int, end: int, pixels: int, cells: int) -> np.ndarray:
+    """Pesos da interpolação suave (smoothstep) de cada pixel [start, end) nos nós da grade: matriz (n, cells + 1)."""
+    t = (np.arange(start, end, dtype=np.float32) + 0.5) * (cells / pixels)
+    index = np.minimum(t.astype(np.int64), cells - 1)
+    fraction = _smoothstep(t - index)
+    weights = np.zeros((end - start, cells + 1), dtype=np.float32)
+    rows = np.arange(end - start)
+    weights[rows, index] = 1 - fraction
+    weights[rows, index + 1] = fraction
+    return weights
+
+def value_noise(lattices: list[tuple], width: int, height: int, row_start: int = 0, row_end: int | None = None) -> np.ndarray:
+    """
+    fBm de ruído de valor nas linhas [row_start, row_end). A interpolação é separável, então cada oitava é
+    Wy @ valores @ Wx.T, e todas as oitavas saem de um único produto de matrizes (valores de 0 a 1).
+    """
+    row_end = height if row_end is None else row_end
+    left = np.hstack([_axis_weights(row_start, row_end, height, cells) @ (values * amplitude) for cells, values, amplitude in lattices])
+    right = np.hstack([_axis_weights(0, width, width, cells) for cells, _, _ in lattices])
+    return left @ right.T
+
+def noise_at(lattices: list[tuple], x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """O mesmo fBm de value_noise avaliado em pontos soltos (coordenadas relativas 0..1, fora disso é limitado à borda)."""
+    total = np.zeros(x.shape, dtype=np.float32)
+    for cells, values, amplitude in lattices:
+        tx, ty = np.clip(x, 0, 1) * cells, np.clip(y, 0, 1) * cells
+        ix, iy = np.minimum(tx.astype(np.int64), cells - 1), np.minimum(ty.astype(np.int64), cells - 1)
+        fx, fy = _smoothstep(tx - ix), _smoothstep(ty - iy)
+        top = values[iy, ix] * (1 - fx) + values[iy, ix + 1] * fx
+        bottom = values[iy + 1, ix] * (1 - fx) + values[iy + 1, ix + 1] * fx
+        total += amplitude * (top * (1 - fy) + bottom * fy)
+    return total
+
+# --- MOTORES ---
+
+def render_blobs(style: str, seed: int, width: int, height: int, out: np.ndarray | None = None) -> np.ndarray:
+    """O campo de gradientes original (loop_generator.render_cover_field)."""
+    img = _output(out, width, height)
+    loop_generator.render_cover_field_into(img, loop_generator.cover_blobs(style, "", 0, seed))
+    return img
+
+def render_noise(style: str, seed: int, width: int, height: int, out: np.ndarray | None = None) -> np.ndarray:
+    """Faixas de cor seguindo as curvas de nível de um fBm, sombreadas por um segundo fBm."""
+    rng, nprng = _rngs(seed)
+    lut = palette_lut(_palette(style, rng))
+    field = _lattices(nprng, rng.choice((2, 3, 4)), 6)
+    shade = _lattices(nprng, rng.choice((3, 4)), 3)
+    bands = rng.uniform(1.5, 4.0)
+    img = _output(out, width, height)
+    for start, end in _bands(height, width, 3):
+        # Onda triangular: as faixas voltam pelo gradiente em vez de cortar da última cor para a primeira
+        position = 1 - np.abs((value_noise(field, width, height, start, end) * 2 * bands) % 2 - 1)
+        light = np.clip(0.45 + 1.2 * (value_noise(shade, width, height, start, end) - 0.25), 0.35, 1.2)
+        img[start:end] = np.clip(lut[(position * 255).astype(np.uint8)] * light[:, :, np.newaxis], 0, 255)
+    return img
+
+def _box_blur(a: np.ndarray, radius: int) -> np.ndarray:
+    """Média em uma janela (2r+1)x(2r+1), com somas acumuladas (custo independente do raio)."""
+    size = 2 * radius + 1
+    for axis in (0, 1):
+        padding = [(0, 0), (0, 0)]
+        padding[axis] = (radius + 1, radius)
+        sums = np.cumsum(np.pad(a, padding), axis=axis, dtype=np.float32)
+        head = [slice(None), slice(None)]
+        tail = [slice(None), slice(None)]
+        head[axis], tail[axis] = slice(size, None), slice(0, a.shape[axis])
+        a = (sums[tuple(head)] - sums[tuple(tail)]) / size
+    return a
+
+def render_flow(style: str, seed: int, width: int, height: int, out: np.ndarray | None = None) -> np.ndarray:
+    """
+    Rastros de partículas que seguem um campo de direções (ângulo = fBm), sobre um fundo escuro de ruído.
+    Todas as partículas andam juntas (um passo vetorizado por iteração); os rastros são acumulados com
+    bincount e engrossados com um box blur proporcional ao tamanho da imagem.
+    """
+    rng, nprng = _rngs(seed)
+    palette = _palette(style, rng)
+    background = _lattices(nprng, 2, 4)
+    angles = _lattices(nprng, rng.choice((2, 3)), 3)
+    turns = rng.uniform(1.5, 3.0)
+    scale = min(width, height)
+
+    position = nprng.random((FLOW_PARTICLES, 2), dtype=np.float32) * 1.2 - 0.1
+    colors = palette[nprng.integers(len(palette), size=FLOW_PARTICLES)] * nprng.uniform(0.8, 1.2, (FLOW_PARTICLES, 1))
+    path = np.empty((FLOW_STEPS + 1, FLOW_PARTICLES, 2), dtype=np.float32)
+    path[0] = position
+    for step in range(FLOW_STEPS):
+        angle = noise_at(angles, position[:, 0], position[:, 1]) * (2 * math.pi * turns)
+        position = position + FLOW_STEP * np.stack([np.cos(angle), np.sin(angle)], axis=1)
+        path[step + 1] = position
+
+    # Pontos intermediários de cada segmento, com espaçamento de ~1 pixel, e peso que entra e sai ao longo do rastro
+    samples = max(1, math.ceil(FLOW_STEP * scale))
+    t = (np.arange(samples, dtype=np.float32) + 0.5) / samples
+    points = path[:-1, :, np.newaxis] + (path[1:] - path[:-1])[:, :, np.newaxis] * t[:, np.newaxis]
+    taper = np.sin(np.pi * (np.arange(FLOW_STEPS, dtype=np.float32) + 0.5) / FLOW_STEPS)
+    weight = np.broadcast_to(taper[:, np.newaxis, np.newaxis], points.shape[:3]) * (FLOW_STEP * scale / samples)
+    px, py = (points[..., 0] * width).astype(np.int64), (points[..., 1] * height).astype(np.int64)
+    inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+    flat, weight = (py * width + px)[inside], weight[inside]
+    color_index = np.broadcast_to(np.arange(FLOW_PARTICLES)[np.newaxis, :, np.newaxis], points.shape[:3])[inside]
+
+    radius = max(1, round(scale / COVER_REFERENCE_SIZE * 1.5))
+    coverage = _box_blur(np.bincount(flat, weight, height * width).astype(np.float32).reshape(height, width), radius)
+    alpha = (1 - np.exp(-0.9 * coverage * (2 * radius + 1)))[:, :, np.newaxis]
+    img = np.empty((height, width, 3), dtype=np.float32)
+    for channel in range(3):
+        sums = np.bincount(flat, weight * colors[color_index, channel], height * width).astype(np.float32)
+        img[:, :, channel] = _box_blur(sums.reshape(height, width), radius)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        img = np.where(coverage[:, :, np.newaxis] > 1e-6, img / coverage[:, :, np.newaxis], 0)
+
+    lut = palette_lut(palette) * 0.35
+    result = _output(out, width, height)
+    for start, end in _bands(height, width, 3):
+        back = lut[(np.clip(value_noise(background, width, height, start, end), 0, 1) * 255).astype(np.uint8)]
+        result[start:end] = np.clip(back * (1 - alpha[start:end]) + img[start:end] * alpha[start:end], 0, 255)
+    return result
+
+def render_voronoi(style: str, seed: int, width: int, height: int, out: np.ndarray | None = None) -> np.ndarray:
+    """Células de Voronoi com cor por célula, sombreadas pela distância ao centro e contornadas nas fronteiras."""
+    rng, nprng = _rngs(seed)
+    palette = _palette(style, rng)
+    count = rng.randint(12, 36)
+    scale = min(width, height)
+    centers = nprng.random((count, 2), dtype=np.float32) * np.array([width, height], dtype=np.float32) / scale
+    colors = palette[nprng.integers(len(palette), size=count)] * nprng.uniform(0.7, 1.15, (count, 1)).astype(np.float32)
+    line_color = palette[np.argmin(palette.sum(axis=1))] * 0.5
+    cell = 1 / math.sqrt(count)
+
+    x = (np.arange(width, dtype=np.float32) + 0.5) / scale
+    dx2 = (x[np.newaxis, :] - centers[:, 0:1]) ** 2
+    img = _output(out, width, height)
+    for start, end in _bands(height, width, 3):
+        y = (np.arange(start, end, dtype=np.float32) + 0.5) / scale
+        dy2 = (y[np.newaxis, :] - centers[:, 1:2]) ** 2
+        # As duas menores distâncias e o centro mais próximo, um centro por vez (sem o array centros x pixels)
+        first = np.full((end - start, width), np.inf, dtype=np.float32)
+        second = first.copy()
+        nearest = np.zeros((end - start, width), dtype=np.intp)
+        for index in range(count):
+            dist = dy2[index][:, np.newaxis] + dx2[index]
+            closer = dist < first
+            np.minimum(second, np.where(closer, first, dist), out=second)
+            np.minimum(first, dist, out=first)
+            nearest[closer] = index
+        first, second = np.sqrt(first), np.sqrt(second)
+        shade = 1.05 - 0.45 * np.clip(first / cell, 0, 1)
+        # d2 - d1 cresce com a distância até a fronteira entre as duas células mais próximas
+        edge = 1 - _smoothstep(np.clip((second - first) / VORONOI_LINE, 0, 1))
+        band = colors[nearest] * shade[:, :, np.newaxis]
+        band += (line_color - band) * edge[:, :, np.newaxis]
+        img[start:end] = np.clip(band, 0, 255)
+    return img
+
+ENGINE_RENDERERS = {'blobs': render_blobs, 'noise': render_noise, 'flow': render_flow, 'voronoi': render_voronoi}
+
+# --- ACABAMENTOS (APLICADOS NO TAMANHO FINAL) ---
+
+def overlay_halftone(img: np.ndarray, seed: int) -> np.ndarray:
+    """Retícula de pontos a 45°, com o raio de cada ponto proporcional ao escuro da imagem embaixo dele."""
+    height, width = img.shape[:2]
+    cell = max(4.0, min(width, height) / HALFTONE_CELLS)
+    x = np.arange(width, dtype=np.float32)
+    for start, end in _bands(height, width, 3):
+        y = np.arange(start, end, dtype=np.float32)[:, np.newaxis]
+        u, v = (x + y) / (math.sqrt(2) * cell), (x - y) / (math.sqrt(2) * cell)
+        dist = np.hypot(u - np.floor(u) - 0.5, v - np.floor(v) - 0.5)
+        band = img[start:end].astype(np.float32)
+        luminance = band @ np.array([0.299, 0.587, 0.114], dtype=np.float32) / 255
+        radius = 0.62 * np.sqrt(np.clip(1 - luminance, 0, 1))
+        # Borda do ponto suavizada em ~1 pixel
+        ink = np.clip((radius - dist) * cell + 0.5, 0, 1)
+        img[start:end] = np.clip(band * (1 - 0.6 * ink[:, :, np.newaxis]), 0, 255)
+    return img
+
+def overlay_grain(img: np.ndarray, seed: int) -> np.ndarray:
+    """Granulado monocromático (ruído gaussiano), sorteado pixel a pixel no tamanho final."""
+    height, width = img.shape[:2]
+    nprng = np.random.default_rng([seed, 1])
+    for start, end in _bands(height, width, 3):
+        grain = nprng.standard_normal((end - start, width), dtype=np.float32) * GRAIN_SIGMA
+        img[start:end] = np.clip(img[start:end] + grain[:, :, np.newaxis], 0, 255)
+    return img
+
+OVERLAY_RENDERERS = {'halftone': overlay_halftone, 'grain': overlay_grain}
+
+# --- ORÇAMENTO DE TEMPO ---
+
+_costs = {}
+
+def _measure(name: str, size: int) -> float:
+    started = time.perf_counter()
+    if name in OVERLAY_RENDERERS:
+        OVERLAY_RENDERERS[name](np.full((size, size, 3), 128, dtype=np.uint8), 0)
+    else:
+        ENGINE_RENDERERS[name]('rock', 0, size, size)
+    return time.perf_counter() - started
+
+def cost_model(name: str) -> tuple[float, float]:
+    """
+    (segundos fixos, segundos por pixel) de um motor ou acabamento, medidos uma vez por processo nos dois
+    CALIBRATION_SIZES (o fluxo, por exemplo, tem um custo fixo para mover as partículas).
+    """
+    if name not in _costs:
+        small, large = CALIBRATION_SIZES
+        small_seconds, large_seconds = _measure(name, small), _measure(name, large)
+        per_pixel = max(large_seconds - small_seconds, 1e-9) / (large * large - small * small)
+        _costs[name] = (max(small_seconds - per_pixel * small * small, 0.0), per_pixel)
+    return _costs[name]
+
+def estimated_seconds(name: str, size: int) -> float:
+    fixed, per_pixel = cost_model(name)
+    return fixed + per_pixel * size * size
+
+def budget_for(budget, size: int) -> float | None:
+    """
+    Orçamento em segundos para uma capa de `size` pixels. budget: número, ou {tamanho: segundos}; para um tamanho
+    fora do dicionário, o orçamento do tamanho mais próximo é escalado pelo número de pixels.
+    """
+    if budget is None or isinstance(budget, (int, float)):
+        return budget
+    budgets = {int(budget_size): float(seconds) for budget_size, seconds in budget.items()}
+    nearest = min(budgets, key=lambda budget_size: abs(budget_size - size))
+    return budgets[nearest] * (size / nearest) ** 2
+
+def render_size(engine: str, size: int, budget: float | None, overlay: str | None = None) -> int:
+    """Resolução em que o motor cabe no orçamento (descontado o acabamento, feito no tamanho final)."""
+    if budget is None:
+        return size
+    available = budget * BUDGET_MARGIN - (estimated_seconds(overlay, size) if overlay else 0)
+    fixed, per_pixel = cost_model(engine)
+    affordable = math.isqrt(int(max(available - fixed, 0) / per_pixel))
+    return max(min(size, affordable), min(size, MIN_RENDER_SIZE))
+
+def resolve_engine(style: str, engine: str = 'style', overlay: str | None = None) -> tuple[str, str | None]:
+    """engine='style' -> (motor, acabamento) de STYLE_COVER_ENGINES; overlay='none' desliga o acabamento do estilo."""
+    if engine == 'style':
+        engine, style_overlay = STYLE_COVER_ENGINES.get(style, ('blobs', None))
+        overlay = style_overlay if overlay is None else overlay
+    if overlay == 'none':
+        overlay = None
+    if engine not in ENGINE_RENDERERS:
+        raise ValueError(f"Motor de capa '{engine}' não existe. Use {', '.join(COVER_ENGINES)} ou 'style'.")
+    if overlay is not None and overlay not in OVERLAY_RENDERERS:
+        raise ValueError(f"Acabamento de capa '{overlay}' não existe. Use {', '.join(COVER_OVERLAYS)} ou 'none'.")
+    return engine, overlay
+
+def render_cover_into(out: np.ndarray, style: str, seed: int, engine: str = 'style', overlay: str | None = None,
+                      budget: float | None = None) -> np.ndarray:
+    """
+    Renderiza o fundo de capa direto em out (array (tamanho, tamanho, 3) uint8, pode ser uma view com strides).
+    Com budget (segundos), o motor renderiza em uma resolução menor quando o custo medido não cabe no orçamento,
+    e a imagem é ampliada (LANCZOS) antes do acabamento; nesse caso o resultado depende da velocidade da máquina.
+    """
+    size = out.shape[0]
+    engine, overlay = resolve_engine(style, engine, overlay)
+    internal = render_size(engine, size, budget, overlay)
+    if internal == size:
+        ENGINE_RENDERERS[engine](style, seed, size, size, out)
+    else:
+        small = Image.fromarray(ENGINE_RENDERERS[engine](style, seed, internal, internal), 'RGB')
+        out[...] = np.asarray(small.resize((size, size), Image.Resampling.LANCZOS))
+    if overlay:
+        OVERLAY_RENDERERS[overlay](out, seed)
+    return out
+
+def render_cover(style: str, seed: int, size: int, engine: str = 'style', overlay: str | None = None,
+                 budget: float | None = None) -> Image.Image:
+    """Fundo de capa (sem texto) size x size com o motor e o acabamento escolhidos (veja render_cover_into)."""
+    img = np.empty((size, size, 3), dtype=np.uint8)
+    return Image.fromarray(render_cover_into(img, style, seed, engine, overlay, budget), 'RGB')
+
+def benchmark(sizes=(COVER_REFERENCE_SIZE, 3000), budgets=None, style: str = 'rock', seed: int = 1):
+    """Tempo de cada motor (com e sem acabamento) comparado ao campo de blobs, sem orçamento e com DEFAULT_BUDGETS."""
+    budgets = budgets or DEFAULT_BUDGETS
+    started = time.perf_counter()
+    for name in (*COVER_ENGINES, *COVER_OVERLAYS):
+        cost_model(name)
+    print(f"Calibração dos motores: {(time.perf_counter() - started) * 1000:.0f} ms (uma vez por processo)")
+    for size in sizes:
+        budget = budget_for(budgets, size)
+        print(f"\n{size}x{size} (orçamento de {budget * 1000:.0f} ms):")
+        baseline = None
+        for engine in COVER_ENGINES:
+            for overlay in (None, *COVER_OVERLAYS) if engine != 'blobs' else (None,):
+                started = time.perf_counter()
+                render_cover(style, seed, size, engine, overlay or 'none')
+                elapsed = time.perf_counter() - started
+                baseline = baseline or elapsed
+                started = time.perf_counter()
+                render_cover(style, seed, size, engine, overlay or 'none', budget)
+                budgeted = time.perf_counter() - started
+                internal = render_size(engine, size, budget, overlay)
+                status = "ok" if budgeted <= budget else "estourou"
+                print(f"  {engine + ('+' + overlay if overlay else ''):>16}: {elapsed * 1000:7.0f} ms ({elapsed / baseline:4.1f}x blobs) | "
+                      f"com orçamento {budgeted * 1000:6.0f} ms em {internal}px ({status})")
+
+if __name__ == "__main__":
+    # Uso: python cover_engines.py [estilo] -- compara os motores a 800px e 3000px
+    benchmark(style=sys.argv[1] if len(sys.argv) > 1 else 'rock')
@@ -0,0 +1,170 @@
+import pickle
+import sys
+import time
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+from PIL import Image
+
+import cover_engines
+import loop_generator
+
+# --- CAPAS EM MEMÓRIA COMPARTILHADA (ENTREGA SEM CÓPIA ENTRE PROCESSOS) ---
+
+# Pixels RGBX (4 bytes): é o layout que o Pillow (Image.frombuffer) e o Qt (QImage.Format_RGBX8888)
+# conseguem embrulhar sem copiar; o byte X fica em 255
+CHANNELS = 4
+
+def _release(shm: shared_memory.SharedMemory):
+    try:
+        shm.close()
+    except BufferError:
+        # Ainda há imagens ou arrays apontando para o buffer: o mapeamento é desfeito quando eles forem coletados
+        pass
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+class SharedCover:
+    """
+    Buffer de uma capa size x size em memória compartilhada, criado e liberado pelo processo pai; os workers
+    só abrem o segmento pelo nome (veja render_into_shared) e escrevem os pixels direto nele.
+
+    image(), rgb e qimage() são views do buffer (sem cópia), válidas enquanto a capa estiver aberta.
+    close() (ou o fim do bloco with) apaga o segmento; se o objeto for coletado ou o processo terminar sem
+    close(), o segmento é apagado do mesmo jeito (e o resource_tracker apaga o de um pai que morrer à força).
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._shm = shared_memory.SharedMemory(create=True, size=size * size * CHANNELS)
+        self.name = self._shm.name
+        self.pixels = np.ndarray((size, size, CHANNELS), dtype=np.uint8, buffer=self._shm.buf)
+        self.pixels[:, :, 3] = 255
+        self._finalizer = weakref.finalize(self, _release, self._shm)
+
+    @property
+    def closed(self) -> bool:
+        return not self._finalizer.alive
+
+    @property
+    def rgb(self) -> np.ndarray:
+        """View (tamanho, tamanho, 3) dos canais RGB, sem cópia."""
+        return self.pixels[:, :, :3]
+
+    def image(self) -> Image.Image:
+        """Imagem Pillow 'RGBX' sobre o buffer, sem cópia (somente leitura: desenhar nela faz uma cópia)."""
+        return Image.frombuffer('RGBX', (self.size, self.size), self._shm.buf, 'raw', 'RGBX', 0, 1)
+
+    def qimage(self):
+        """QImage sobre o buffer, sem cópia, para mostrar na interface; não pode sobreviver à capa."""
+        # Importado aqui porque o PyQt6 só é necessário na interface
+        from PyQt6 import sip
+        from PyQt6.QtGui import QImage
+        return QImage(sip.voidptr(self._shm.buf), self.size, self.size, self.size * CHANNELS, QImage.Format.Format_RGBX8888)
+
+    def cover_image(self, cover_title: str, subtitle: str) -> Image.Image:
+        """Cópia RGB da capa com título e subtítulo (loop_generator.draw_cover_text), pronta para gravar."""
+        return loop_generator.draw_cover_text(self.image().convert('RGB'), cover_title, subtitle)
+
+    def close(self):
+        self.pixels = None
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Antes do 3.13 não há track=False: quem só abre o segmento também o registra no resource_tracker, e um worker
+    # com tracker próprio (ex.: pool criado antes do primeiro segmento) apagaria a capa do pai ao terminar
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+def render_into_shared(name: str, size: int, style: str, seed: int, engine: str = 'blobs', overlay: str | None = None,
+                       budget=None) -> float:
+    """Executado no worker: renderiza o fundo de capa direto no segmento `name` do pai. Retorna os segundos gastos."""
+    started = time.perf_counter()
+    shm = _attach(name)
+    try:
+        pixels = np.ndarray((size, size, CHANNELS), dtype=np.uint8, buffer=shm.buf)
+        if engine == 'blobs' and overlay is None and budget is None:
+            loop_generator.render_cover_field_into(pixels[:, :, :3], loop_generator.cover_blobs(style, "", 0, seed))
+        else:
+            cover_engines.render_cover_into(pixels[:, :, :3], style, seed, engine, overlay, cover_engines.budget_for(budget, size))
+        # As views precisam sumir antes do close(), que falha com ponteiros exportados
+        del pixels
+    finally:
+        shm.close()
+    return time.perf_counter() - started
+
+def render_covers_shared(jobs: list[dict], workers: int | None = None, executor: ProcessPoolExecutor | None = None) -> list[SharedCover]:
+    """
+    Renderiza vários fundos de capa em processos separados, cada um direto em um SharedCover do pai.
+    jobs: [{'style', 'seed', 'size', 'engine', 'overlay', 'budget'}] (os três últimos opcionais, como em cover_export).
+    Retorna os SharedCover na ordem dos jobs; quem chama fecha cada um. Se algum worker falhar, todos são fechados.
+    executor: um pool já aberto (ex.: mantido pela interface entre gerações); sem ele, um pool de `workers` processos.
+    """
+    covers = []
+    own_executor = executor is None
+    try:
+        for job in jobs:
+            covers.append(SharedCover(job['size']))
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=workers)
+        futures = [executor.submit(render_into_shared, cover.name, cover.size, job['style'], job['seed'],
+                                   job.get('engine', 'blobs'), job.get('overlay'), job.get('budget'))
+                   for cover, job in zip(covers, jobs)]
+        for future in futures:
+            future.result()
+    except BaseException:
+        for cover in covers:
+            cover.close()
+        raise
+    finally:
+        if own_executor and executor is not None:
+            executor.shutdown()
+    return covers
+
+def _render_pickled(size: int, style: str, seed: int, engine: str) -> np.ndarray:
+    # Caminho de comparação: o worker devolve o array, que é serializado de volta para o pai
+    return np.asarray(cover_engines.render_cover(style, seed, size, engine, 'none'))
+
+def benchmark(count: int = 4, size: int = 3000, workers: int = 2, engine: str = 'noise'):
+    """Compara devolver as capas serializadas (pickle) com renderizá-las direto em memória compartilhada."""
+    print(f"{count} capas {size}x{size} ({engine}), {workers} workers; cada capa RGB tem {size * size * 3 / 2**20:.0f} MB")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Aquece o pool (importações) para medir só a renderização e a entrega
+        list(executor.map(_render_pickled, [64] * workers, ['rock'] * workers, range(workers), [engine] * workers))
+        started = time.perf_counter()
+        arrays = list(executor.map(_render_pickled, [size] * count, ['rock'] * count, range(count), [engine] * count))
+        elapsed = time.perf_counter() - started
+        pickled = len(pickle.dumps(arrays[0], protocol=pickle.HIGHEST_PROTOCOL))
+        print(f"  pickle:        {elapsed * 1000:5.0f} ms ({pickled / 2**20:.0f} MB serializados por capa, mais a cópia no pai)")
+        del arrays
+
+        started = time.perf_counter()
+        covers = render_covers_shared([{'style': 'rock', 'seed': seed, 'size': size, 'engine': engine, 'overlay': 'none'}
+                                       for seed in range(count)], executor=executor)
+        images = [cover.image() for cover in covers]
+        elapsed = time.perf_counter() - started
+    print(f"  compartilhada: {elapsed * 1000:5.0f} ms (0 MB copiados; {len(images)} imagens Pillow sobre os buffers)")
+    del images
+    for cover in covers:
+        cover.close()
+
+if __name__ == "__main__":
+    # Uso: python cover_shm.py [capas] [tamanho] [workers]
+    benchmark(*(int(arg) for arg in sys.argv[1:4]))
@@ -0,0 +1,231 @@
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import loop_generator
+from loop_generator import TICKS_PER_BEAT
+import variation_engine
+
+# --- EXPORTAÇÃO DE DATASET EM SHARDS (TREINO DE MODELOS) ---
+
+DATASET_FORMAT_VERSION = 1
+TRACKS = ('bass', 'drums', 'piano')
+STYLES = ('rock', 'funk', 'jazz', 'blues', 'reggae')
+KEYS = tuple(loop_generator.NOTES.keys())
+SCALES = tuple(loop_generator.SCALES.keys())
+ROLL_STEP_TICKS = TICKS_PER_BEAT // 4
+
+# Uma nota por linha; tempos em ticks relativos ao início do loop
+DATASET_EVENT_DTYPE = np.dtype([
+    ('start', np.int32), ('end', np.int32), ('note', np.uint8), ('velocity', np.uint8), ('track', np.uint8)
+])
+# Um loop por linha: fatia [event_offset, event_offset + event_count) do array de eventos, mais os metadados
+DATASET_INDEX_DTYPE = np.dtype([
+    ('event_offset', np.int64), ('event_count', np.int32),
+    ('roll_offset', np.int64), ('roll_steps', np.int32),
+    ('style', np.uint8), ('key', np.uint8), ('scale', np.uint8), ('bpm', np.uint16), ('bars', np.uint16),
+    ('progression', 'U96'),
+])
+
+def _canonical_progression(spec: dict) -> str:
+    if spec['style'] == 'blues':
+        return 'blues-12'
+    progression, _ = loop_generator.parse_progression_string(spec['progression_string'])
+    return ','.join(f"{degree}-{chord_type}" for degree, chord_type in progression)
+
+def _piano_roll(events: np.ndarray, loop_ids: np.ndarray, loops: int, bars: int) -> np.ndarray:
+    """
+    Matrizes (passos de semicolcheia, trilha, nota MIDI) com a dinâmica de cada nota enquanto ela soa,
+    para `loops` loops de mesmo tamanho empilhados: o loop n ocupa as linhas [n * passos, (n + 1) * passos).
+    """
+    steps = bars * 16
+    roll = np.zeros((loops * steps, len(TRACKS), 128), dtype=np.uint8)
+    first = events['start'] // ROLL_STEP_TICKS
+    last = np.minimum(-(-events['end'] // ROLL_STEP_TICKS), steps)
+    lengths = np.maximum(last - first, 1)
+    owner = np.repeat(np.arange(len(events)), lengths)
+    step = first[owner] + np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    valid = step < steps
+    owner, step = owner[valid], step[valid]
+    roll[loop_ids[owner] * steps + step, events['track'][owner], events['note'][owner]] = events['velocity'][owner]
+    return roll
+
+def _job_events(variations: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+    """Junta as notas de todas as variações de um job: (eventos ordenados por loop/tempo, loop de cada evento)."""
+    parts, loop_parts = [], []
+    for track_id, name in enumerate(TRACKS):
+        per_loop = [variation[name] for variation in variations]
+        joined = np.concatenate(per_loop)
+        part = np.zeros(len(joined), dtype=DATASET_EVENT_DTYPE)
+        for field in ('start', 'end', 'note', 'velocity'):
+            part[field] = joined[field]
+        part['track'] = track_id
+        parts.append(part)
+        loop_parts.append(np.repeat(np.arange(len(variations)), [len(events) for events in per_loop]))
+    events, loop_ids = np.concatenate(parts), np.concatenate(loop_parts)
+    order = np.lexsort((events['note'], events['track'], events['start'], loop_ids))
+    return events[order], loop_ids[order]
+
+def _write_shard(output_dir: str, shard_id: int, jobs: list[tuple[dict, int, np.random.SeedSequence]], piano_roll: bool) -> dict:
+    """Gera e grava um shard. jobs: (spec, quantidade_de_loops, seed). Roda em um processo separado."""
+    events_parts, roll_parts, index_parts = [], [], []
+    event_offset = roll_offset = 0
+    for spec, count, seed in jobs:
+        variations, error = variation_engine.generate_variations(
+            spec['style'], spec['key'], spec['scale'], spec['bars'], spec.get('progression_string', ''), count, seed=seed
+        )
+        if error:
+            raise ValueError(f"Especificação inválida {spec}: {error}")
+        events, loop_ids = _job_events(variations)
+        counts = np.bincount(loop_ids, minlength=count)
+
+        index = np.zeros(count, dtype=DATASET_INDEX_DTYPE)
+        index['event_offset'] = event_offset + np.cumsum(counts) - counts
+        index['event_count'] = counts
+        index['style'], index['key'], index['scale'] = STYLES.index(spec['style']), KEYS.index(spec['key']), SCALES.index(spec['scale'])
+        index['bpm'], index['bars'], index['progression'] = spec['bpm'], spec['bars'], _canonical_progression(spec)
+        if piano_roll:
+            steps = spec['bars'] * 16
+            roll_parts.append(_piano_roll(events, loop_ids, count, spec['bars']))
+            index['roll_offset'] = roll_offset + np.arange(count) * steps
+            index['roll_steps'] = steps
+            roll_offset += count * steps
+        events_parts.append(events)
+        index_parts.append(index)
+        event_offset += len(events)
+
+    name = f"shard_{shard_id:05d}"
+    arrays = {'events': np.concatenate(events_parts), 'index': np.concatenate(index_parts)}
+    if piano_roll:
+        arrays['roll'] = np.concatenate(roll_parts)
+    for suffix, array in arrays.items():
+        path = os.path.join(output_dir, f"{name}.{suffix}.npy")
+        tmp_path = f"{path}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+    return {'name': name, 'loops': len(arrays['index']), 'events': int(event_offset)}
+
+def _plan_shards(specs: list[dict], loops_per_spec: int, shard_size: int, seed: int) -> list[list]:
+    """
+    Divide specs x loops_per_spec em shards de até shard_size loops. Cada trecho tem seu próprio SeedSequence,
+    derivado de (seed, índice da spec, primeiro loop do trecho): trechos distintos nunca repetem o fluxo aleatório.
+    """
+    shards, current, filled = [], [], 0
+    for spec_index, spec in enumerate(specs):
+        offset = 0
+        while offset < loops_per_spec:
+            count = min(loops_per_spec - offset, shard_size - filled)
+            current.append((spec, count, np.random.SeedSequence((seed, spec_index, offset))))
+            filled += count
+            offset += count
+            if filled == shard_size:
+                shards.append(current)
+                current, filled = [], 0
+    if current:
+        shards.append(current)
+    return shards
+
+def export_dataset(output_dir: str, specs: list[dict], loops_per_spec: int, shard_size: int = 10_000,
+                   piano_roll: bool = False, workers: int | None = None, seed: int = 0) -> dict:
+    """
+    Gera loops_per_spec variações de cada spec ({'style', 'key', 'scale', 'bpm', 'bars', 'progression_string'})
+    e grava apenas as notas e os metadados, sem capas nem partituras, em shards de tamanho fixo:
+    'shard_NNNNN.events.npy' (eventos), 'shard_NNNNN.index.npy' (um loop por linha) e, com piano_roll,
+    'shard_NNNNN.roll.npy'. Os shards são escritos em paralelo por processos separados.
+    Retorna o manifesto, também gravado em 'manifest.json'.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    plan = _plan_shards(specs, loops_per_spec, shard_size, seed)
+    print(f"Exportando {len(specs) * loops_per_spec} loops em {len(plan)} shards para '{output_dir}'...")
+    if (workers or os.cpu_count() or 1) <= 1 or len(plan) == 1:
+        shards = [_write_shard(output_dir, shard_id, jobs, piano_roll) for shard_id, jobs in enumerate(plan)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_write_shard, output_dir, shard_id, jobs, piano_roll) for shard_id, jobs in enumerate(plan)]
+            shards = [future.result() for future in futures]
+
+    manifest = {
+        'format_version': DATASET_FORMAT_VERSION, 'generator_version': loop_generator.GENERATOR_VERSION,
+        'ticks_per_beat': TICKS_PER_BEAT, 'roll_step_ticks': ROLL_STEP_TICKS if piano_roll else None,
+        'tracks': list(TRACKS), 'styles': list(STYLES), 'keys': list(KEYS), 'scales': list(SCALES),
+        'piano_roll': piano_roll, 'shards': shards,
+    }
+    with open(os.path.join(output_dir, "manifest.json"), "w", encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Dataset exportado: {sum(s['loops'] for s in shards)} loops, {sum(s['events'] for s in shards)} notas.")
+    return manifest
+
+class DatasetReader:
+    """
+    Leitura com acesso aleatório de um dataset exportado. Os shards são abertos sob demanda
+    com np.load(mmap_mode='r'): só as páginas dos loops lidos são carregadas do disco.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "manifest.json"), encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        self._bounds = np.cumsum([0] + [shard['loops'] for shard in self.manifest['shards']])
+        self._shards = {}
+
+    def __len__(self) -> int:
+        return int(self._bounds[-1])
+
+    def _shard(self, shard_number: int) -> dict:
+        if shard_number not in self._shards:
+            name = self.manifest['shards'][shard_number]['name']
+            suffixes = ('events', 'index', 'roll') if self.manifest['piano_roll'] else ('events', 'index')
+            self._shards[shard_number] = {
+                suffix: np.load(os.path.join(self.path, f"{name}.{suffix}.npy"), mmap_mode='r') for suffix in suffixes
+            }
+        return self._shards[shard_number]
+
+    def __getitem__(self, i: int) -> dict:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        shard_number = int(np.searchsorted(self._bounds, i, side='right')) - 1
+        shard = self._shard(shard_number)
+        row = shard['index'][i - self._bounds[shard_number]]
+        events = shard['events'][row['event_offset']:row['event_offset'] + row['event_count']]
+        item = {
+            'events': events,
+            'style': self.manifest['styles'][row['style']], 'key': self.manifest['keys'][row['key']],
+            'scale': self.manifest['scales'][row['scale']], 'bpm': int(row['bpm']), 'bars': int(row['bars']),
+            'progression': str(row['progression']),
+        }
+        if self.manifest['piano_roll']:
+            item['piano_roll'] = shard['roll'][row['roll_offset']:row['roll_offset'] + row['roll_steps']]
+        return item
+
+    def track_events(self, i: int, track: str) -> np.ndarray:
+        events = self[i]['events']
+        return events[events['track'] == self.manifest['tracks'].index(track)]
+
+if __name__ == "__main__":
+    # Uso: python dataset_export.py <pasta_de_saida> [loops_por_estilo] [--piano-roll]
+    if len(sys.argv) < 2:
+        print("Uso: python dataset_export.py <pasta_de_saida> [loops_por_estilo] [--piano-roll]")
+        sys.exit(1)
+    loops = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].isdigit() else 1000
+    default_specs = [
+        {'style': 'rock', 'key': key, 'scale': 'minor', 'bpm': 140, 'bars': 8, 'progression_string': '1-minor, 6-major, 7-major, 5-major'}
+        for key in KEYS
+    ] + [
+        {'style': 'funk', 'key': key, 'scale': 'minor', 'bpm': 110, 'bars': 4, 'progression_string': '1-minor, 4-minor, 5-dominant7, 1-minor'}
+        for key in KEYS
+    ] + [
+        {'style': 'jazz', 'key': key, 'scale': 'major', 'bpm': 120, 'bars': 4, 'progression_string': '2-minor7, 5-dominant7, 1-major7, 1-major7'}
+        for key in KEYS
+    ] + [
+        {'style': 'blues', 'key': key, 'scale': 'major', 'bpm': 130, 'bars': 12, 'progression_string': ''}
+        for key in KEYS
+    ] + [
+        {'style': 'reggae', 'key': key, 'scale': 'minor', 'bpm': 70, 'bars': 4, 'progression_string': '1-minor, 1-minor, 4-minor, 4-minor'}
+        for key in KEYS
+    ]
+    export_dataset(sys.argv[1], default_specs, max(1, loops // len(KEYS)), piano_roll='--piano-roll' in sys.argv)
@@ -0,0 +1,218 @@
+import sys
+import time
+
+import mido
+import numpy as np
+
+from loop_generator import DRUM_MAP, DRUM_MIDI_PATTERNS, LILYPOND_DRUM_MAP, TICKS_PER_BEAT
+import loop_generator
+
+# --- MOTOR DE BATERIA POR MÁSCARAS DE 16 BITS ---
+
+STEPS = 16
+NUM_MASKS = 1 << STEPS
+S16 = TICKS_PER_BEAT // 4
+BAR_TICKS = TICKS_PER_BEAT * 4
+# Bit i = semicolcheia i do compasso
+BACKBEAT_MASK = (1 << 4) | (1 << 12)
+DOWNBEAT_MASK = 1
+LAST_BEAT_MASK = 0xF000
+SECOND_HALF_MASK = 0xFF00
+FILL_OPEN_HAT_MASK = 1 << 15
+# Peso métrico de cada semicolcheia (4 no tempo 1, 0 nos contratempos de semicolcheia), usado na síncope
+METRIC_WEIGHTS = np.array([4, 0, 1, 0, 2, 0, 1, 0, 3, 0, 1, 0, 2, 0, 1, 0])
+# Durações LilyPond em semicolcheias (da maior para a menor)
+LILYPOND_DURATIONS = [(16, '1'), (12, '2.'), (8, '2'), (6, '4.'), (4, '4'), (3, '8.'), (2, '8'), (1, '16')]
+# Ordem das peças dentro de um acorde LilyPond (de baixo para cima na pauta)
+PIECE_ORDER = ['kick', 'snare', 'closed_hat', 'open_hat', 'ride', 'crash']
+
+def mask_from_steps(steps) -> int:
+    """[1,0,0,0,...] (16 posições, como em DRUM_MIDI_PATTERNS) -> máscara de 16 bits."""
+    return sum(1 << i for i, active in enumerate(steps) if active)
+
+def mask_steps(mask: int) -> list[int]:
+    return [i for i in range(STEPS) if mask >> i & 1]
+
+STYLE_DRUM_MASKS = {style: {piece: mask_from_steps(steps) for piece, steps in pattern.items()}
+                    for style, pattern in DRUM_MIDI_PATTERNS.items()}
+
+def _build_table() -> np.ndarray:
+    """Propriedades das 65.536 máscaras, calculadas de uma vez com operações de bits em NumPy."""
+    masks = np.arange(NUM_MASKS, dtype=np.int64)
+    bits = (masks[:, None] >> np.arange(STEPS)) & 1
+    density = bits.sum(axis=1)
+    # Síncope (Longuet-Higgins e Lee): cada ataque soa até o ataque seguinte (em ciclo); se nesse intervalo
+    # cai uma posição mais forte sem ataque, a síncope é a diferença entre o peso dela (a mais forte) e o do ataque
+    strongest_rest = np.zeros(bits.shape, dtype=np.int64)
+    sounding = np.ones(bits.shape, dtype=bool)
+    for distance in range(1, STEPS):
+        position = (np.arange(STEPS) + distance) % STEPS
+        sounding &= bits[:, position] == 0
+        strongest_rest = np.where(sounding, np.maximum(strongest_rest, METRIC_WEIGHTS[position]), strongest_rest)
+    syncopation_raw = (bits * np.clip(strongest_rest - METRIC_WEIGHTS, 0, None)).sum(axis=1)
+    syncopation = np.where(density > 0, syncopation_raw / np.maximum(density, 1) / 4, 0.0)
+    table = np.zeros(NUM_MASKS, dtype=[('mask', np.uint16), ('density', np.uint8), ('syncopation', np.float32),
+                                       ('backbeat', np.uint8), ('downbeat', np.bool_), ('last_beat', np.uint8)])
+    table['mask'] = masks
+    table['density'] = density
+    table['syncopation'] = syncopation
+    table['backbeat'] = bits[:, 4] + bits[:, 12]
+    table['downbeat'] = bits[:, 0].astype(bool)
+    table['last_beat'] = bits[:, 12:].sum(axis=1)
+    return table
+
+MASK_TABLE = _build_table()
+# Índice: máscaras ordenadas por (densidade, síncope); DENSITY_OFFSETS[d] é o início do bloco de densidade d
+_ORDER = np.lexsort((MASK_TABLE['syncopation'], MASK_TABLE['density']))
+SORTED_MASKS = MASK_TABLE['mask'][_ORDER].astype(np.int64)
+_SORTED_SYNCOPATION = MASK_TABLE['syncopation'][_ORDER]
+DENSITY_OFFSETS = np.searchsorted(MASK_TABLE['density'][_ORDER], np.arange(STEPS + 2))
+
+def query(density=(0, STEPS), syncopation=(None, None), include: int = 0, exclude: int = 0, within: int = NUM_MASKS - 1,
+          backbeat: int | None = None, near: tuple[int, int] | None = None) -> np.ndarray:
+    """
+    Máscaras que satisfazem as restrições, por consulta ao índice (sem tentativa e erro):
+    densidade (mín, máx) e síncope (mín, máx; None = sem limite) viram fatias do índice ordenado;
+    include/exclude/within (bits obrigatórios, proibidos e permitidos), backbeat (ataques nos tempos 2 e 4) e
+    near=(máscara, distância_máx) (variações a poucas notas de um padrão) filtram as fatias com operações de bits.
+    """
+    low_density, high_density = max(density[0], 0), min(density[1], STEPS)
+    low_sync = -np.inf if syncopation[0] is None else syncopation[0]
+    high_sync = np.inf if syncopation[1] is None else syncopation[1]
+    parts = []
+    for d in range(low_density, high_density + 1):
+        start, end = DENSITY_OFFSETS[d], DENSITY_OFFSETS[d + 1]
+        block = _SORTED_SYNCOPATION[start:end]
+        parts.append(SORTED_MASKS[start + np.searchsorted(block, low_sync, side='left'):
+                                  start + np.searchsorted(block, high_sync, side='right')])
+    masks = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+    keep = ((masks & include) == include) & ((masks & exclude) == 0) & ((masks & ~within) == 0)
+    if backbeat is not None:
+        keep &= MASK_TABLE['backbeat'][masks] == backbeat
+    if near is not None:
+        base, distance = near
+        keep &= MASK_TABLE['density'][masks ^ base] <= distance
+    return masks[keep]
+
+def sample(rng: np.random.Generator, **constraints) -> int | None:
+    """Sorteia uma máscara entre as que satisfazem query(**constraints); None se nenhuma satisfizer."""
+    candidates = query(**constraints)
+    return int(candidates[rng.integers(len(candidates))]) if len(candidates) else None
+
+def arrange_drums(style: str, bars: int, rng: np.random.Generator, variation: float = 0.35, phrase: int = 4) -> list[dict]:
+    """
+    Uma máscara por peça em cada compasso, a partir do padrão do estilo:
+    - com probabilidade `variation`, o bumbo do compasso vira uma variação (no máximo 2 notas diferentes,
+      densidade próxima, mantendo o tempo 1 e sem acrescentar notas nos tempos da caixa);
+    - o último compasso de cada frase de `phrase` compassos recebe uma virada de caixa (densidade 5-8, síncope
+      > 0.1, concentrada na segunda metade e mantendo o backbeat do tempo 2), com o chimbal aberto na última
+      semicolcheia;
+    - o compasso seguinte a uma virada começa com prato de ataque.
+    """
+    base = STYLE_DRUM_MASKS[style]
+    snare_base = base.get('snare', 0)
+    result = []
+    for bar in range(bars):
+        masks = dict(base)
+        is_fill = phrase and bars > 1 and (bar + 1) % phrase == 0
+        if 'kick' in base and not is_fill and rng.random() < variation:
+            kick = base['kick']
+            d = bin(kick).count('1')
+            masks['kick'] = sample(rng, density=(max(d - 1, 1), d + 1), near=(kick, 2),
+                                   include=kick & DOWNBEAT_MASK, exclude=snare_base & BACKBEAT_MASK & ~kick) or kick
+        if is_fill:
+            fill = sample(rng, density=(5, 8), syncopation=(0.1, None), include=snare_base & (1 << 4),
+                          within=SECOND_HALF_MASK | (1 << 4))
+            if fill is not None:
+                masks['snare'] = fill
+                # O chimbal/ride não toca junto com a virada no último tempo e dá lugar ao chimbal aberto na última semicolcheia
+                for hat in ('closed_hat', 'ride'):
+                    if hat in masks:
+                        masks[hat] &= ~((fill & LAST_BEAT_MASK) | FILL_OPEN_HAT_MASK)
+                masks['open_hat'] = masks.get('open_hat', 0) | FILL_OPEN_HAT_MASK
+        if bar > 0 and phrase and bars > 1 and bar % phrase == 0:
+            masks['crash'] = masks.get('crash', 0) | DOWNBEAT_MASK
+        result.append({piece: mask for piece, mask in masks.items() if mask})
+    return result
+
+def masks_to_track(bar_masks: list[dict], rng: np.random.Generator) -> mido.MidiTrack:
+    """Trilha MIDI (canal 10) das máscaras de cada compasso; dinâmicas como em generate_drum_track."""
+    rows = []
+    for bar, masks in enumerate(bar_masks):
+        for piece, mask in masks.items():
+            for step in mask_steps(mask):
+                rows.append((bar * BAR_TICKS + step * S16, DRUM_MAP[piece], piece == 'snare'))
+    rows.sort()
+    velocities = rng.integers(0, 21, len(rows)).tolist()
+    track = mido.MidiTrack()
+    for (start, note, is_snare), offset in zip(rows, velocities):
+        velocity = (90 if is_snare else 100) + offset
+        track.append(mido.Message('note_on', channel=9, note=note, velocity=velocity, time=start))
+        track.append(mido.Message('note_off', channel=9, note=note, velocity=64, time=start + S16 - 1))
+    return loop_generator._convert_absolute_times_to_delta(track)
+
+_DURATION_NAMES = dict(LILYPOND_DURATIONS)
+
+def _rests(length: int) -> list[str]:
+    rests = []
+    while length:
+        steps, value = next((steps, value) for steps, value in LILYPOND_DURATIONS if steps <= length)
+        rests.append(f"r{value}")
+        length -= steps
+    return rests
+
+def masks_to_lilypond(bar_masks: list[dict]) -> str:
+    """
+    Trecho drummode com todas as semicolcheias. Cada ataque (uma peça ou um acorde '<bd sn>') dura até o
+    próximo quando esse intervalo é uma figura simples; senão vira uma semicolcheia seguida de pausas.
+    """
+    score = ""
+    for masks in bar_masks:
+        union = 0
+        for mask in masks.values():
+            union |= mask
+        onsets = mask_steps(union)
+        tokens = _rests(onsets[0]) if onsets else _rests(STEPS)
+        for i, step in enumerate(onsets):
+            pieces = [LILYPOND_DRUM_MAP[p] for p in PIECE_ORDER if masks.get(p, 0) >> step & 1]
+            chord = pieces[0] if len(pieces) == 1 else f"<{' '.join(pieces)}>"
+            length = (onsets[i + 1] if i + 1 < len(onsets) else STEPS) - step
+            if length in _DURATION_NAMES:
+                tokens.append(f"{chord}{_DURATION_NAMES[length]}")
+            else:
+                tokens.append(f"{chord}16")
+                tokens.extend(_rests(length - 1))
+        score += " ".join(tokens) + " | "
+    return score
+
+def generate_drums(style: str, bars: int, rng: np.random.Generator, variation: float = 0.35, phrase: int = 4) -> tuple[mido.MidiTrack, str]:
+    """Trilha MIDI e trecho LilyPond da mesma bateria com variações e viradas (veja arrange_drums)."""
+    bar_masks = arrange_drums(style, bars, rng, variation, phrase)
+    return masks_to_track(bar_masks, rng), masks_to_lilypond(bar_masks)
+
+def benchmark(queries: int = 10_000):
+    """Compara a consulta ao índice com sortear máscaras até uma satisfazer as restrições."""
+    rng = np.random.default_rng(0)
+    started = time.perf_counter()
+    for _ in range(queries):
+        sample(rng, density=(5, 7), syncopation=(0.3, None), within=SECOND_HALF_MASK | (1 << 4))
+    indexed = (time.perf_counter() - started) / queries
+    started, tries = time.perf_counter(), 0
+    for _ in range(queries // 100):
+        while True:
+            tries += 1
+            mask = int(rng.integers(NUM_MASKS))
+            row = MASK_TABLE[mask]
+            if 5 <= row['density'] <= 7 and row['syncopation'] >= 0.3 and (mask & ~(SECOND_HALF_MASK | (1 << 4))) == 0:
+                break
+    rejection = (time.perf_counter() - started) / (queries // 100)
+    print(f"Consulta indexada: {indexed * 1e6:.1f} µs; tentativa e erro: {rejection * 1e6:.1f} µs "
+          f"({tries / (queries // 100):.0f} máscaras sorteadas por padrão aceito).")
+
+if __name__ == "__main__":
+    # Uso: python drum_engine.py [estilo] [compassos]
+    style = sys.argv[1] if len(sys.argv) > 1 else 'funk'
+    bars = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    for bar, masks in enumerate(arrange_drums(style, bars, np.random.default_rng())):
+        print(f"{bar + 1:>3}  " + "  ".join(f"{piece}:{format(mask, '016b')[::-1]}" for piece, mask in masks.items()))
+    benchmark()
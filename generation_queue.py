@@ -0,0 +1,358 @@
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+import loop_generator
+import metrics
+
+# --- GERAÇÃO DISTRIBUÍDA (FILA SQLITE COM LEASES) ---
+
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_POLL_SECONDS = 1.0
+# Argumentos de run_generation_process que não fazem sentido em um worker (ele sempre grava pastas em output_root)
+_IGNORED_JOB_KEYS = {'output_mode', 'archive_path', 'compression_level', 'cache', 'duplicate_index', 'on_composed'}
+_REQUIRED_JOB_KEYS = {'style_to_generate', 'bars', 'key', 'scale', 'bpm', 'progression_string', 'cover_title'}
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class GenerationQueue:
+    """
+    Fila durável de packs em um SQLite. O coordenador divide os jobs (argumentos de run_generation_process)
+    em shards; cada worker, em qualquer máquina que enxergue o arquivo, pega um shard com um lease de
+    lease_seconds e o renova enquanto trabalha. Um shard cujo lease expirou (worker morto ou travado) volta
+    a ser entregue, até max_attempts tentativas.
+
+    Cada tomada do lease incrementa `attempts`, que funciona como token: complete() e fail() de um worker que
+    perdeu o lease não alteram mais o shard. Entre máquinas, o arquivo precisa estar em um sistema de
+    arquivos com travas confiáveis, e os relógios devem estar sincronizados (os leases usam time.time()).
+    """
+
+    def __init__(self, db_path: str = "generation_queue.sqlite3"):
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS shards (
+                id INTEGER PRIMARY KEY,
+                jobs TEXT NOT NULL,
+                first_job INTEGER NOT NULL,
+                submitted REAL NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                results TEXT,
+                error TEXT,
+                finished REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_shards_status ON shards(status, lease_expires);
+        """)
+
+    def submit(self, jobs: list[dict], shard_size: int = 1, max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> list[int]:
+        """Divide os jobs em shards de até shard_size packs e os grava em uma única transação. Retorna os ids dos shards."""
+        for job in jobs:
+            missing = _REQUIRED_JOB_KEYS - set(job)
+            if missing:
+                raise ValueError(f"Job sem os campos: {', '.join(sorted(missing))}.")
+        jobs = [{k: v for k, v in job.items() if k not in _IGNORED_JOB_KEYS} for job in jobs]
+        now = time.time()
+        ids = []
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            first_job = self._db.execute(
+                "SELECT COALESCE(MAX(first_job + json_array_length(jobs)), 0) FROM shards").fetchone()[0]
+            for start in range(0, len(jobs), shard_size):
+                shard = jobs[start:start + shard_size]
+                cursor = self._db.execute(
+                    "INSERT INTO shards (jobs, first_job, submitted, max_attempts) VALUES (?, ?, ?, ?)",
+                    (json.dumps(shard), first_job + start, now, max_attempts)
+                )
+                ids.append(cursor.lastrowid)
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return ids
+
+    def claim(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> dict | None:
+        """
+        Pega o shard pendente (ou com lease vencido) mais antigo. Retorna {'id', 'token', 'jobs', 'first_job',
+        'submitted'} ou None. Shards com lease vencido e sem tentativas restantes são marcados como 'failed'.
+        """
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute(
+                "UPDATE shards SET status = 'failed', error = 'Lease expirado em todas as tentativas.', finished = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= max_attempts", (now, now)
+            )
+            row = self._db.execute(
+                "SELECT id, jobs, first_job, submitted, attempts FROM shards "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) ORDER BY id LIMIT 1", (now,)
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE shards SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                    (worker, now + lease_seconds, row['id'])
+                )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        return {'id': row['id'], 'token': row['attempts'] + 1, 'jobs': json.loads(row['jobs']),
+                'first_job': row['first_job'], 'submitted': row['submitted']}
+
+    def renew(self, shard_id: int, token: int, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Estende o lease. False se o shard já foi entregue a outro worker (o trabalho atual deve ser abandonado)."""
+        cursor = self._db.execute(
+            "UPDATE shards SET lease_expires = ? WHERE id = ? AND status = 'leased' AND attempts = ?",
+            (time.time() + lease_seconds, shard_id, token)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, shard_id: int, token: int, results: list) -> bool:
+        cursor = self._db.execute(
+            "UPDATE shards SET status = 'done', results = ?, error = NULL, finished = ? "
+            "WHERE id = ? AND status = 'leased' AND attempts = ?",
+            (json.dumps(results), time.time(), shard_id, token)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, shard_id: int, token: int, error: str) -> bool:
+        """Devolve o shard à fila (ou o marca como 'failed' se as tentativas acabaram)."""
+        cursor = self._db.execute(
+            "UPDATE shards SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END, "
+            "error = ?, lease_expires = NULL, finished = CASE WHEN attempts >= max_attempts THEN ? END "
+            "WHERE id = ? AND status = 'leased' AND attempts = ?",
+            (error, time.time(), shard_id, token)
+        )
+        return cursor.rowcount == 1
+
+    def status(self) -> dict:
+        """Quantidade de shards por estado (pending, leased, done, failed) e de leases vencidos."""
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        counts.update({row['status']: row['n'] for row in self._db.execute("SELECT status, COUNT(*) AS n FROM shards GROUP BY status")})
+        counts['expired'] = self._db.execute(
+            "SELECT COUNT(*) FROM shards WHERE status = 'leased' AND lease_expires < ?", (time.time(),)).fetchone()[0]
+        return counts
+
+    def is_drained(self) -> bool:
+        return self._db.execute("SELECT COUNT(*) FROM shards WHERE status IN ('pending', 'leased')").fetchone()[0] == 0
+
+    def results(self, shard_ids: list[int] | None = None) -> list[tuple[str | None, str | None]]:
+        """
+        (pasta, erro) de cada job, na ordem de submissão, uma entrada por job: os de shards que falharam ou que
+        ainda não terminaram vêm como (None, erro). shard_ids (o retorno de submit) limita aos jobs dessa submissão.
+        """
+        query = "SELECT status, jobs, results, error FROM shards"
+        params = ()
+        if shard_ids is not None:
+            query += f" WHERE id IN ({', '.join('?' * len(shard_ids))})"
+            params = tuple(shard_ids)
+        results = []
+        for row in self._db.execute(query + " ORDER BY first_job", params):
+            if row['status'] == 'done':
+                results.extend(tuple(result) for result in json.loads(row['results']))
+                continue
+            if row['status'] == 'failed':
+                error = f"Shard falhou: {row['error']}"
+            else:
+                error = f"Shard não concluído (estado '{row['status']}')."
+            results.extend((None, error) for _ in json.loads(row['jobs']))
+        return results
+
+    def close(self):
+        self._db.close()
+
+class _LeaseKeeper(threading.Thread):
+    """Renova o lease de um shard em segundo plano (com conexão própria) enquanto o worker gera os packs."""
+
+    def __init__(self, db_path: str, shard_id: int, token: int, lease_seconds: float):
+        super().__init__(daemon=True)
+        self.db_path, self.shard_id, self.token, self.lease_seconds = db_path, shard_id, token, lease_seconds
+        self.lost = threading.Event()
+        self._done = threading.Event()
+
+    def run(self):
+        queue = GenerationQueue(self.db_path)
+        try:
+            while not self._done.wait(self.lease_seconds / 3):
+                if not queue.renew(self.shard_id, self.token, self.lease_seconds):
+                    self.lost.set()
+                    return
+        finally:
+            queue.close()
+
+    def finish(self):
+        self._done.set()
+        self.join()
+
+def _write_pack(output_root: str, folder_name: str, artifacts, worker: str):
+    """Grava em uma pasta temporária e renomeia no fim: um worker interrompido não deixa packs pela metade."""
+    final_path = os.path.join(output_root, folder_name)
+    temp_path = os.path.join(output_root, f".tmp_{folder_name}_{worker.replace(':', '_')}")
+    shutil.rmtree(temp_path, ignore_errors=True)
+    os.makedirs(temp_path)
+    for filename, data in artifacts:
+        with open(os.path.join(temp_path, filename), "wb") as f: f.write(data)
+    try:
+        os.rename(temp_path, final_path)
+    except OSError:
+        # Outro worker (com um lease anterior) terminou o mesmo pack primeiro
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+def run_shard(shard: dict, output_root: str, worker: str, cache=None, lease: _LeaseKeeper | None = None) -> list:
+    """
+    Gera os packs de um shard em output_root. O nome da pasta é fixo por job (timestamp da submissão e número
+    do job), então uma nova tentativa pula os packs que a anterior já gravou. Retorna [(pasta, erro), ...].
+    """
+    results = []
+    for i, job in enumerate(shard['jobs']):
+        if lease is not None and lease.lost.is_set():
+            raise RuntimeError("Lease perdido; o shard foi entregue a outro worker.")
+        folder_name = (loop_generator.pack_folder_name(job['style_to_generate'], job['key'], job['bpm'], int(shard['submitted']))
+                       + f"_{shard['first_job'] + i}")
+        folder_path = os.path.join(output_root, folder_name)
+        if os.path.isdir(folder_path):
+            results.append((folder_path, None))
+            continue
+        print(f"--- [{worker}] Gerando Loop de {job['style_to_generate'].capitalize()} ({folder_name}) ---")
+        artifacts, error = loop_generator.produce_pack_artifacts(**job, cache=cache)
+        if not error:
+            _write_pack(output_root, folder_name, artifacts, worker)
+        results.append((None, error) if error else (folder_path, None))
+    return results
+
+def run_worker(db_path: str, output_root: str, worker: str | None = None, lease_seconds: float = DEFAULT_LEASE_SECONDS,
+               poll_seconds: float = DEFAULT_POLL_SECONDS, exit_when_drained: bool = True, cache_dir: str | None = None,
+               max_shards: int | None = None) -> int:
+    """
+    Laço do worker: pega um shard, gera, reporta e repete. Com exit_when_drained, sai quando não há mais
+    shards pendentes nem com lease ativo (de outros workers, que ainda podem expirar e voltar para a fila).
+    Retorna quantos shards este worker concluiu.
+    """
+    worker = worker or default_worker_id()
+    os.makedirs(output_root, exist_ok=True)
+    cache = None
+    if cache_dir:
+        import pack_cache
+        cache = pack_cache.PackCache(cache_dir)
+    queue = GenerationQueue(db_path)
+    completed = 0
+    try:
+        while max_shards is None or completed < max_shards:
+            shard = queue.claim(worker, lease_seconds)
+            if shard is None:
+                if exit_when_drained and queue.is_drained():
+                    break
+                time.sleep(poll_seconds)
+                continue
+            lease = _LeaseKeeper(db_path, shard['id'], shard['token'], lease_seconds)
+            lease.start()
+            try:
+                results = run_shard(shard, output_root, worker, cache=cache, lease=lease)
+            except Exception as e:
+                lease.finish()
+                queue.fail(shard['id'], shard['token'], f"{type(e).__name__}: {e}")
+                print(f"[{worker}] Shard {shard['id']} falhou: {e}")
+                continue
+            lease.finish()
+            if queue.complete(shard['id'], shard['token'], results):
+                completed += 1
+            else:
+                print(f"[{worker}] Lease do shard {shard['id']} expirou antes do fim; resultado descartado.")
+    finally:
+        queue.close()
+    return completed
+
+def _worker_process(db_path, output_root, lease_seconds, poll_seconds, cache_dir):
+    run_worker(db_path, output_root, lease_seconds=lease_seconds, poll_seconds=poll_seconds, cache_dir=cache_dir)
+
+def run_local(jobs: list[dict], output_root: str, db_path: str = "generation_queue.sqlite3", workers: int = 2,
+              shard_size: int = 1, lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_seconds: float = DEFAULT_POLL_SECONDS,
+              cache_dir: str | None = None) -> tuple[list | None, str | None]:
+    """
+    Coordenador e workers na mesma máquina, em processos separados (o mesmo caminho usado entre máquinas).
+    Retorna ([(pasta, erro), ...] na ordem dos jobs, só os desta submissão, None) quando a fila esvazia, ou (None, erro).
+    """
+    queue = GenerationQueue(db_path)
+    try:
+        shard_ids = queue.submit(jobs, shard_size=shard_size)
+    except ValueError as e:
+        queue.close()
+        return None, str(e)
+    print(f"--- {len(jobs)} pack(s) na fila '{db_path}'; iniciando {workers} worker(s) ---")
+    started = time.perf_counter()
+    processes = [multiprocessing.Process(target=_worker_process, args=(db_path, output_root, lease_seconds, poll_seconds, cache_dir))
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    status, results = queue.status(), queue.results(shard_ids)
+    queue.close()
+    print(f"\nFila concluída em {time.perf_counter() - started:.2f}s: {status['done']} shard(s) prontos, {status['failed']} com falha.")
+    return results, None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Geração de packs distribuída por uma fila SQLite com leases.")
+    parser.add_argument('--db', default="generation_queue.sqlite3", help="arquivo da fila (compartilhado entre os nós)")
+    sub = parser.add_subparsers(dest='command', required=True)
+    submit_parser = sub.add_parser('submit', help="coordenador: enfileira os jobs de um JSON (lista de argumentos de run_generation_process)")
+    submit_parser.add_argument('jobs')
+    submit_parser.add_argument('--shard-size', type=int, default=1, help="packs por shard")
+    submit_parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS)
+    worker_parser = sub.add_parser('worker', help="processa shards até a fila esvaziar")
+    worker_parser.add_argument('output', help="pasta onde os packs são gravados")
+    worker_parser.add_argument('--id', help="nome do worker (padrão: host:pid)")
+    worker_parser.add_argument('--lease', type=float, default=DEFAULT_LEASE_SECONDS, help="duração do lease, em segundos")
+    worker_parser.add_argument('--cache', help="diretório de um PackCache compartilhado")
+    worker_parser.add_argument('--forever', action='store_true', help="continua esperando novos shards")
+    worker_parser.add_argument('--metrics-file', help="grava métricas Prometheus neste arquivo ('{pid}' vira o PID)")
+    worker_parser.add_argument('--metrics-port', type=int, help="expõe métricas Prometheus em http://127.0.0.1:<porta>/metrics")
+    local_parser = sub.add_parser('local', help="enfileira e processa com vários processos nesta máquina")
+    local_parser.add_argument('jobs')
+    local_parser.add_argument('output')
+    local_parser.add_argument('--workers', type=int, default=2)
+    local_parser.add_argument('--shard-size', type=int, default=1)
+    sub.add_parser('status', help="estado da fila")
+    args = parser.parse_args(argv)
+
+    if args.command in ('submit', 'local'):
+        with open(args.jobs, encoding='utf-8') as f:
+            jobs = json.load(f)
+    if args.command == 'submit':
+        queue = GenerationQueue(args.db)
+        ids = queue.submit(jobs, shard_size=args.shard_size, max_attempts=args.max_attempts)
+        print(f"{len(jobs)} pack(s) enfileirados em {len(ids)} shard(s).")
+    elif args.command == 'worker':
+        if args.metrics_file or args.metrics_port is not None:
+            metrics.enable(textfile=args.metrics_file, port=args.metrics_port)
+        completed = run_worker(args.db, args.output, worker=args.id, lease_seconds=args.lease,
+                               exit_when_drained=not args.forever, cache_dir=args.cache)
+        print(f"Worker encerrado: {completed} shard(s) concluídos.")
+    elif args.command == 'local':
+        results, error = run_local(jobs, args.output, db_path=args.db, workers=args.workers, shard_size=args.shard_size)
+        if error:
+            print(f"Erro: {error}")
+            sys.exit(1)
+        for folder, job_error in results:
+            print(f"  --> {folder}" if folder else f"  ERRO: {job_error}")
+    else:
+        queue = GenerationQueue(args.db)
+        print("  ".join(f"{name}: {count}" for name, count in queue.status().items()))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
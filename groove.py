@@ -0,0 +1,173 @@
+import sys
+import time
+
+import mido
+import numpy as np
+
+from loop_generator import DRUM_MAP, TICKS_PER_BEAT
+import note_events
+
+# --- GROOVE E HUMANIZAÇÃO (OPERAÇÕES VETORIZADAS) ---
+
+BAR_TICKS = TICKS_PER_BEAT * 4
+S16 = TICKS_PER_BEAT // 4
+
+# Curvas de acento: um multiplicador de dinâmica por semicolcheia do compasso
+ACCENT_FLAT = [1.0] * 16
+ACCENT_DOWNBEATS = [1.1, 0.8, 0.9, 0.8, 1.0, 0.8, 0.9, 0.8, 1.05, 0.8, 0.9, 0.8, 1.0, 0.8, 0.9, 0.8]
+ACCENT_BACKBEAT = [1.0, 0.85, 0.9, 0.85, 1.1, 0.85, 0.9, 0.85, 1.0, 0.85, 0.9, 0.85, 1.1, 0.85, 0.9, 0.85]
+ACCENT_SIXTEENTHS = [1.1, 0.7, 0.85, 0.7, 1.05, 0.7, 0.85, 0.75, 1.05, 0.7, 0.85, 0.7, 1.05, 0.7, 0.85, 0.75]
+ACCENT_JAZZ_RIDE = [0.85, 0.8, 0.75, 0.8, 1.1, 0.8, 0.8, 0.8, 0.85, 0.8, 0.75, 0.8, 1.1, 0.8, 0.8, 0.8]
+ACCENT_ONE_DROP = [0.8, 0.8, 0.9, 0.8, 0.8, 0.8, 0.9, 0.8, 1.15, 0.8, 0.9, 0.8, 0.8, 0.8, 0.9, 0.8]
+
+# swing: posição da nota de contratempo dentro de cada par de swing_unit (0.5 = reto, 0.66 = tercina)
+# offsets / drum_offsets: deslocamento fixo em ticks por trilha e por peça da bateria (positivo = atrasado)
+# accents / drum_accents: curvas de acento por trilha e por peça; *_jitter: desvio-padrão aleatório (ticks / dinâmica)
+GROOVE_TEMPLATES = {
+    'straight': {
+        'swing': 0.5, 'swing_unit': S16 * 2, 'offsets': {}, 'drum_offsets': {},
+        'accents': {}, 'drum_accents': {}, 'timing_jitter': 3, 'velocity_jitter': 4,
+    },
+    'rock_push': {
+        'swing': 0.5, 'swing_unit': S16 * 2, 'offsets': {'bass': -3}, 'drum_offsets': {'snare': -2},
+        'accents': {'bass': ACCENT_DOWNBEATS, 'piano': ACCENT_DOWNBEATS}, 'drum_accents': {'closed_hat': ACCENT_DOWNBEATS},
+        'timing_jitter': 3, 'velocity_jitter': 5,
+    },
+    'funk_pocket': {
+        'swing': 0.54, 'swing_unit': S16, 'offsets': {'bass': -2, 'piano': 6}, 'drum_offsets': {'snare': 8},
+        'accents': {'bass': ACCENT_SIXTEENTHS}, 'drum_accents': {'closed_hat': ACCENT_SIXTEENTHS, 'snare': ACCENT_BACKBEAT},
+        'timing_jitter': 3, 'velocity_jitter': 4,
+    },
+    'jazz_swing': {
+        'swing': 0.64, 'swing_unit': S16 * 2, 'offsets': {'piano': 10}, 'drum_offsets': {'ride': -4},
+        'accents': {'bass': ACCENT_BACKBEAT}, 'drum_accents': {'ride': ACCENT_JAZZ_RIDE},
+        'timing_jitter': 6, 'velocity_jitter': 6,
+    },
+    'blues_shuffle': {
+        'swing': 0.66, 'swing_unit': S16 * 2, 'offsets': {'piano': 4}, 'drum_offsets': {'snare': 4},
+        'accents': {'bass': ACCENT_DOWNBEATS}, 'drum_accents': {'snare': ACCENT_BACKBEAT, 'closed_hat': ACCENT_BACKBEAT},
+        'timing_jitter': 5, 'velocity_jitter': 5,
+    },
+    'reggae_one_drop': {
+        'swing': 0.55, 'swing_unit': S16 * 2, 'offsets': {'bass': 10, 'piano': 12}, 'drum_offsets': {},
+        'accents': {'bass': ACCENT_ONE_DROP}, 'drum_accents': {'kick': ACCENT_ONE_DROP, 'snare': ACCENT_ONE_DROP},
+        'timing_jitter': 4, 'velocity_jitter': 4,
+    },
+}
+
+# Groove padrão de cada estilo (groove='style')
+STYLE_GROOVES = {'rock': 'rock_push', 'funk': 'funk_pocket', 'jazz': 'jazz_swing', 'blues': 'blues_shuffle', 'reggae': 'reggae_one_drop'}
+
+def resolve_groove(style: str, groove) -> tuple[dict | None, str | None]:
+    """Aceita 'style' (o groove do estilo), o nome de um modelo de GROOVE_TEMPLATES ou um dicionário no mesmo formato."""
+    if isinstance(groove, dict):
+        return {**GROOVE_TEMPLATES['straight'], **groove}, None
+    name = STYLE_GROOVES.get(style) if groove == 'style' else groove
+    if name not in GROOVE_TEMPLATES:
+        return None, f"Groove '{groove}' desconhecido. Use 'style' ou um de: {', '.join(GROOVE_TEMPLATES)}."
+    return GROOVE_TEMPLATES[name], None
+
+def swing_warp(ticks: np.ndarray, swing: float, unit: int) -> np.ndarray:
+    """
+    Deforma o tempo dentro de cada par de `unit`: a metade de cima passa a começar em swing * 2 * unit.
+    É linear por partes, então notas fora da grade (e os finais das notas) acompanham o contratempo.
+    """
+    if swing == 0.5:
+        return ticks
+    cell = 2 * unit
+    base = ticks // cell * cell
+    position = ticks - base
+    split = swing * cell
+    warped = np.where(position < unit, position * (split / unit), split + (position - unit) * ((cell - split) / unit))
+    return base + np.rint(warped).astype(np.int64)
+
+def _curve(accents: dict, name: str):
+    curve = accents.get(name)
+    return None if curve is None else np.asarray(curve, dtype=np.float64)
+
+def apply_groove(events: np.ndarray, track_name: str, groove: dict, rng: np.random.Generator) -> np.ndarray:
+    """
+    Aplica swing, deslocamentos por trilha/peça, curvas de acento e variações aleatórias a todas as notas
+    de uma trilha (NOTE_EVENT_DTYPE) de uma vez. A posição na grade (para os acentos) é a da nota original.
+    """
+    n = len(events)
+    if n == 0:
+        return events.copy()
+    out = events.copy()
+    grid_step = (events['start'] % BAR_TICKS) // S16
+
+    start = swing_warp(events['start'].astype(np.int64), groove['swing'], groove['swing_unit'])
+    end = swing_warp(events['end'].astype(np.int64), groove['swing'], groove['swing_unit'])
+    shift = np.full(n, float(groove['offsets'].get(track_name, 0)))
+    velocity = events['velocity'].astype(np.float64)
+    curve = _curve(groove['accents'], track_name)
+    if curve is not None:
+        velocity *= curve[grid_step]
+    if track_name == 'drums':
+        for piece, ticks in groove['drum_offsets'].items():
+            shift[events['note'] == DRUM_MAP[piece]] += ticks
+        for piece in groove['drum_accents']:
+            is_piece = events['note'] == DRUM_MAP[piece]
+            velocity[is_piece] *= _curve(groove['drum_accents'], piece)[grid_step[is_piece]]
+    if groove['timing_jitter']:
+        shift += rng.normal(0.0, groove['timing_jitter'], n)
+    if groove['velocity_jitter']:
+        velocity += rng.normal(0.0, groove['velocity_jitter'], n)
+
+    duration = np.maximum(end - start, 1)
+    start = np.maximum(start + np.rint(shift).astype(np.int64), 0)
+    end = start + duration
+    # Notas repetidas na mesma altura não podem se sobrepor depois do deslocamento (o note_off cortaria a nota seguinte)
+    order = np.lexsort((start, events['channel'], events['note']))
+    same = (events['note'][order][:-1] == events['note'][order][1:]) & (events['channel'][order][:-1] == events['channel'][order][1:])
+    next_start = start[order][1:]
+    clipped = end[order]
+    clipped[:-1] = np.where(same, np.minimum(clipped[:-1], next_start), clipped[:-1])
+    end[order] = np.maximum(clipped, start[order] + 1)
+
+    out['start'], out['end'] = start, end
+    out['velocity'] = np.clip(np.rint(velocity), 1, 127)
+    return out[np.argsort(out['start'], kind='stable')]
+
+def groove_events(events: dict, groove: dict, seed: int | None = None) -> dict:
+    """Aplica o groove a {'bass', 'drums', 'piano'} -> note_events, com um único gerador aleatório."""
+    rng = np.random.default_rng(seed)
+    return {name: apply_groove(track_events, name, groove, rng) for name, track_events in events.items()}
+
+def groove_tracks(tracks: dict, groove: dict, seed: int | None = None) -> dict:
+    """
+    Versão para trilhas mido. Mensagens que não são notas (program_change da bateria) continuam no início,
+    e o fim da trilha fica onde estava, para o loop manter o tamanho mesmo com pausas no final.
+    """
+    grooved = groove_events({name: note_events.track_to_events(track) for name, track in tracks.items()}, groove, seed)
+    result = {}
+    for name, track in tracks.items():
+        length = sum(msg.time for msg in track)
+        events = grooved[name]
+        # Notas atrasadas no fim do loop terminam no fim do loop, sem aumentar o tamanho do MIDI
+        events['end'] = np.maximum(np.minimum(events['end'], length), events['start'] + 1)
+        new_track = mido.MidiTrack(msg.copy(time=0) for msg in track if not msg.is_meta and msg.type not in ('note_on', 'note_off'))
+        new_track.extend(note_events.events_to_track(events))
+        used = sum(msg.time for msg in new_track)
+        new_track.append(mido.MetaMessage('end_of_track', time=max(length - used, 0)))
+        result[name] = new_track
+    return result
+
+def benchmark(bars: int = 1000, style: str = 'funk'):
+    """Mede o custo do groove em um loop longo, comparado à geração das notas."""
+    import loop_generator
+    started = time.perf_counter()
+    pack, _ = loop_generator.compose_pack(style, bars, 'E', 'minor', 110, '1-minor, 4-minor, 5-dominant7, 1-minor', seed=1)
+    composed = time.perf_counter() - started
+    events = {name: note_events.track_to_events(track) for name, track in pack['tracks'].items()}
+    groove, _ = resolve_groove(style, 'style')
+    started = time.perf_counter()
+    grooved = groove_events(events, groove, seed=1)
+    grooved_time = time.perf_counter() - started
+    notes = sum(len(e) for e in grooved.values())
+    print(f"{bars} compassos, {notes} notas: geração {composed * 1000:.1f} ms; groove {grooved_time * 1000:.2f} ms "
+          f"({notes / grooved_time / 1e6:.1f} M notas/s).")
+
+if __name__ == "__main__":
+    # Uso: python groove.py [compassos] [estilo]
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1000, sys.argv[2] if len(sys.argv) > 2 else 'funk')
@@ -0,0 +1,207 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+
+# Sem display: a janela é desenhada fora da tela (precisa ser definido antes de importar o PyQt6)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+from PyQt6.QtCore import QEventLoop, Qt, QTimer
+from PyQt6.QtWidgets import QApplication
+
+import main_app
+
+# --- HARNESS DE RESPONSIVIDADE DA INTERFACE ---
+
+# Intervalo da sonda do event loop: o atraso de cada disparo além disso é tempo em que a thread da UI ficou bloqueada
+PROBE_INTERVAL_MS = 5
+DEFAULT_BUDGET_MS = 100
+DEFAULT_RUN_TIMEOUT_S = 120
+STYLES = ['rock', 'funk', 'jazz', 'blues', 'reggae']
+
+class EventLoopProbe:
+    """QTimer de alta precisão na thread da UI; registra o atraso de cada disparo (ms)."""
+
+    def __init__(self, interval_ms: int = PROBE_INTERVAL_MS):
+        self.interval_ms = interval_ms
+        self.lags = []
+        self._last = None
+        self.timer = QTimer()
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self._tick)
+
+    def _tick(self):
+        now = time.perf_counter()
+        if self._last is not None:
+            self.lags.append(max(0.0, (now - self._last) * 1000 - self.interval_ms))
+        self._last = now
+
+    def start(self):
+        self._last = None
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+class SignalRecorder:
+    """
+    Atraso entre a emissão de um sinal do Worker (na thread do worker) e a execução do slot na thread da UI.
+    A emissão é marcada por uma conexão direta feita antes das conexões da janela; a entrega, por um
+    invólucro no slot da janela. Os sinais enfileirados chegam em ordem, então emissões e entregas pareiam em FIFO.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.delays = {}
+
+    def emitted(self, name: str):
+        self.pending.setdefault(name, deque()).append(time.perf_counter())
+
+    def delivered(self, name: str):
+        queue = self.pending.get(name)
+        if queue:
+            self.delays.setdefault(name, []).append((time.perf_counter() - queue.popleft()) * 1000)
+
+def instrumented_worker(recorder: SignalRecorder):
+    """Subclasse de main_app.Worker que marca o instante de cada emissão."""
+    class InstrumentedWorker(main_app.Worker):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            for name in ('progress', 'preview', 'finished'):
+                getattr(self, name).connect(lambda *_, name=name: recorder.emitted(name), Qt.ConnectionType.DirectConnection)
+    return InstrumentedWorker
+
+def _wrap_slot(window, slot_name: str, before):
+    original = getattr(window, slot_name)
+    def wrapper(*args):
+        before()
+        return original(*args)
+    # Atributo de instância: start_generation conecta self.<slot>, então passa a conectar o invólucro
+    setattr(window, slot_name, wrapper)
+
+def summarize(values: list[float]) -> dict:
+    if not values:
+        return {'count': 0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+    array = np.asarray(values)
+    return {'count': len(values), 'p50': float(np.percentile(array, 50)), 'p95': float(np.percentile(array, 95)),
+            'max': float(array.max())}
+
+def run_harness(runs: int = 3, budget_ms: float = DEFAULT_BUDGET_MS, styles=None, bars: int | None = None,
+                run_timeout_s: float = DEFAULT_RUN_TIMEOUT_S) -> dict:
+    """
+    Abre a MainWindow (plataforma offscreen), dispara `runs` gerações seguidas (a próxima começa assim que a
+    anterior termina, alternando os estilos) e mede:
+    - atraso do event loop (sonda de PROBE_INTERVAL_MS ms);
+    - atraso de entrega dos sinais progress/preview/finished do Worker até os slots da janela;
+    - tempo até o primeiro retorno (clique -> primeira mensagem em status_output) e duração de cada geração.
+    O relatório tem 'passed' = False se o event loop, um sinal ou o primeiro retorno passarem de budget_ms.
+    """
+    app = QApplication.instance() or QApplication(sys.argv)
+    recorder = SignalRecorder()
+    main_app.Worker = instrumented_worker(recorder)
+    window = main_app.MainWindow()
+    window.show()
+
+    state = {'first_feedback': None, 'finished': False}
+    loop = QEventLoop()
+
+    def on_progress():
+        recorder.delivered('progress')
+        if state['first_feedback'] is None:
+            state['first_feedback'] = time.perf_counter()
+
+    def on_finished():
+        recorder.delivered('finished')
+        state['finished'] = True
+        # Sai do laço depois que o slot original (generation_finished) rodar
+        QTimer.singleShot(0, loop.quit)
+
+    _wrap_slot(window, 'update_status', on_progress)
+    _wrap_slot(window, 'show_preview', lambda: recorder.delivered('preview'))
+    _wrap_slot(window, 'generation_finished', on_finished)
+
+    # Um único timer de limite, reiniciado a cada geração (um singleShot por geração poderia encerrar a seguinte)
+    timeout = QTimer()
+    timeout.setSingleShot(True)
+    timeout.timeout.connect(loop.quit)
+
+    probe = EventLoopProbe()
+    styles = styles or STYLES
+    run_reports = []
+    with tempfile.TemporaryDirectory(prefix="loopgen_gui_") as tmp_dir:
+        previous_dir = os.getcwd()
+        os.chdir(tmp_dir)
+        try:
+            probe.start()
+            for i in range(runs):
+                style = styles[i % len(styles)]
+                window.style_combo.setCurrentText(style)
+                if bars is not None:
+                    window.bars_spinbox.setValue(bars)
+                state.update(first_feedback=None, finished=False)
+                started = time.perf_counter()
+                window.generate_button.click()
+                timeout.start(int(run_timeout_s * 1000))
+                if not state['finished']:
+                    loop.exec()
+                timeout.stop()
+                finished = time.perf_counter()
+                run_reports.append({
+                    'style': style, 'finished': state['finished'], 'duration_ms': (finished - started) * 1000,
+                    'first_feedback_ms': None if state['first_feedback'] is None else (state['first_feedback'] - started) * 1000,
+                })
+            probe.stop()
+        finally:
+            os.chdir(previous_dir)
+            window.close()
+            # Deixa o QThread da última geração terminar antes de destruir os objetos
+            app.processEvents()
+
+    event_loop = summarize(probe.lags)
+    signals = {name: summarize(values) for name, values in recorder.delays.items()}
+    first_feedback = [run['first_feedback_ms'] for run in run_reports if run['first_feedback_ms'] is not None]
+    failures = []
+    if event_loop['max'] > budget_ms:
+        failures.append(f"event loop bloqueado por {event_loop['max']:.1f} ms")
+    for name, summary in signals.items():
+        if summary['max'] > budget_ms:
+            failures.append(f"sinal '{name}' entregue com {summary['max']:.1f} ms de atraso")
+    for i, run in enumerate(run_reports):
+        if not run['finished']:
+            failures.append(f"geração {i + 1} não terminou em {run_timeout_s:.0f} s")
+        elif run['first_feedback_ms'] is None or run['first_feedback_ms'] > budget_ms:
+            failures.append(f"geração {i + 1} sem retorno em {budget_ms:.0f} ms")
+    return {'budget_ms': budget_ms, 'runs': run_reports, 'event_loop_lag_ms': event_loop, 'signal_delay_ms': signals,
+            'first_feedback_ms': summarize(first_feedback), 'failures': failures, 'passed': not failures}
+
+def format_report(report: dict) -> str:
+    def line(label, summary):
+        return f"  {label:<22} p50 {summary['p50']:7.1f}  p95 {summary['p95']:7.1f}  máx {summary['max']:7.1f} ms  ({summary['count']} amostras)"
+    lines = [f"Orçamento: {report['budget_ms']:.0f} ms"]
+    for i, run in enumerate(report['runs']):
+        feedback = "-" if run['first_feedback_ms'] is None else f"{run['first_feedback_ms']:.1f} ms"
+        lines.append(f"  geração {i + 1} ({run['style']}): {run['duration_ms']:.0f} ms, primeiro retorno em {feedback}")
+    lines.append(line("atraso do event loop", report['event_loop_lag_ms']))
+    for name, summary in report['signal_delay_ms'].items():
+        lines.append(line(f"sinal {name}", summary))
+    lines.append(line("primeiro retorno", report['first_feedback_ms']))
+    lines.append("OK: a interface ficou responsiva." if report['passed'] else "FALHOU:\n    " + "\n    ".join(report['failures']))
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mede a responsividade da MainWindow durante gerações (plataforma offscreen).")
+    parser.add_argument('--runs', type=int, default=3, help="gerações seguidas")
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help="bloqueio máximo tolerado da thread da UI")
+    parser.add_argument('--styles', default=",".join(STYLES), help="estilos alternados entre as gerações")
+    parser.add_argument('--bars', type=int, help="compassos (padrão: o de cada estilo)")
+    args = parser.parse_args(argv)
+    report = run_harness(args.runs, args.budget_ms, args.styles.split(','), args.bars)
+    print(format_report(report))
+    sys.exit(0 if report['passed'] else 1)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,129 @@
+import sys
+import time
+
+# --- LILYPOND COMPACTO (VARIÁVEIS E \repeat PARA COMPASSOS REPETIDOS) ---
+
+# Maior frase (em compassos) procurada como unidade de repetição
+MAX_PHRASE_BARS = 16
+# Frases de até 2 compassos viram '\repeat percent' (o sinal de % de compasso repetido); maiores, '\repeat unfold'
+PERCENT_MAX_BARS = 2
+# Nome das variáveis de cada pauta (evita '\drums', que já é um atalho do LilyPond)
+STAFF_VARIABLES = {'piano': 'pianoMusic', 'bass': 'bassMusic', 'drums': 'drumsMusic'}
+# Pautas em drummode precisam que as variáveis também sejam definidas em drummode
+DRUM_STAVES = ('drums',)
+
+def split_bars(snippet: str) -> list[str]:
+    """Trecho gerado ('c4 d4 e4 f4 | g1 | ') -> um texto por compasso, sem as barras."""
+    return [bar.strip() for bar in snippet.split('|') if bar.strip()]
+
+def find_repeats(bars: list[str], max_unit: int = MAX_PHRASE_BARS) -> list[tuple[int, int, int]]:
+    """
+    Divide a sequência de compassos em blocos (início, tamanho_da_frase, repetições), da esquerda para a direita.
+    Em cada posição escolhe a frase que mais economiza compassos escritos ((repetições - 1) * tamanho);
+    no empate, a frase mais curta. Compassos sem repetição ficam como blocos de 1 compasso e 1 repetição.
+    """
+    blocks = []
+    i, n = 0, len(bars)
+    while i < n:
+        best_unit, best_count, best_saved = 1, 1, 0
+        for unit in range(1, min(max_unit, (n - i) // 2) + 1):
+            phrase = bars[i:i + unit]
+            count = 1
+            while bars[i + count * unit:i + (count + 1) * unit] == phrase:
+                count += 1
+            saved = (count - 1) * unit
+            if saved > best_saved:
+                best_unit, best_count, best_saved = unit, count, saved
+        blocks.append((i, best_unit, best_count))
+        i += best_unit * best_count
+    return blocks
+
+def _variable_name(staff: str, index: int) -> str:
+    # Identificadores do LilyPond não aceitam dígitos: A, B, ..., Z, AA, AB, ...
+    letters = ""
+    index += 1
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return f"{STAFF_VARIABLES.get(staff, staff)}{letters}"
+
+def _define(name: str, staff: str, music: str) -> str:
+    mode = "\\drummode " if staff in DRUM_STAVES else ""
+    return f"{name} = {mode}{{ {music} }}"
+
+def compact_staff(staff: str, bars: list[str], definitions: list[str]) -> str:
+    """
+    Música compacta de uma pauta: cada frase repetida vira '\\repeat percent/unfold N { ... }'.
+    Frases de 2+ compassos, ou usadas em mais de um bloco, viram variáveis (acrescentadas a definitions)
+    e são referenciadas pelo nome; frases idênticas compartilham a mesma variável.
+    """
+    blocks = find_repeats(bars)
+    phrases = [" | ".join(bars[start:start + unit]) + " |" for start, unit, _ in blocks]
+    uses = {}
+    for (_, _, count), phrase in zip(blocks, phrases):
+        if count > 1:
+            uses[phrase] = uses.get(phrase, 0) + 1
+    names = {}
+    parts = []
+    for (start, unit, count), phrase in zip(blocks, phrases):
+        if count == 1:
+            parts.append(phrase)
+            continue
+        body = phrase
+        if unit > 1 or uses[phrase] > 1:
+            if phrase not in names:
+                names[phrase] = _variable_name(staff, len(names))
+                definitions.append(_define(names[phrase], staff, phrase))
+            body = f"\\{names[phrase]}"
+        kind = "percent" if unit <= PERCENT_MAX_BARS else "unfold"
+        parts.append(f"\\repeat {kind} {count} {{ {body} }}")
+    return " ".join(parts)
+
+def _common_period(sequences: list[list[str]]) -> int | None:
+    """Menor período P tal que todas as pautas são exatamente k cópias dos seus P primeiros compassos (k >= 2)."""
+    n = len(sequences[0])
+    if any(len(bars) != n for bars in sequences):
+        return None
+    for period in range(1, n // 2 + 1):
+        if n % period == 0 and all(bars == bars[:period] * (n // period) for bars in sequences):
+            return period
+    return None
+
+def compact_score(staves: dict[str, str]) -> tuple[list[str], dict[str, str]]:
+    """
+    Compacta os trechos {pauta: trecho_gerado} de uma partitura. Devolve (definições, {pauta: música}):
+    as definições de variáveis vão antes do '\\score' e cada música é referenciada como '\\<pauta>Music'.
+
+    Quando todas as pautas repetem o loop inteiro exatamente 2 vezes, ele vira um '\\repeat volta 2'
+    (barras de ritornelo valem para a partitura toda, então só são usadas quando todas as pautas concordam);
+    dentro dele, e em qualquer outro caso, cada pauta é compactada por conta própria (veja compact_staff).
+    """
+    bars = {staff: split_bars(snippet) for staff, snippet in staves.items()}
+    period = _common_period(list(bars.values()))
+    volta = period is not None and len(next(iter(bars.values()))) == 2 * period
+    definitions, music = [], {}
+    for staff, staff_bars in bars.items():
+        body = compact_staff(staff, staff_bars[:period] if volta else staff_bars, definitions)
+        if volta:
+            body = f"\\repeat volta 2 {{ {body} }}"
+        name = STAFF_VARIABLES.get(staff, staff)
+        definitions.append(_define(name, staff, body))
+        music[staff] = f"\\{name}"
+    return definitions, music
+
+def benchmark(bars: int = 256):
+    """Compara o tamanho do .ly expandido e do compacto para cada estilo."""
+    # Importado aqui porque loop_generator depende deste módulo
+    import loop_generator
+    for style in ('rock', 'funk', 'jazz', 'blues', 'reggae'):
+        pack, _ = loop_generator.compose_pack(style, bars, 'C', 'major', 120, '1-major,6-minor,4-major,5-major', seed=1)
+        ly = pack['lilypond']
+        started = time.perf_counter()
+        compact = loop_generator.build_lilypond_source(ly['bass'], ly['drums'], ly['piano'], style)
+        elapsed = time.perf_counter() - started
+        expanded = len(ly['bass']) + len(ly['drums']) + len(ly['piano'])
+        print(f"{style:>7}: {expanded / 1024:7.1f} KiB de notas -> {len(compact) / 1024:6.1f} KiB de .ly ({elapsed * 1000:.1f} ms)")
+
+if __name__ == "__main__":
+    # Uso: python lilypond_compact.py [compassos]
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 256)
@@ -0,0 +1,138 @@
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import lilypond_compact
+import loop_generator
+import metrics
+
+# --- RENDERIZAÇÃO DA PARTITURA EM SEÇÕES PARALELAS ---
+
+# A partir de quantos compassos a partitura é dividida em seções renderizadas em paralelo
+PARALLEL_MIN_BARS = 128
+# Diagramação fixa (quebras de linha e de página explícitas), para saber de antemão onde cada página começa
+BARS_PER_SYSTEM = 4
+SYSTEMS_PER_PAGE = 5
+# A primeira página tem um sistema a menos por causa do título
+FIRST_PAGE_SYSTEMS = SYSTEMS_PER_PAGE - 1
+PAGE_HEADER = "\\markup \\fill-line { \\fromproperty #'header:title \\fromproperty #'page:page-number-string }"
+
+def page_plan(bars: int) -> list[list[int]]:
+    """Compassos de cada sistema, agrupados por página: [[4, 4, 4, 4], [4, 4, 4, 4, 4], ..., [4, 2]]."""
+    pages, bar = [], 0
+    while bar < bars:
+        systems = []
+        for _ in range(FIRST_PAGE_SYSTEMS if not pages else SYSTEMS_PER_PAGE):
+            if bar >= bars:
+                break
+            systems.append(min(BARS_PER_SYSTEM, bars - bar))
+            bar += systems[-1]
+        pages.append(systems)
+    return pages
+
+def plan_sections(bars: int, sections: int) -> list[dict]:
+    """
+    Divide a partitura em até `sections` seções com números de páginas equilibrados, sempre em quebras de página.
+    Cada seção: {'first_bar' (0-based), 'bars', 'first_page' (1-based), 'pages' (sistemas por página)}.
+    """
+    pages = page_plan(bars)
+    count = min(max(1, sections), len(pages))
+    result, bar, first = [], 0, 0
+    for index in range(count):
+        section_pages = pages[first:first + len(pages) // count + (index < len(pages) % count)]
+        section_bars = sum(sum(page) for page in section_pages)
+        result.append({'first_bar': bar, 'bars': section_bars, 'first_page': first + 1, 'pages': section_pages})
+        bar += section_bars
+        first += len(section_pages)
+    return result
+
+def section_settings(section: dict, title_page: bool) -> dict:
+    """
+    Trechos extras do .ly de uma seção (veja o parâmetro section de loop_generator.build_lilypond_source):
+    numeração de página e de compasso contínuas, o mesmo cabeçalho em todas as páginas, título só na
+    primeira seção e quebras de linha/página explícitas (uma voz de pausas invisíveis em paralelo ao piano).
+    """
+    paper = [f"first-page-number = {section['first_page']}", "print-first-page-number = ##t",
+             f"oddHeaderMarkup = {PAGE_HEADER}", f"evenHeaderMarkup = {PAGE_HEADER}"]
+    if not title_page:
+        paper += ["bookTitleMarkup = ##f", "scoreTitleMarkup = ##f"]
+    breaks = [f"\\set Score.currentBarNumber = #{section['first_bar'] + 1}"]
+    if section['first_bar']:
+        breaks.append("\\set Score.barNumberVisibility = #all-bar-numbers-visible")
+    for page_index, systems in enumerate(section['pages']):
+        for system_index, system_bars in enumerate(systems):
+            breaks.append(f"s1*{system_bars}")
+            if system_index < len(systems) - 1:
+                breaks.append("\\break")
+            elif page_index < len(section['pages']) - 1:
+                breaks.append("\\pageBreak")
+    layout = ("\\context { \\Score \\override NonMusicalPaperColumn.line-break-permission = ##f "
+              "\\override NonMusicalPaperColumn.page-break-permission = ##f }")
+    return {'paper': "\n  ".join(paper), 'layout': layout, 'breaks': " ".join(breaks)}
+
+def section_sources(ly: dict, title: str, workers: int, transpose: int = 0) -> list[str]:
+    """Código-fonte LilyPond de cada seção, a partir dos trechos {'bass', 'drums', 'piano'} completos."""
+    bars = {staff: lilypond_compact.split_bars(snippet) for staff, snippet in ly.items()}
+    total = min(len(staff_bars) for staff_bars in bars.values())
+    sources = []
+    for index, section in enumerate(plan_sections(total, workers)):
+        start, end = section['first_bar'], section['first_bar'] + section['bars']
+        part = {staff: " | ".join(staff_bars[start:end]) + " | " for staff, staff_bars in bars.items()}
+        sources.append(loop_generator.build_lilypond_source(part['bass'], part['drums'], part['piano'], title,
+                                                           transpose=transpose, section=section_settings(section, index == 0)))
+    return sources
+
+def _render_section(tmp_dir: str, index: int, source: str) -> str:
+    name = f"section_{index:03d}"
+    ly_filepath = os.path.join(tmp_dir, name + ".ly")
+    with open(ly_filepath, "w", encoding='utf-8') as f: f.write(source)
+    subprocess.run(["lilypond", "-o", os.path.join(tmp_dir, name), ly_filepath], check=True, capture_output=True, text=True)
+    return os.path.join(tmp_dir, name + ".pdf")
+
+def merge_pdfs(pdf_paths: list[str], output_path: str):
+    """Junta os PDFs em ordem com o Ghostscript ('gs' no PATH; as distribuições oficiais do LilyPond não o trazem)."""
+    subprocess.run(["gs", "-q", "-dBATCH", "-dNOPAUSE", "-sDEVICE=pdfwrite", f"-sOutputFile={output_path}", *pdf_paths],
+                   check=True, capture_output=True, text=True)
+
+def render_pdf_bytes_parallel(ly: dict, title: str, filename: str, workers: int | None = None, transpose: int = 0) -> bytes | None:
+    """
+    Renderiza a partitura em seções (uma por processo LilyPond, em paralelo) e junta os PDFs em um só.
+    Se uma seção ou a junção falhar (ex.: sem Ghostscript), renderiza a partitura inteira em um só processo
+    (loop_generator.render_pdf_bytes). Devolve os bytes do PDF, ou None se o LilyPond falhar.
+    """
+    workers = workers or os.cpu_count() or 1
+    sources = section_sources(ly, title, workers, transpose)
+    with tempfile.TemporaryDirectory(prefix="loopgen_ly_") as tmp_dir:
+        try:
+            print(f"\nChamando LilyPond para gerar '{filename}.pdf' em {len(sources)} seções paralelas...")
+            started = time.perf_counter()
+            with metrics.timed('loopgen_stage_seconds', stage='score'):
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    pdf_paths = list(executor.map(lambda item: _render_section(tmp_dir, *item), enumerate(sources)))
+                output_path = os.path.join(tmp_dir, filename + ".pdf")
+                merge_pdfs(pdf_paths, output_path)
+        except FileNotFoundError as e:
+            if e.filename == "lilypond":
+                metrics.inc('loopgen_lilypond_renders_total', status='missing')
+                print("\n--- ERRO --- \n'lilypond' não foi encontrado. Verifique se está instalado e no PATH do sistema.")
+                return None
+            print(f"'{e.filename}' não foi encontrado; renderizando a partitura inteira em um só processo.")
+            return _render_whole(ly, title, filename, transpose)
+        except subprocess.CalledProcessError as e:
+            print(f"\nFalha na renderização em seções ({e.cmd[0]}); renderizando a partitura inteira em um só processo.\n{e.stderr}")
+            return _render_whole(ly, title, filename, transpose)
+        metrics.inc('loopgen_lilypond_renders_total', status='ok')
+        with open(output_path, "rb") as f:
+            print(f"Partitura em PDF gerada com sucesso! ({time.perf_counter() - started:.1f} s)")
+            return f.read()
+
+def _render_whole(ly: dict, title: str, filename: str, transpose: int) -> bytes | None:
+    source = loop_generator.build_lilypond_source(ly['bass'], ly['drums'], ly['piano'], title, transpose=transpose)
+    return loop_generator.render_pdf_bytes(source, filename)
+
+def should_render_parallel(bars: int, workers: int | None = None) -> bool:
+    """Seções paralelas só valem com partitura longa, mais de um núcleo e o Ghostscript para juntar os PDFs."""
+    return bars >= PARALLEL_MIN_BARS and (workers or os.cpu_count() or 1) > 1 and shutil.which("gs") is not None
@@ -0,0 +1,236 @@
+import heapq
+import sys
+import threading
+import time
+
+import mido
+import numpy as np
+
+import loop_generator
+from loop_generator import TICKS_PER_BEAT
+import variation_engine
+
+# --- REPRODUÇÃO AO VIVO (AGENDADOR MIDI EM TEMPO REAL) ---
+
+BAR_TICKS = TICKS_PER_BEAT * 4
+# Canais e timbres (General MIDI) na porta ao vivo: nos arquivos, cada instrumento tem a sua trilha
+LIVE_CHANNELS = {'piano': 0, 'bass': 1, 'drums': 9}
+LIVE_PROGRAMS = {'piano': 0, 'bass': 33}
+# Quanto antes do alvo o agendador para de dormir e passa a esperar ativamente (o sleep do SO erra por ~1 ms)
+SPIN_SECONDS = 0.002
+# Atraso acima do qual o relógio é reancorado, em vez de despejar as mensagens atrasadas de uma vez
+RESYNC_SECONDS = 0.050
+
+class LoopbackPort:
+    """
+    Substituto de uma porta de saída mido para testes: guarda (instante, mensagem) de cada envio,
+    com o mesmo relógio do agendador, em vez de tocar em um sintetizador.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.messages = []
+        self.closed = False
+
+    def send(self, msg: mido.Message):
+        self.messages.append((self.clock(), msg))
+
+    def close(self):
+        self.closed = True
+
+def open_output(name: str | None = None, virtual: bool = False):
+    """Abre uma porta MIDI real (precisa de um backend do mido, como python-rtmidi). Retorna (porta, None) ou (None, erro)."""
+    try:
+        return mido.open_output(name, virtual=virtual), None
+    except (OSError, ImportError, IOError) as e:
+        return None, f"Não foi possível abrir a porta MIDI '{name or 'padrão'}': {e}"
+
+class LiveLoopSource:
+    """
+    Gera o loop um ciclo da progressão por vez (12 compassos no blues), com o motor vetorizado de variações.
+    O custo de cada chamada depende só do tamanho do ciclo, não de quanto tempo a música já tocou.
+    """
+
+    def __init__(self, style: str, key: str, scale: str, progression_string: str, seed: int | None = None, groove=None):
+        self.style, self.key, self.scale = style, key, scale
+        self.progression_string = progression_string
+        self.groove = groove
+        if style == 'blues':
+            self.chunk_bars = 12
+        else:
+            progression, error = loop_generator.parse_progression_string(progression_string)
+            if error:
+                raise ValueError(error)
+            self.chunk_bars = max(1, len(progression))
+        self._rng = np.random.default_rng(seed)
+
+    def next_chunk(self) -> tuple[dict, int]:
+        """Próximo ciclo: ({'bass', 'drums', 'piano'} -> note_events, compassos). Notas além do ciclo são cortadas."""
+        variations, error = variation_engine.generate_variations(
+            self.style, self.key, self.scale, self.chunk_bars, self.progression_string, 1,
+            seed=int(self._rng.integers(2**32)), groove=self.groove
+        )
+        if error:
+            raise ValueError(error)
+        length = self.chunk_bars * BAR_TICKS
+        chunk = {}
+        for name, events in variations[0].items():
+            events = events[events['start'] < length].copy()
+            events['end'] = np.minimum(events['end'], length)
+            chunk[name] = events
+        return chunk, self.chunk_bars
+
+class JitterStats:
+    """Atraso de cada mensagem em relação ao instante agendado e tempo gasto gerando cada ciclo."""
+
+    def __init__(self):
+        self.lateness = []
+        self.generation = []
+        self.resyncs = 0
+
+    def summary(self) -> dict:
+        late = np.array(self.lateness) * 1000
+        generation = np.array(self.generation) * 1000
+        result = {'messages': len(late), 'resyncs': self.resyncs, 'chunks': len(generation)}
+        if len(late):
+            result.update({
+                'jitter_mean_ms': float(late.mean()), 'jitter_p50_ms': float(np.percentile(late, 50)),
+                'jitter_p95_ms': float(np.percentile(late, 95)), 'jitter_p99_ms': float(np.percentile(late, 99)),
+                'jitter_max_ms': float(late.max()), 'late_over_1ms': int((late > 1.0).sum()),
+            })
+        if len(generation):
+            result.update({'generation_mean_ms': float(generation.mean()), 'generation_max_ms': float(generation.max())})
+        return result
+
+class LivePlayer:
+    """
+    Toca um LiveLoopSource em uma porta de saída mido, gerando os ciclos seguintes enquanto o atual toca.
+
+    Os instantes são calculados a partir de uma âncora fixa (t0 + tick * segundos_por_tick), então erros de
+    espera não se acumulam; se o atraso passar de RESYNC_SECONDS (processo suspenso, por exemplo), a âncora
+    é movida para frente. Cada espera dorme até SPIN_SECONDS antes do alvo e termina em espera ativa.
+    """
+
+    def __init__(self, port, source: LiveLoopSource, bpm: float, lookahead_bars: int = 1, clock=time.perf_counter,
+                 sleep=time.sleep):
+        self.port = port
+        self.source = source
+        self.bpm = bpm
+        self.lookahead_bars = lookahead_bars
+        self.clock = clock
+        self.sleep = sleep
+        self.stats = JitterStats()
+        self._stop = threading.Event()
+        self._queue = []
+        self._sequence = 0
+        self._scheduled_bars = 0
+
+    def stop(self):
+        """Pode ser chamado de outra thread; as notas soando são desligadas ao sair."""
+        self._stop.set()
+
+    def _schedule_chunk(self):
+        started = self.clock()
+        chunk, bars = self.source.next_chunk()
+        self.stats.generation.append(self.clock() - started)
+        base = self._scheduled_bars * BAR_TICKS
+        for name, events in chunk.items():
+            channel = LIVE_CHANNELS[name]
+            for start, end, note, velocity in zip((events['start'] + base).tolist(), (events['end'] + base).tolist(),
+                                                  events['note'].tolist(), events['velocity'].tolist()):
+                # No mesmo tick, note_off (0) sai antes de note_on (1)
+                heapq.heappush(self._queue, (end, 0, self._sequence, mido.Message('note_off', channel=channel, note=note, velocity=64)))
+                heapq.heappush(self._queue, (start, 1, self._sequence, mido.Message('note_on', channel=channel, note=note, velocity=velocity)))
+                self._sequence += 1
+        self._scheduled_bars += bars
+
+    def _wait_until(self, target: float):
+        remaining = target - self.clock()
+        if remaining > SPIN_SECONDS:
+            self.sleep(remaining - SPIN_SECONDS)
+        while self.clock() < target:
+            pass
+
+    def play(self, bars: int | None = None, start_delay: float = 0.05) -> dict:
+        """
+        Toca até `bars` compassos (sem limite: até stop()). Retorna o resumo de JitterStats.
+        O próximo ciclo é gerado quando o agendado termina a menos de lookahead_bars da posição atual.
+        """
+        seconds_per_tick = 60.0 / self.bpm / TICKS_PER_BEAT
+        for name, program in LIVE_PROGRAMS.items():
+            self.port.send(mido.Message('program_change', channel=LIVE_CHANNELS[name], program=program))
+        t0 = self.clock() + start_delay
+        try:
+            while not self._stop.is_set():
+                now_tick = (self.clock() - t0) / seconds_per_tick
+                wanted = now_tick / BAR_TICKS + self.lookahead_bars + 1
+                while self._scheduled_bars < wanted and (bars is None or self._scheduled_bars < bars):
+                    self._schedule_chunk()
+                if not self._queue:
+                    break
+                tick = self._queue[0][0]
+                if bars is not None and tick > bars * BAR_TICKS:
+                    break
+                target = t0 + tick * seconds_per_tick
+                # Espera em fatias curtas, para gerar o próximo ciclo e atender stop() mesmo em pausas longas
+                if target - self.clock() > 0.1:
+                    self.sleep(0.05)
+                    continue
+                self._wait_until(target)
+                _, _, _, msg = heapq.heappop(self._queue)
+                self.port.send(msg)
+                late = self.clock() - target
+                if late > RESYNC_SECONDS:
+                    t0 += late
+                    self.stats.resyncs += 1
+                self.stats.lateness.append(late)
+        finally:
+            for channel in set(LIVE_CHANNELS.values()):
+                self.port.send(mido.Message('control_change', channel=channel, control=123, value=0))
+        return self.stats.summary()
+
+def run_live(style_to_generate, key, scale, bpm, progression_string, bars=None, port=None, seed=None, groove=None,
+             lookahead_bars=1):
+    """
+    Toca o estilo ao vivo em `port` (uma porta mido; padrão: LoopbackPort, para testes sem sintetizador).
+    Retorna (resumo_de_jitter, None) ou (None, erro).
+    """
+    try:
+        source = LiveLoopSource(style_to_generate, key, scale, progression_string, seed=seed, groove=groove)
+    except ValueError as e:
+        return None, str(e)
+    port = port if port is not None else LoopbackPort()
+    print(f"--- Tocando {style_to_generate.capitalize()} ao vivo a {bpm} BPM ---")
+    player = LivePlayer(port, source, bpm, lookahead_bars=lookahead_bars)
+    try:
+        return player.play(bars), None
+    except KeyboardInterrupt:
+        player.stop()
+        return player.stats.summary(), None
+
+if __name__ == "__main__":
+    # Uso: python live_playback.py [estilo] [bpm] [compassos] [--port NOME]
+    args = sys.argv[1:]
+    port_name = None
+    if '--port' in args:
+        position = args.index('--port')
+        port_name = args[position + 1]
+        del args[position:position + 2]
+    style = args[0] if args else 'funk'
+    defaults = {'rock': ('E', 'minor', '1-minor, 6-major, 7-major, 5-major'), 'funk': ('E', 'minor', '1-minor, 4-minor, 5-dominant7, 1-minor'),
+                'jazz': ('C', 'major', '2-minor7, 5-dominant7, 1-major7, 1-major7'), 'blues': ('A', 'major', ''),
+                'reggae': ('A', 'minor', '1-minor, 1-minor, 4-minor, 4-minor')}
+    key, scale, progression = defaults[style]
+    output = None
+    if port_name:
+        output, error = open_output(port_name)
+        if error:
+            print(error)
+            sys.exit(1)
+    summary, error = run_live(style, key, scale, int(args[1]) if len(args) > 1 else 110, progression,
+                              bars=int(args[2]) if len(args) > 2 else 4, port=output, groove='style')
+    if error:
+        print(f"Erro: {error}")
+        sys.exit(1)
+    for name, value in summary.items():
+        print(f"  {name}: {value:.3f}" if isinstance(value, float) else f"  {name}: {value}")
@@ -0,0 +1,161 @@
+import io
+import sys
+import time
+
+import mido
+import numpy as np
+
+import note_events
+from loop_generator import TICKS_PER_BEAT
+
+# --- IMPRESSÕES DIGITAIS DE LOOPS (MINHASH + LSH) ---
+
+FINGERPRINT_TRACKS = ('bass', 'drums', 'piano')
+NGRAM = 3
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+STEP_TICKS = TICKS_PER_BEAT // 4
+DEFAULT_THRESHOLD = 0.8
+
+_rng = np.random.default_rng(0x5EED)
+# Hash multiplicativo (a * x + b mod 2^64, 32 bits altos) com 'a' ímpar: uma permutação por linha da assinatura
+_HASH_A = _rng.integers(1, 2**63, NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_HASH_B = _rng.integers(0, 2**63, NUM_PERM, dtype=np.uint64)
+_EMPTY = np.uint32(0xFFFFFFFF)
+
+def track_shingles(events: np.ndarray) -> np.ndarray:
+    """
+    N-gramas de notas consecutivas quantizadas em semicolcheias: (posição no compasso, nota, passos até a próxima).
+    A posição é relativa ao compasso, então um padrão repetido gera os mesmos n-gramas em qualquer compasso.
+    """
+    if len(events) < NGRAM:
+        return np.zeros(0, dtype=np.uint64)
+    steps = np.rint(events['start'] / STEP_TICKS).astype(np.int64)
+    order = np.lexsort((events['note'], steps))
+    steps, notes = steps[order], events['note'][order].astype(np.int64)
+    gaps = np.minimum(np.diff(steps, append=steps[-1]), 63)
+    tokens = ((steps % 16) << 13) | ((notes & 0x7F) << 6) | gaps
+    shingles = np.zeros(len(tokens) - NGRAM + 1, dtype=np.uint64)
+    for i in range(NGRAM):
+        shingles = (shingles << np.uint64(17)) | tokens[i:len(tokens) - NGRAM + 1 + i].astype(np.uint64)
+    return np.unique(shingles)
+
+def minhash(shingles: np.ndarray) -> np.ndarray:
+    """Assinatura MinHash (NUM_PERM valores uint32) de um conjunto de n-gramas."""
+    if len(shingles) == 0:
+        return np.full(NUM_PERM, _EMPTY, dtype=np.uint32)
+    hashed = (_HASH_A[:, None] * shingles[None, :] + _HASH_B[:, None]) >> np.uint64(32)
+    return hashed.min(axis=1).astype(np.uint32)
+
+def events_fingerprint(events: dict) -> np.ndarray:
+    """Impressão digital de um pack: uma assinatura MinHash por trilha, shape (3, NUM_PERM)."""
+    return np.stack([
+        minhash(track_shingles(events.get(name, np.zeros(0, dtype=note_events.NOTE_EVENT_DTYPE))))
+        for name in FINGERPRINT_TRACKS
+    ])
+
+def tracks_fingerprint(tracks: dict) -> np.ndarray:
+    """Igual a events_fingerprint, a partir das trilhas mido ({'bass', 'drums', 'piano'})."""
+    return events_fingerprint({name: note_events.track_to_events(track) for name, track in tracks.items()})
+
+def midi_bytes_fingerprint(data: bytes) -> np.ndarray:
+    """Impressão digital a partir dos bytes de um '*_full_mix.mid' (trilhas na ordem baixo, piano, bateria)."""
+    mid = mido.MidiFile(file=io.BytesIO(data))
+    return tracks_fingerprint(dict(zip(('bass', 'piano', 'drums'), mid.tracks)))
+
+def similarity(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Similaridade de Jaccard estimada por trilha (fração de linhas iguais das assinaturas)."""
+    return (a == b).mean(axis=-1)
+
+class DuplicateIndex:
+    """
+    Índice LSH de impressões digitais. Cada banda junta LSH_ROWS linhas de cada trilha, então dois packs
+    só caem no mesmo balde quando baixo, bateria e piano coincidem ao mesmo tempo nessas linhas
+    (a bateria é fixa por estilo e sozinha não gera candidatos). Os candidatos são confirmados
+    pela similaridade estimada de cada trilha, sem comparar todos os pares.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.labels = []
+        self.fingerprints = []
+        self._buckets = [{} for _ in range(LSH_BANDS)]
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @staticmethod
+    def _band_keys(fingerprint: np.ndarray) -> list[bytes]:
+        bands = fingerprint.reshape(len(FINGERPRINT_TRACKS), LSH_BANDS, LSH_ROWS)
+        return [bands[:, band].tobytes() for band in range(LSH_BANDS)]
+
+    def _candidates(self, keys: list[bytes]) -> set[int]:
+        candidates = set()
+        for buckets, key in zip(self._buckets, keys):
+            candidates.update(buckets.get(key, ()))
+        return candidates
+
+    def find(self, fingerprint: np.ndarray) -> list[tuple[str, float]]:
+        """Packs já indexados quase idênticos a fingerprint: lista de (rótulo, menor similaridade entre as trilhas)."""
+        matches = []
+        for i in self._candidates(self._band_keys(fingerprint)):
+            score = float(similarity(self.fingerprints[i], fingerprint).min())
+            if score >= self.threshold:
+                matches.append((self.labels[i], score))
+        return sorted(matches, key=lambda match: -match[1])
+
+    def add(self, label: str, fingerprint: np.ndarray):
+        i = len(self.labels)
+        self.labels.append(label)
+        self.fingerprints.append(fingerprint)
+        for buckets, key in zip(self._buckets, self._band_keys(fingerprint)):
+            buckets.setdefault(key, []).append(i)
+
+    def admit(self, label: str, fingerprint: np.ndarray) -> str | None:
+        """Adiciona o pack se ele não for quase idêntico a nenhum outro. Retorna o rótulo do duplicado, ou None."""
+        matches = self.find(fingerprint)
+        if matches:
+            return matches[0][0]
+        self.add(label, fingerprint)
+        return None
+
+    def duplicate_pairs(self) -> list[tuple[str, str, float]]:
+        """Todos os pares quase idênticos do índice, em tempo proporcional aos tamanhos dos baldes."""
+        pairs = set()
+        for buckets in self._buckets:
+            for members in buckets.values():
+                for a_pos, a in enumerate(members):
+                    for b in members[a_pos + 1:]:
+                        pairs.add((a, b))
+        results = []
+        for a, b in pairs:
+            score = float(similarity(self.fingerprints[a], self.fingerprints[b]).min())
+            if score >= self.threshold:
+                results.append((self.labels[a], self.labels[b], score))
+        return sorted(results, key=lambda pair: -pair[2])
+
+def benchmark(n: int = 100_000, threshold: float = DEFAULT_THRESHOLD):
+    """Mede a indexação e a busca de pares em n impressões digitais sintéticas (1% de quase duplicados)."""
+    rng = np.random.default_rng(1)
+    fingerprints = rng.integers(0, 2**32, (n, len(FINGERPRINT_TRACKS), NUM_PERM), dtype=np.uint32)
+    copies = rng.choice(n, n // 100, replace=False)
+    originals = rng.choice(n, n // 100, replace=False)
+    fingerprints[copies] = fingerprints[originals]
+    mutated = rng.random(fingerprints[copies].shape) < 0.05
+    fingerprints[copies] = np.where(mutated, rng.integers(0, 2**32, mutated.shape, dtype=np.uint32), fingerprints[copies])
+
+    index = DuplicateIndex(threshold)
+    started = time.perf_counter()
+    for i in range(n):
+        index.add(str(i), fingerprints[i])
+    indexed = time.perf_counter() - started
+    started = time.perf_counter()
+    pairs = index.duplicate_pairs()
+    searched = time.perf_counter() - started
+    print(f"{n} packs indexados em {indexed:.2f}s; {len(pairs)} pares quase idênticos encontrados em {searched:.2f}s "
+          f"({len(copies)} plantados; {n * (n - 1) // 2:.2e} pares possíveis).")
+
+if __name__ == "__main__":
+    # Uso: python loop_fingerprint.py [quantidade_de_packs]
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
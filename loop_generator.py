@@ -3,9 +3,17 @@ import random
 import time
 import os
 import subprocess
+import tempfile
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
-import numpy as np
+
+import lilypond_compact
+import metrics
+import pack_archive
 
 # --- 1. CONFIGURAÇÃO E CONSTANTES ---
 
@@ -16,6 +24,8 @@ DRUM_MAP = {'kick': 36, 'snare': 38, 'closed_hat': 42, 'open_hat': 46, 'crash':
 LILYPOND_NOTE_NAMES = ['c', 'cis', 'd', 'dis', 'e', 'f', 'fis', 'g', 'gis', 'a', 'ais', 'b']
 LILYPOND_DRUM_MAP = {'kick': 'bd', 'snare': 'sn', 'closed_hat': 'hh', 'open_hat': 'ho', 'crash': 'cc', 'ride': 'cymr'}
 TICKS_PER_BEAT = 480
+# Versão do gerador: mude sempre que a saída para os mesmos parâmetros mudar (invalida o cache de packs).
+GENERATOR_VERSION = "1.5.2"
 
 # --- 2. FUNÇÕES AUXILIARES ---
 
@@ -154,6 +164,16 @@ def generate_reggae_bassline(key: str, scale: str, bars: int, progression: list)
 
 # --- 4. FUNÇÕES DE GERAÇÃO DE BATERIA (MIDI) ---
 
+# Padrões de bateria de cada estilo (16 semicolcheias por peça): fonte única para os geradores generate_*_drums,
+# a partitura (DRUM_PATTERNS), variation_engine e drum_engine
+DRUM_MIDI_PATTERNS = {
+    'rock': {'kick': [1,0,0,0,1,0,0,0,1,0,0,0,1,0,0,0], 'snare': [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0], 'closed_hat': [1,0,1,0,1,0,1,0,1,0,1,0,1,0,1,0]},
+    'funk': {'kick': [1,0,0,0,0,0,1,0,1,1,0,0,0,0,1,0], 'snare': [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0], 'closed_hat': [1,1,1,1,1,1,1,0,1,1,1,1,1,1,1,0], 'open_hat': [0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,1]},
+    'jazz': {'ride': [1,0,1,0,1,0,1,0,1,0,1,0,1,0,1,0], 'closed_hat': [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0], 'kick': [1,0,0,0,0,0,0,0,0,0,1,0,0,0,0,1]},
+    'blues': {'kick': [1,0,0,0,1,0,0,0,1,0,0,0,1,0,0,0], 'snare': [0,0,0,0,1,0,0,1,0,0,0,0,1,0,0,1], 'closed_hat': [1,0,1,0,1,0,1,0,1,0,1,0,1,0,1,0]},
+    'reggae': {'kick': [0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0], 'snare': [0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0], 'closed_hat': [0,0,1,0,0,0,1,0,0,0,1,0,0,0,1,0]},
+}
+
 def generate_drum_track(bars: int, pattern: list) -> mido.MidiTrack:
     track = mido.MidiTrack()
     track.append(mido.Message('program_change', channel=9, program=0, time=0))
@@ -171,23 +191,24 @@ def generate_drum_track(bars: int, pattern: list) -> mido.MidiTrack:
     return _convert_absolute_times_to_delta(track)
 
 def generate_rock_drums(bars: int) -> mido.MidiTrack:
-    pattern = {'kick': [1,0,0,0,1,0,0,0,1,0,0,0,1,0,0,0], 'snare': [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0], 'closed_hat': [1,0,1,0,1,0,1,0,1,0,1,0,1,0,1,0]}
-    return generate_drum_track(bars, pattern)
+    return generate_drum_track(bars, DRUM_MIDI_PATTERNS['rock'])
 def generate_funk_drums(bars: int) -> mido.MidiTrack:
-    pattern = {'kick': [1,0,0,0,0,0,1,0,1,1,0,0,0,0,1,0], 'snare': [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0], 'closed_hat': [1,1,1,1,1,1,1,0,1,1,1,1,1,1,1,0], 'open_hat': [0,0,0,0,0,0,0,1,0,0,0,0,0,0,0,1]}
-    return generate_drum_track(bars, pattern)
+    return generate_drum_track(bars, DRUM_MIDI_PATTERNS['funk'])
 def generate_jazz_drums(bars: int) -> mido.MidiTrack:
-    pattern = {'ride': [1,0,1,0,1,0,1,0,1,0,1,0,1,0,1,0], 'closed_hat': [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0], 'kick': [1,0,0,0,0,0,0,0,0,0,1,0,0,0,0,1]}
-    return generate_drum_track(bars, pattern)
+    return generate_drum_track(bars, DRUM_MIDI_PATTERNS['jazz'])
 def generate_blues_drums(bars: int) -> mido.MidiTrack:
-    pattern = {'kick': [1,0,0,0,1,0,0,0,1,0,0,0,1,0,0,0], 'snare': [0,0,0,0,1,0,0,1,0,0,0,0,1,0,0,1], 'closed_hat': [1,0,1,0,1,0,1,0,1,0,1,0,1,0,1,0]}
-    return generate_drum_track(bars, pattern)
+    return generate_drum_track(bars, DRUM_MIDI_PATTERNS['blues'])
 def generate_reggae_drums(bars: int) -> mido.MidiTrack:
-    pattern = {'kick': [0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0], 'snare': [0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0], 'closed_hat': [0,0,1,0,0,0,1,0,0,0,1,0,0,0,1,0]}
-    return generate_drum_track(bars, pattern)
+    return generate_drum_track(bars, DRUM_MIDI_PATTERNS['reggae'])
 
 # --- 5. FUNÇÕES DE GERAÇÃO DE PIANO (MIDI) ---
 
+def voice_chords(chords: list[tuple[int, str]]) -> list[list[int]]:
+    """Voicings com condução de vozes para [(fundamental_midi, tipo), ...] (veja voice_leading.voice_progression)."""
+    # Importado aqui porque voice_leading depende deste módulo
+    import voice_leading
+    return voice_leading.voice_progression(chords)
+
 def generate_rock_piano(key: str, scale: str, bars: int, progression: list) -> mido.MidiTrack:
     track = mido.MidiTrack()
     scale_notes = get_scale_notes(key, scale, octave=4)
@@ -211,11 +232,12 @@ def generate_funk_piano(key: str, scale: str, bars: int, progression: list) -> m
     duration = TICKS_PER_BEAT // 4
     pattern = [0,0,0,1,0,1,0,1,0,0,1,0,0,1,0,0]
     prog_len = len(progression)
-    for _ in range(bars // prog_len if prog_len > 0 else bars):
+    repeats = bars // prog_len if prog_len > 0 else bars
+    voicings = iter(voice_chords([(scale_notes[degree - 1], 'minor7' if chord_type == 'minor' else 'dominant7')
+                                  for _ in range(repeats) for degree, chord_type in progression]))
+    for _ in range(repeats):
         for degree, chord_type in progression:
-            root_note = scale_notes[degree - 1]
-            final_chord_type = 'minor7' if chord_type == 'minor' else 'dominant7'
-            chord_notes = get_chord_notes(root_note, final_chord_type)
+            chord_notes = next(voicings)
             time_since_last_note = 0
             for i, is_active in enumerate(pattern):
                 if is_active:
@@ -229,10 +251,11 @@ def generate_jazz_piano(key: str, scale: str, bars: int, progression: list) -> m
     track = mido.MidiTrack()
     scale_notes = get_scale_notes(key, scale, octave=4)
     prog_len = len(progression)
-    for _ in range(bars // prog_len if prog_len > 0 else bars):
+    repeats = bars // prog_len if prog_len > 0 else bars
+    voicings = iter(voice_chords([(scale_notes[degree - 1], chord_type) for _ in range(repeats) for degree, chord_type in progression]))
+    for _ in range(repeats):
         for degree, chord_type in progression:
-            root_note = scale_notes[degree - 1]
-            chord_notes = get_chord_notes(root_note, chord_type)
+            chord_notes = next(voicings)
             time_on = TICKS_PER_BEAT
             duration = int(TICKS_PER_BEAT * 1.5)
             for note in chord_notes: track.append(mido.Message('note_on', note=note, velocity=80, time=time_on if note == chord_notes[0] else 0))
@@ -243,9 +266,9 @@ def generate_blues_piano(key: str, bars: int) -> mido.MidiTrack:
     track = mido.MidiTrack()
     notes = get_scale_notes(key, 'major', octave=4)
     roots = [notes[0]]*4 + [notes[3]]*2 + [notes[0]]*2 + [notes[4], notes[3], notes[0], notes[4]]
+    voicings = voice_chords([(roots[i % 12], 'dominant7') for i in range(bars)])
     for i in range(bars):
-        root_note = roots[i % 12]
-        chord_notes = get_chord_notes(root_note, 'dominant7')
+        chord_notes = voicings[i]
         for note in chord_notes: track.append(mido.Message('note_on', note=note, velocity=90, time=0))
         for note in chord_notes: track.append(mido.Message('note_off', note=note, velocity=64, time=TICKS_PER_BEAT * 4 if note == chord_notes[0] else 0))
     return track
@@ -326,20 +349,22 @@ def generate_rock_piano_lilypond(key: str, scale: str, bars: int, progression: l
 
 def generate_funk_piano_lilypond(key: str, scale: str, bars: int, progression: list) -> str:
     score, scale_notes = "", get_scale_notes(key, scale, octave=4)
+    voicings = iter(voice_chords([(scale_notes[degree - 1], 'minor7' if chord_type == 'minor' else 'dominant7')
+                                  for _ in range(bars // len(progression)) for degree, chord_type in progression]))
     for _ in range(bars // len(progression)):
         for degree, chord_type in progression:
-            root = scale_notes[degree - 1]
-            chord_notes = get_chord_notes(root, 'minor7' if chord_type == 'minor' else 'dominant7')
+            chord_notes = next(voicings)
             chord_ly = f"<{ ' '.join(midi_to_lilypond(n) for n in chord_notes) }>"
             score += f"r8. {chord_ly}16 r8. {chord_ly}16 r8. {chord_ly}16 r8. {chord_ly}16 | "
     return score
 
 def generate_jazz_piano_lilypond(key: str, scale: str, bars: int, progression: list) -> str:
     score, scale_notes = "", get_scale_notes(key, scale, octave=4)
+    voicings = iter(voice_chords([(scale_notes[degree - 1], chord_type)
+                                  for _ in range(bars // len(progression)) for degree, chord_type in progression]))
     for _ in range(bars // len(progression)):
         for degree, chord_type in progression:
-            root = scale_notes[degree - 1]
-            chord_notes = get_chord_notes(root, chord_type)
+            chord_notes = next(voicings)
             chord_ly = f"<{ ' '.join(midi_to_lilypond(n) for n in chord_notes) }>"
             score += f"r4 {chord_ly}4. r8 | "
     return score
@@ -347,9 +372,9 @@ def generate_jazz_piano_lilypond(key: str, scale: str, bars: int, progression: l
 def generate_blues_piano_lilypond(key: str, bars: int) -> str:
     score, notes = "", get_scale_notes(key, 'major', octave=4)
     roots = [notes[0]]*4 + [notes[3]]*2 + [notes[0]]*2 + [notes[4], notes[3], notes[0], notes[4]]
+    voicings = voice_chords([(roots[i % 12], 'dominant7') for i in range(bars)])
     for i in range(bars):
-        root = roots[i % 12]
-        chord_notes = get_chord_notes(root, 'dominant7')
+        chord_notes = voicings[i]
         chord_ly = f"<{ ' '.join(midi_to_lilypond(n) for n in chord_notes) }>"
         score += f"{chord_ly}1 | "
     return score
@@ -378,14 +403,40 @@ def generate_drums_lilypond(bars: int, pattern: dict) -> str:
         score += "| "
     return score
 
-def create_pdf_score(folder_path: str, filename: str, bass_ly: str, drums_ly: str, piano_ly: str, title: str):
-    lilypond_content = f"""\\version "2.24.4"
+def lilypond_transpose_target(semitones: int) -> str:
+    """Altura de destino para '\\transpose c <destino>': acima de c para intervalos positivos, abaixo para negativos."""
+    return LILYPOND_NOTE_NAMES[semitones % 12] + ("," if semitones < 0 else "")
+
+def build_lilypond_source(bass_ly: str, drums_ly: str, piano_ly: str, title: str, transpose: int = 0,
+                          section: dict | None = None) -> str:
+    """
+    Monta o código-fonte LilyPond completo da partitura (piano, baixo e bateria).
+    Compassos e frases repetidos viram variáveis e '\\repeat' (veja lilypond_compact), o que deixa o .ly
+    muito menor e a partitura mais legível; os trechos gerados continuam com todos os compassos.
+    transpose (em semitons) envolve piano e baixo em '\\transpose', sem regerar as notas.
+    section ({'paper', 'layout', 'breaks'}, veja lilypond_parallel.section_settings) acrescenta configurações de
+    página e as quebras explícitas de uma seção renderizada em paralelo.
+    """
+    definitions, music = lilypond_compact.compact_score({'piano': piano_ly, 'bass': bass_ly, 'drums': drums_ly})
+    piano_ly, bass_ly, drums_ly = music['piano'], music['bass'], music['drums']
+    if transpose:
+        target = lilypond_transpose_target(transpose)
+        piano_ly = f"\\transpose c {target} {{ {piano_ly} }}"
+        bass_ly = f"\\transpose c {target} {{ {bass_ly} }}"
+    paper, layout = ' #(set-paper-size "a4") ', ''
+    if section:
+        paper = f'\n  #(set-paper-size "a4")\n  {section["paper"]}\n'
+        layout = f"{section['layout']} "
+        piano_ly = f"<< {{ {piano_ly} }} {{ {section['breaks']} }} >>"
+    variables = "\n".join(definitions)
+    return f"""\\version "2.24.4"
 \\header {{
   title = "{title}"
   composer = "Generated by LoopGenerator AI"
   tagline = ##f
 }}
-\\paper {{ #(set-paper-size "a4") }}
+\\paper {{{paper}}}
+{variables}
 \\score {{
   <<
     \\new StaffGroup <<
@@ -400,23 +451,75 @@ def create_pdf_score(folder_path: str, filename: str, bass_ly: str, drums_ly: st
       \\drummode {{ \\time 4/4 {drums_ly} }}
     }}
   >>
-  \\layout {{ }}
+  \\layout {{ {layout}}}
 }}
 """
+
+def create_pdf_score(folder_path: str, filename: str, bass_ly: str, drums_ly: str, piano_ly: str, title: str,
+                     workers: int | None = None):
+    """
+    Grava o .ly e o PDF da partitura em folder_path.
+    Partituras longas (lilypond_parallel.PARALLEL_MIN_BARS compassos ou mais) são divididas em seções nas
+    quebras de página e renderizadas por vários processos LilyPond ao mesmo tempo (workers; padrão: um por
+    núcleo, 1 desliga); os PDFs parciais são juntados em um só, com numeração de páginas e compassos contínua.
+    """
+    lilypond_content = build_lilypond_source(bass_ly, drums_ly, piano_ly, title)
     ly_filepath = os.path.join(folder_path, filename + ".ly")
+    # Importado aqui porque lilypond_parallel depende deste módulo
+    import lilypond_parallel
+    bars = len(lilypond_compact.split_bars(piano_ly))
+    if lilypond_parallel.should_render_parallel(bars, workers):
+        with open(ly_filepath, "w", encoding='utf-8') as f: f.write(lilypond_content)
+        pdf_bytes = lilypond_parallel.render_pdf_bytes_parallel({'bass': bass_ly, 'drums': drums_ly, 'piano': piano_ly},
+                                                                title, filename, workers)
+        if pdf_bytes is not None:
+            with open(os.path.join(folder_path, filename + ".pdf"), "wb") as f: f.write(pdf_bytes)
+        return
     try:
         with open(ly_filepath, "w", encoding='utf-8') as f: f.write(lilypond_content)
         print(f"\nChamando LilyPond para gerar '{filename}.pdf'...")
-        subprocess.run(
-            ["lilypond", "-o", os.path.join(folder_path, filename), ly_filepath],
-            check=True, capture_output=True, text=True
-        )
+        with metrics.timed('loopgen_stage_seconds', stage='score'):
+            subprocess.run(
+                ["lilypond", "-o", os.path.join(folder_path, filename), ly_filepath],
+                check=True, capture_output=True, text=True
+            )
+        metrics.inc('loopgen_lilypond_renders_total', status='ok')
         print("Partitura em PDF gerada com sucesso!")
     except FileNotFoundError:
+        metrics.inc('loopgen_lilypond_renders_total', status='missing')
         print("\n--- ERRO --- \n'lilypond' não foi encontrado. Verifique se está instalado e no PATH do sistema.")
     except subprocess.CalledProcessError as e:
+        metrics.inc('loopgen_lilypond_renders_total', status='error')
         print(f"\n--- ERRO DO LILYPOND ---\n{e.stderr}")
 
+def render_pdf_bytes(lilypond_content: str, filename: str) -> bytes | None:
+    """
+    Renderiza o PDF em um diretório temporário e devolve seus bytes (None se o LilyPond falhar).
+    O LilyPond só escreve em disco, então este é o único artefato que passa por arquivo temporário.
+    """
+    with tempfile.TemporaryDirectory(prefix="loopgen_ly_") as tmp_dir:
+        ly_filepath = os.path.join(tmp_dir, filename + ".ly")
+        with open(ly_filepath, "w", encoding='utf-8') as f: f.write(lilypond_content)
+        try:
+            print(f"\nChamando LilyPond para gerar '{filename}.pdf'...")
+            with metrics.timed('loopgen_stage_seconds', stage='score'):
+                subprocess.run(
+                    ["lilypond", "-o", os.path.join(tmp_dir, filename), ly_filepath],
+                    check=True, capture_output=True, text=True
+                )
+        except FileNotFoundError:
+            metrics.inc('loopgen_lilypond_renders_total', status='missing')
+            print("\n--- ERRO --- \n'lilypond' não foi encontrado. Verifique se está instalado e no PATH do sistema.")
+            return None
+        except subprocess.CalledProcessError as e:
+            metrics.inc('loopgen_lilypond_renders_total', status='error')
+            print(f"\n--- ERRO DO LILYPOND ---\n{e.stderr}")
+            return None
+        metrics.inc('loopgen_lilypond_renders_total', status='ok')
+        with open(os.path.join(tmp_dir, filename + ".pdf"), "rb") as f:
+            print("Partitura em PDF gerada com sucesso!")
+            return f.read()
+
 # Adicione esta função junto com as outras funções auxiliares
 
 def parse_progression_string(progression_string: str) -> (list, str):
@@ -448,187 +551,645 @@ def parse_progression_string(progression_string: str) -> (list, str):
         
     return progression, None
 
-def generate_cover_art(style: str, key: str, bpm: int, folder_path: str, cover_title: str, filename: str = "cover_art.png"):
+COVER_REFERENCE_SIZE = 800
+# Master para impressão, imagem da loja e miniatura
+COVER_SIZES = (3000, 800, 200)
+COVER_FORMAT_EXTENSIONS = {'PNG': 'png', 'JPEG': 'jpg', 'WEBP': 'webp'}
+# Fundos de capa (sem texto) guardados em memória; um fundo de 3000x3000 ocupa ~27 MB
+COVER_BACKGROUND_CACHE_SIZE = 4
+# Chaves de cover_export que escolhem a arte (veja cover_engines), e não os arquivos gravados
+COVER_ART_OPTIONS = ('engine', 'overlay', 'budget')
+STYLE_PALETTES = {
+    'rock': [(200, 30, 30), (10, 10, 10), (255, 100, 0), (80, 80, 80)],
+    'funk': [(230, 50, 200), (255, 150, 0), (100, 0, 150), (255, 255, 0)],
+    'jazz': [(10, 20, 80), (180, 150, 100), (200, 200, 220), (50, 50, 50)],
+    'blues': [(0, 40, 120), (100, 80, 50), (10, 10, 10), (180, 180, 180)],
+    'reggae': [(200, 0, 0), (255, 220, 0), (0, 150, 50), (10, 10, 10)]
+}
+
+def cover_blobs(style: str, key: str, bpm: int, seed: int | None = None) -> list[dict]:
     """
-    Gera uma imagem de capa com gradientes suaves e coloridos, usando um título customizado.
+    Sorteia os blobs da capa em coordenadas relativas (0..1), independentes da resolução final.
+    Os sorteios são os mesmos de uma capa 800x800, então o mesmo seed gera a mesma arte em qualquer tamanho.
     """
-    print(f"\nGerando capa artística com gradientes para o estilo '{style}'...")
-
-    width, height = 800, 800
+    palette = STYLE_PALETTES.get(style, [(0,0,0), (255,255,255)])
+    random_seed = seed if seed is not None else hash(f"{style}{key}{bpm}{time.time()}") % (2**32 - 1)
+    rng = random.Random(random_seed)
+    size = COVER_REFERENCE_SIZE
 
-    style_palettes = {
-        'rock': [(200, 30, 30), (10, 10, 10), (255, 100, 0), (80, 80, 80)],
-        'funk': [(230, 50, 200), (255, 150, 0), (100, 0, 150), (255, 255, 0)],
-        'jazz': [(10, 20, 80), (180, 150, 100), (200, 200, 220), (50, 50, 50)],
-        'blues': [(0, 40, 120), (100, 80, 50), (10, 10, 10), (180, 180, 180)],
-        'reggae': [(200, 0, 0), (255, 220, 0), (0, 150, 50), (10, 10, 10)]
-    }
-    palette = style_palettes.get(style, [(0,0,0), (255,255,255)])
-
-    random_seed = hash(f"{style}{key}{bpm}{time.time()}") % (2**32 - 1)
-    random.seed(random_seed)
-    
-    num_blobs = random.randint(3, 5)
+    num_blobs = rng.randint(3, 5)
     blobs = []
     for _ in range(num_blobs):
         blobs.append({
-            'x': random.randint(0, width),
-            'y': random.randint(0, height),
-            'r': random.randint(min(width, height) // 4, min(width, height) // 2),
-            'color': np.array(random.choice(palette))
+            'x': rng.randint(0, size) / size,
+            'y': rng.randint(0, size) / size,
+            'r': rng.randint(size // 4, size // 2) / size,
+            'color': np.array(rng.choice(palette), dtype=np.float32)
         })
+    return blobs
 
-    x_coords = np.arange(width)
-    y_coords = np.arange(height)
-    X, Y = np.meshgrid(x_coords, y_coords)
+def _render_field_tile(blobs: list[dict], width: int, height: int, row_start: int, row_end: int) -> np.ndarray:
+    scale = min(width, height)
+    x_coords = np.arange(width, dtype=np.float32)
+    y_coords = np.arange(row_start, row_end, dtype=np.float32)[:, np.newaxis]
 
-    total_color = np.zeros((height, width, 3), dtype=np.float64)
-    total_influence = np.zeros((height, width), dtype=np.float64)
+    total_color = np.zeros((row_end - row_start, width, 3), dtype=np.float32)
+    total_influence = np.zeros((row_end - row_start, width), dtype=np.float32)
 
     for blob in blobs:
-        dist_sq = (X - blob['x'])**2 + (Y - blob['y'])**2
-        influence = (blob['r']**2) / (dist_sq + 1e-9)
+        dist_sq = (x_coords - blob['x'] * width)**2 + (y_coords - blob['y'] * height)**2
+        influence = (blob['r'] * scale)**2 / (dist_sq + 1e-9)
         total_color += influence[:, :, np.newaxis] * blob['color']
         total_influence += influence
-    
-    total_influence_rgb = np.stack([total_influence] * 3, axis=-1)
-    
+
     with np.errstate(divide='ignore', invalid='ignore'):
-        img_array = np.where(total_influence_rgb > 1e-6, total_color / total_influence_rgb, 0)
+        img_array = np.where(total_influence[:, :, np.newaxis] > 1e-6, total_color / total_influence[:, :, np.newaxis], 0)
 
-    img_array = np.clip(img_array, 0, 255).astype(np.uint8)
-    
-    img = Image.fromarray(img_array, 'RGB')
-    
-    try:
-        draw = ImageDraw.Draw(img)
+    return np.clip(img_array, 0, 255).astype(np.uint8)
+
+def render_cover_field_into(out: np.ndarray, blobs: list[dict], tile_rows: int = 256, workers: int | None = None) -> np.ndarray:
+    """
+    Renderiza o campo de gradientes em faixas horizontais de tile_rows linhas, distribuídas entre threads
+    (o NumPy libera o GIL nas operações pesadas). As faixas limitam a memória intermediária em capas grandes.
+    out: array (altura, largura, 3) uint8 já alocado, ex.: uma view de memória compartilhada (veja cover_shm).
+    """
+    height, width = out.shape[:2]
+    bands = [(start, min(start + tile_rows, height)) for start in range(0, height, tile_rows)]
+
+    def render_band(band):
+        start, end = band
+        out[start:end] = _render_field_tile(blobs, width, height, start, end)
+
+    workers = workers or min(len(bands), os.cpu_count() or 1)
+    if workers <= 1:
+        for band in bands: render_band(band)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(render_band, bands))
+    return out
+
+def render_cover_field(blobs: list[dict], width: int, height: int, tile_rows: int = 256, workers: int | None = None) -> Image.Image:
+    img_array = np.empty((height, width, 3), dtype=np.uint8)
+    return Image.fromarray(render_cover_field_into(img_array, blobs, tile_rows, workers), 'RGB')
+
+@lru_cache(maxsize=COVER_BACKGROUND_CACHE_SIZE)
+def _cached_cover_background(style: str, seed: int, size: int, engine: str = 'blobs', overlay: str | None = None,
+                             budget: float | None = None) -> Image.Image:
+    if engine == 'blobs' and overlay is None and budget is None:
+        return render_cover_field(cover_blobs(style, "", 0, seed), size, size)
+    # Importado aqui porque cover_engines depende deste módulo
+    import cover_engines
+    return cover_engines.render_cover(style, seed, size, engine, overlay, budget)
+
+def cover_background(style: str, key: str, bpm: int, seed: int | None = None, size: int = COVER_REFERENCE_SIZE,
+                     engine: str = 'blobs', overlay: str | None = None, budget=None) -> Image.Image:
+    """
+    Campo de gradientes da capa, sem texto. Com seed, os blobs não dependem de tonalidade nem de BPM, então o fundo
+    fica em cache e trocar só o título, a tonalidade ou o BPM redesenha o texto sem renderizar o campo de novo.
+    engine/overlay/budget escolhem outro motor de arte (veja cover_engines.render_cover); budget pode ser {tamanho: segundos}.
+    """
+    if engine == 'blobs' and overlay is None and budget is None:
+        if seed is None:
+            return render_cover_field(cover_blobs(style, key, bpm), size, size)
+        return _cached_cover_background(style, seed, size).copy()
+    if budget is not None:
+        # Importado aqui porque cover_engines depende deste módulo
+        import cover_engines
+        budget = cover_engines.budget_for(budget, size)
+    if seed is None:
+        return _cached_cover_background.__wrapped__(style, random.getrandbits(32), size, engine, overlay, budget)
+    return _cached_cover_background(style, seed, size, engine, overlay, budget).copy()
+
+def _load_font(names: list[str], size: int):
+    for name in names:
         try:
-            font = ImageFont.truetype("arialbd.ttf", 60)
-            small_font = ImageFont.truetype("arial.ttf", 35)
+            return ImageFont.truetype(name, size)
         except IOError:
-            font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
-        
-        title_text = cover_title  # Usa o título vindo da interface
-        subtitle_text = f"{key.upper()} - {bpm} BPM"
+            continue
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        return ImageFont.load_default()
+
+def draw_cover_text(img: Image.Image, title_text: str, subtitle_text: str):
+    """Desenha título e subtítulo com sombra, com fontes e espaçamentos proporcionais ao tamanho da imagem."""
+    width, height = img.size
+    scale = min(width, height) / COVER_REFERENCE_SIZE
+    try:
+        draw = ImageDraw.Draw(img)
+        font = _load_font(["arialbd.ttf", "DejaVuSans-Bold.ttf"], max(1, round(60 * scale)))
+        small_font = _load_font(["arial.ttf", "DejaVuSans.ttf"], max(1, round(35 * scale)))
         
         shadow_color = (0, 0, 0)
         text_color = (255, 255, 255)
+        shadow = max(1, round(2 * scale))
         
         # Título
         bbox = draw.textbbox((0, 0), title_text, font=font)
         text_w, text_h = bbox[2] - bbox[0], bbox[3] - bbox[1]
         pos_x, pos_y = (width - text_w) / 2, height * 0.4
-        draw.text((pos_x + 2, pos_y + 2), title_text, font=font, fill=shadow_color)
+        draw.text((pos_x + shadow, pos_y + shadow), title_text, font=font, fill=shadow_color)
         draw.text((pos_x, pos_y), title_text, font=font, fill=text_color)
 
         # Subtítulo
         sub_bbox = draw.textbbox((0, 0), subtitle_text, font=small_font)
         sub_text_w = sub_bbox[2] - sub_bbox[0]
-        sub_pos_x, sub_pos_y = (width - sub_text_w) / 2, pos_y + text_h + 10
-        draw.text((sub_pos_x + 1, sub_pos_y + 1), subtitle_text, font=small_font, fill=shadow_color)
+        sub_pos_x, sub_pos_y = (width - sub_text_w) / 2, pos_y + text_h + 10 * scale
+        draw.text((sub_pos_x + shadow / 2, sub_pos_y + shadow / 2), subtitle_text, font=small_font, fill=shadow_color)
         draw.text((sub_pos_x, sub_pos_y), subtitle_text, font=small_font, fill=text_color)
         
     except (ImportError, AttributeError) as e:
         print(f"Aviso: Não foi possível adicionar texto à capa. Erro: {e}")
-    
+    return img
+
+def cover_subtitle(key: str, bpm: int) -> str:
+    return f"{key.upper()} - {bpm} BPM"
+
+def render_cover_image(style: str, key: str, bpm: int, cover_title: str, seed: int | None = None,
+                       size: int = COVER_REFERENCE_SIZE, engine: str = 'blobs', overlay: str | None = None,
+                       budget=None) -> Image.Image:
+    """
+    Gera uma imagem de capa com gradientes suaves e coloridos, usando um título customizado.
+    Com o mesmo seed, a mesma capa é reproduzida (sem seed, cada chamada gera uma capa nova).
+    """
+    print(f"\nGerando capa artística com gradientes para o estilo '{style}'...")
+    with metrics.timed('loopgen_stage_seconds', stage='cover'):
+        img = cover_background(style, key, bpm, seed, size, engine, overlay, budget)
+        return draw_cover_text(img, cover_title, cover_subtitle(key, bpm))
+
+def render_cover_sizes(style: str, key: str, bpm: int, cover_title: str, sizes=COVER_SIZES,
+                       seed: int | None = None, engine: str = 'blobs', overlay: str | None = None,
+                       budget=None) -> dict[int, Image.Image]:
+    """
+    Gera a capa em vários tamanhos com uma única renderização do campo de gradientes, no maior tamanho.
+    Os tamanhos menores são reduzidos a partir dele (sem ampliar nada) e o texto é desenhado em cada tamanho.
+    """
+    print(f"\nGerando capa artística em {len(sizes)} resoluções para o estilo '{style}'...")
+    largest = max(sizes)
+    with metrics.timed('loopgen_stage_seconds', stage='cover'):
+        background = cover_background(style, key, bpm, seed, largest, engine, overlay, budget)
+        images = {}
+        for size in sorted(sizes, reverse=True):
+            img = background.copy() if size == largest else background.resize((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            images[size] = draw_cover_text(img, cover_title, cover_subtitle(key, bpm))
+    return images
+
+def cover_save_options(format: str = "PNG", quality: int | None = None, optimize: bool = False,
+                       compress_level: int | None = None) -> dict:
+    """
+    Opções do Pillow para cada formato: PNG (optimize, compress_level 0-9), JPEG/WEBP (quality 1-100).
+    Níveis/qualidades menores gravam mais rápido e geram arquivos maiores.
+    """
+    format = format.upper()
+    if format not in COVER_FORMAT_EXTENSIONS:
+        raise ValueError(f"Formato de capa '{format}' não suportado. Use {', '.join(COVER_FORMAT_EXTENSIONS)}.")
+    options = {}
+    if format == 'PNG':
+        options['optimize'] = optimize
+        if compress_level is not None: options['compress_level'] = compress_level
+    else:
+        if quality is not None: options['quality'] = quality
+        if format == 'JPEG' and optimize: options['optimize'] = True
+    return options
+
+def cover_art_options(cover_export: dict | None) -> dict:
+    """Argumentos de motor de arte (engine, overlay, budget) de um cover_export, para render_cover_image/render_cover_sizes."""
+    return {name: value for name, value in (cover_export or {}).items() if name in COVER_ART_OPTIONS and value is not None}
+
+def is_single_cover(cover_export: dict | None) -> bool:
+    return not cover_export or all(name in COVER_ART_OPTIONS for name in cover_export)
+
+def iter_cover_artifacts(style: str, key: str, bpm: int, cover_title: str, seed: int | None = None,
+                         cover_export: dict | None = None):
+    """
+    Gera (nome_do_arquivo, bytes) das capas. Sem cover_export, uma única 'cover_art.png' 800x800.
+    cover_export: {'sizes': (3000, 800, 200), 'format': 'PNG'|'JPEG'|'WEBP', 'quality': .., 'optimize': .., 'compress_level': ..,
+                   'engine': 'blobs'|'noise'|'flow'|'voronoi'|'style', 'overlay': 'halftone'|'grain'|'none', 'budget': segundos}
+    Só com as chaves de arte (COVER_ART_OPTIONS), continua sendo uma única 'cover_art.png'.
+    """
+    art = cover_art_options(cover_export)
+    if is_single_cover(cover_export):
+        yield "cover_art.png", image_to_bytes(render_cover_image(style, key, bpm, cover_title, seed=seed, **art))
+        return
+    format = cover_export.get('format', 'PNG').upper()
+    options = cover_save_options(format, cover_export.get('quality'), cover_export.get('optimize', False),
+                                 cover_export.get('compress_level'))
+    images = render_cover_sizes(style, key, bpm, cover_title, cover_export.get('sizes', COVER_SIZES), seed=seed, **art)
+    for size, img in images.items():
+        yield f"cover_art_{size}px.{COVER_FORMAT_EXTENSIONS[format]}", image_to_bytes(img, format, **options)
+
+def generate_cover_art(style: str, key: str, bpm: int, folder_path: str, cover_title: str, filename: str = "cover_art.png"):
+    img = render_cover_image(style, key, bpm, cover_title)
     output_path = os.path.join(folder_path, filename)
     img.save(output_path)
     print(f"Capa artística '{filename}' gerada com sucesso em '{folder_path}'!")
 
 # --- 7. FUNÇÃO PRINCIPAL DE GERAÇÃO ---
 
-def run_generation_process(style_to_generate, bars, key, scale, bpm, progression_string, cover_title):
+# A partitura de bateria leva só bumbo, caixa e condução: os chimbais ficam apenas no MIDI
+DRUM_PATTERNS = {style: {piece: steps for piece, steps in pattern.items() if piece not in ('closed_hat', 'open_hat')}
+                 for style, pattern in DRUM_MIDI_PATTERNS.items()}
+
+BASS_MIDI_GENERATORS = {
+    'rock': generate_rock_bassline, 'funk': generate_funk_bassline, 'jazz': generate_jazz_walking_bassline,
+    'blues': generate_blues_bassline, 'reggae': generate_reggae_bassline
+}
+PIANO_MIDI_GENERATORS = {
+    'rock': generate_rock_piano, 'funk': generate_funk_piano, 'jazz': generate_jazz_piano,
+    'blues': generate_blues_piano, 'reggae': generate_reggae_piano
+}
+DRUM_MIDI_GENERATORS = {
+    'rock': generate_rock_drums, 'funk': generate_funk_drums, 'jazz': generate_jazz_drums,
+    'blues': generate_blues_drums, 'reggae': generate_reggae_drums
+}
+BASS_LILYPOND_GENERATORS = {
+    'rock': generate_rock_bass_lilypond, 'funk': generate_funk_bass_lilypond, 'jazz': generate_jazz_bass_lilypond,
+    'blues': generate_blues_bass_lilypond, 'reggae': generate_reggae_bass_lilypond
+}
+PIANO_LILYPOND_GENERATORS = {
+    'rock': generate_rock_piano_lilypond, 'funk': generate_funk_piano_lilypond, 'jazz': generate_jazz_piano_lilypond,
+    'blues': generate_blues_piano_lilypond, 'reggae': generate_reggae_piano_lilypond
+}
+
+def expand_progression(progression: list, bars: int) -> list:
+    """Repete a progressão até ter exatamente um acorde por compasso."""
+    if not progression:
+        return progression
+    return (progression * (bars // len(progression) + 1))[:bars]
+
+def compose_pack(style_to_generate, bars, key, scale, bpm, progression_string, seed=None, groove=None,
+                 bass_mode='style', bass_model=None, drum_mode='style'):
     """
-    Função principal que executa todo o processo de geração de loops e arquivos.
+    Gera as trilhas MIDI e os trechos LilyPond de um pack, sem escrever nada em disco.
+    Com seed, as escolhas aleatórias são reprodutíveis.
+    groove ('style', um nome de groove.GROOVE_TEMPLATES ou um dicionário) humaniza as trilhas MIDI;
+    a partitura continua na grade.
+    bass_mode='markov' troca o baixo do estilo por um sorteado do modelo de n-gramas bass_model
+    (um bass_model.BassModel ou o caminho do .npz; padrão: bass_model.DEFAULT_MODEL_PATH).
+    drum_mode='mask' usa o motor de máscaras (drum_engine): variações de bumbo, viradas no fim de cada frase
+    e partitura com todas as semicolcheias, em vez do mesmo compasso repetido.
+    Retorna (dados_do_pack, None) em caso de sucesso, ou (None, mensagem_de_erro) em caso de falha.
     """
-    print(f"--- Gerando Loop de {style_to_generate.capitalize()} ---")
+    if seed is not None:
+        random.seed(seed)
 
-    drum_patterns = {
-        'rock': {'kick': [1,0,0,0,1,0,0,0,1,0,0,0,1,0,0,0], 'snare': [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0]},
-        'funk': {'kick': [1,0,0,0,0,0,1,0,1,1,0,0,0,0,1,0], 'snare': [0,0,0,0,1,0,0,0,0,0,0,0,1,0,0,0]},
-        'jazz': {'ride': [1,0,1,0,1,0,1,0,1,0,1,0,1,0,1,0], 'kick': [1,0,0,0,0,0,0,0,0,0,1,0,0,0,0,1]},
-        'blues': {'kick': [1,0,0,0,1,0,0,0,1,0,0,0,1,0,0,0], 'snare': [0,0,0,0,1,0,0,1,0,0,0,0,1,0,0,1]},
-        'reggae': {'kick': [0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0], 'snare': [0,0,0,0,0,0,0,0,1,0,0,0,0,0,0,0]}
-    }
-    
-    KEY, SCALE, BPM = key, scale, bpm
-    
     PROGRESSION = []
     if style_to_generate != 'blues':
         PROGRESSION, error = parse_progression_string(progression_string)
         if error:
             print(f"Erro de progressão: {error}")
             return None, error
-            
-    if PROGRESSION:
-        prog_len = len(PROGRESSION)
-        if prog_len > 0:
-            PROGRESSION = (PROGRESSION * (bars // prog_len + 1))[:bars]
-
-    BASS_MIDI_GENERATORS = {
-        'rock': generate_rock_bassline, 'funk': generate_funk_bassline, 'jazz': generate_jazz_walking_bassline,
-        'blues': generate_blues_bassline, 'reggae': generate_reggae_bassline
-    }
-    PIANO_MIDI_GENERATORS = {
-        'rock': generate_rock_piano, 'funk': generate_funk_piano, 'jazz': generate_jazz_piano,
-        'blues': generate_blues_piano, 'reggae': generate_reggae_piano
-    }
-    DRUM_MIDI_GENERATORS = {
-        'rock': generate_rock_drums, 'funk': generate_funk_drums, 'jazz': generate_jazz_drums,
-        'blues': generate_blues_drums, 'reggae': generate_reggae_drums
-    }
-    BASS_LILYPOND_GENERATORS = {
-        'rock': generate_rock_bass_lilypond, 'funk': generate_funk_bass_lilypond, 'jazz': generate_jazz_bass_lilypond,
-        'blues': generate_blues_bass_lilypond, 'reggae': generate_reggae_bass_lilypond
-    }
-    PIANO_LILYPOND_GENERATORS = {
-        'rock': generate_rock_piano_lilypond, 'funk': generate_funk_piano_lilypond, 'jazz': generate_jazz_piano_lilypond,
-        'blues': generate_blues_piano_lilypond, 'reggae': generate_reggae_piano_lilypond
-    }
-    
+    PROGRESSION = expand_progression(PROGRESSION, bars)
+
     if style_to_generate == 'blues':
-        bass_track = BASS_MIDI_GENERATORS['blues'](KEY, bars)
-        piano_track = PIANO_MIDI_GENERATORS['blues'](KEY, bars)
-        bass_ly = BASS_LILYPOND_GENERATORS['blues'](KEY, bars)
-        piano_ly = PIANO_LILYPOND_GENERATORS['blues'](KEY, bars)
+        bass_track = BASS_MIDI_GENERATORS['blues'](key, bars)
+        piano_track = PIANO_MIDI_GENERATORS['blues'](key, bars)
+        bass_ly = BASS_LILYPOND_GENERATORS['blues'](key, bars)
+        piano_ly = PIANO_LILYPOND_GENERATORS['blues'](key, bars)
     else:
-        bass_track = BASS_MIDI_GENERATORS[style_to_generate](KEY, SCALE, bars, PROGRESSION)
-        piano_track = PIANO_MIDI_GENERATORS[style_to_generate](KEY, SCALE, bars, PROGRESSION)
-        bass_ly = BASS_LILYPOND_GENERATORS[style_to_generate](KEY, SCALE, bars, PROGRESSION)
-        piano_ly = PIANO_LILYPOND_GENERATORS[style_to_generate](KEY, SCALE, bars, PROGRESSION)
+        bass_track = BASS_MIDI_GENERATORS[style_to_generate](key, scale, bars, PROGRESSION)
+        piano_track = PIANO_MIDI_GENERATORS[style_to_generate](key, scale, bars, PROGRESSION)
+        bass_ly = BASS_LILYPOND_GENERATORS[style_to_generate](key, scale, bars, PROGRESSION)
+        piano_ly = PIANO_LILYPOND_GENERATORS[style_to_generate](key, scale, bars, PROGRESSION)
+
+    if bass_mode == 'markov':
+        # Importado aqui porque bass_model depende deste módulo
+        import bass_model as bass_markov
+        model, error = bass_markov.resolve_model(bass_model)
+        if error:
+            return None, error
+        roots = bass_markov.bar_roots(style_to_generate, key, scale, bars, PROGRESSION)
+        bass_track, bass_ly = model.generate_bass(roots, np.random.default_rng(random.getrandbits(32)))
+    elif bass_mode != 'style':
+        return None, f"Modo de baixo '{bass_mode}' inválido. Use 'style' ou 'markov'."
         
-    drum_track = DRUM_MIDI_GENERATORS[style_to_generate](bars)
-    drums_ly = generate_drums_lilypond(bars, drum_patterns[style_to_generate])
+    if drum_mode == 'mask':
+        # Importado aqui porque drum_engine depende deste módulo
+        import drum_engine
+        drum_track, drums_ly = drum_engine.generate_drums(style_to_generate, bars, np.random.default_rng(random.getrandbits(32)))
+    elif drum_mode == 'style':
+        drum_track = DRUM_MIDI_GENERATORS[style_to_generate](bars)
+        drums_ly = generate_drums_lilypond(bars, DRUM_PATTERNS[style_to_generate])
+    else:
+        return None, f"Modo de bateria '{drum_mode}' inválido. Use 'style' ou 'mask'."
+    tracks = {'bass': bass_track, 'drums': drum_track, 'piano': piano_track}
+
+    if groove:
+        # Importado aqui porque groove depende deste módulo
+        import groove as groove_engine
+        template, error = groove_engine.resolve_groove(style_to_generate, groove)
+        if error:
+            return None, error
+        # O seed do groove sai do mesmo gerador das notas, então segue o seed do pack
+        tracks = groove_engine.groove_tracks(tracks, template, seed=random.getrandbits(32))
+
+    return {
+        'style': style_to_generate, 'key': key, 'scale': scale, 'bpm': bpm, 'bars': bars,
+        'progression': PROGRESSION, 'groove': groove, 'bass_mode': bass_mode, 'drum_mode': drum_mode,
+        'tracks': tracks,
+        'lilypond': {'bass': bass_ly, 'drums': drums_ly, 'piano': piano_ly},
+    }, None
+
+def pack_folder_name(style: str, key: str, bpm: int, timestamp: int | None = None) -> str:
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    return f"{style}_loop_{key.lower().replace('#', 's')}_{bpm}bpm_{timestamp}"
 
-    timestamp = int(time.time())
-    folder_name = f"{style_to_generate}_loop_{KEY.lower().replace('#', 's')}_{BPM}bpm_{timestamp}"
-    os.makedirs(folder_name, exist_ok=True)
+def midi_file_to_bytes(mid: mido.MidiFile) -> bytes:
+    buffer = io.BytesIO()
+    mid.save(file=buffer)
+    return buffer.getvalue()
 
+def build_midi_files(style: str, tracks: dict, bpm: int) -> dict[str, bytes]:
+    """
+    Serializa o MIDI combinado e os MIDIs individuais em memória.
+    Retorna um dicionário {nome_do_arquivo: bytes}.
+    """
+    files = {}
     combined_mid = mido.MidiFile(type=1, ticks_per_beat=TICKS_PER_BEAT)
-    track_bass_copy = bass_track.copy()
-    track_piano_copy = piano_track.copy()
-    track_drums_copy = drum_track.copy()
-    track_bass_copy.insert(0, mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(BPM)))
+    track_bass_copy = tracks['bass'].copy()
+    track_piano_copy = tracks['piano'].copy()
+    track_drums_copy = tracks['drums'].copy()
+    track_bass_copy.insert(0, mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm)))
     combined_mid.tracks.extend([track_bass_copy, track_piano_copy, track_drums_copy])
-    combined_filepath = os.path.join(folder_name, f"{style_to_generate}_full_mix.mid")
-    combined_mid.save(combined_filepath)
+    files[f"{style}_full_mix.mid"] = midi_file_to_bytes(combined_mid)
 
-    for instrument, track in [('bass', bass_track), ('drums', drum_track), ('piano', piano_track)]:
+    for instrument in ('bass', 'drums', 'piano'):
         mid = mido.MidiFile(type=1, ticks_per_beat=TICKS_PER_BEAT)
-        track.insert(0, mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(BPM)))
+        track = tracks[instrument].copy()
+        track.insert(0, mido.MetaMessage('set_tempo', tempo=mido.bpm2tempo(bpm)))
         mid.tracks.append(track)
-        filepath = os.path.join(folder_name, f"{style_to_generate}_{instrument}.mid")
-        mid.save(filepath)
+        files[f"{style}_{instrument}.mid"] = midi_file_to_bytes(mid)
+    return files
 
-    pdf_title = f"{cover_title} - {KEY.capitalize()}"
-    pdf_filename = f"{style_to_generate}_score"
-    create_pdf_score(folder_name, pdf_filename, bass_ly, drums_ly, piano_ly, pdf_title)
-    
-    generate_cover_art(style_to_generate, KEY, BPM, folder_name, cover_title=cover_title)
+def image_to_bytes(img: Image.Image, format: str = "PNG", **save_options) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format=format, **save_options)
+    return buffer.getvalue()
+
+PACK_INFO_FILENAME = "pack_info.json"
+# Formatos de partitura: PDF via LilyPond, MusicXML (para MuseScore/Sibelius, sem LilyPond) ou os dois
+SCORE_FORMATS = ('pdf', 'musicxml', 'both')
+
+def build_pack_info(pack: dict, cover_title: str, cover_seed: int, cover_export: dict | None = None) -> bytes:
+    """
+    Metadados do pack (JSON) com o necessário para re-renderizações incrementais (veja pack_rerender):
+    o seed da capa, os trechos LilyPond na tonalidade original ('lilypond_key'), transpostos com '\\transpose',
+    e quantos semitons os MIDIs já estão deslocados dela ('midi_transpose').
+    """
+    info = {
+        'generator_version': GENERATOR_VERSION,
+        'style': pack['style'], 'key': pack['key'], 'scale': pack['scale'], 'bpm': pack['bpm'], 'bars': pack['bars'],
+        'progression': pack['progression'], 'groove': pack.get('groove'),
+        'cover_title': cover_title, 'score_title': cover_title, 'cover_seed': cover_seed, 'cover_export': cover_export,
+        'lilypond_key': pack.get('lilypond_key', pack['key']), 'lilypond': pack['lilypond'],
+        # Deslocamento atual dos MIDIs em relação a 'lilypond_key' (packs transpostos, veja pack_sweep e pack_rerender)
+        'midi_transpose': pack.get('lilypond_transpose', 0),
+    }
+    return json.dumps(info, indent=2, ensure_ascii=False).encode('utf-8')
+
+def iter_lilypond_artifacts(pack: dict, pdf_title: str, pdf_filename: str):
+    """
+    .ly e PDF da partitura (ou a prévia em SVG, sem LilyPond). Não dependem do BPM (veja pack_sweep).
+    Packs com 'lilypond_transpose' guardam os trechos na tonalidade 'lilypond_key' e são transpostos com '\\transpose'.
+    """
+    ly = pack['lilypond']
+    transpose = pack.get('lilypond_transpose', 0)
+    lilypond_content = build_lilypond_source(ly['bass'], ly['drums'], ly['piano'], pdf_title, transpose=transpose)
+    yield f"{pdf_filename}.ly", lilypond_content.encode('utf-8')
+    # Importado aqui porque lilypond_parallel depende deste módulo
+    import lilypond_parallel
+    if lilypond_parallel.should_render_parallel(pack['bars']):
+        pdf_bytes = lilypond_parallel.render_pdf_bytes_parallel(ly, pdf_title, pdf_filename, transpose=transpose)
+    else:
+        pdf_bytes = render_pdf_bytes(lilypond_content, pdf_filename)
+    if pdf_bytes is not None:
+        yield f"{pdf_filename}.pdf", pdf_bytes
+    else:
+        # Sem LilyPond, o pack leva ao menos a prévia em SVG (importada aqui porque score_preview depende deste módulo)
+        import score_preview
+        yield f"{pdf_filename}_preview.svg", score_preview.render_score_svg(pack['tracks'], pack['bars'], pdf_title).encode('utf-8')
+
+def iter_pack_artifacts(pack: dict, cover_title: str, cover_seed: int | None = None, cover_export: dict | None = None,
+                        score_format: str = 'pdf', midi_files: dict | None = None, lilypond_artifacts=None, cover_files=None):
+    """
+    Gera (nome_do_arquivo, bytes) para cada artefato do pack, na ordem em que ficam prontos.
+    Os MIDIs, o .ly e a capa nunca tocam o disco; só o PDF passa pelo diretório temporário do LilyPond.
+    score_format (veja SCORE_FORMATS): 'pdf' (LilyPond), 'musicxml' (sem LilyPond) ou 'both'.
+    midi_files, lilypond_artifacts e cover_files: partes já prontas (ex.: LoopPack, pack_sweep), usadas no lugar
+    de build_midi_files, iter_lilypond_artifacts e iter_cover_artifacts.
+    """
+    style, key, bpm = pack['style'], pack['key'], pack['bpm']
+    # Fixa o seed da capa para que ela possa ser refeita depois (pack_info.json)
+    cover_seed = cover_seed if cover_seed is not None else random.getrandbits(32)
+    if midi_files is None:
+        midi_files = build_midi_files(style, pack['tracks'], bpm)
+    yield from midi_files.items()
+    yield PACK_INFO_FILENAME, build_pack_info(pack, cover_title, cover_seed, cover_export)
+
+    pdf_title = f"{cover_title} - {key.capitalize()}"
+    pdf_filename = f"{style}_score"
+    if score_format in ('musicxml', 'both'):
+        # Importado aqui porque musicxml_export depende deste módulo
+        import musicxml_export
+        yield f"{pdf_filename}.musicxml", musicxml_export.render_musicxml(pack['tracks'], key, pack['scale'], bpm, pack['bars'], pdf_title)
+    if score_format in ('pdf', 'both'):
+        if lilypond_artifacts is None:
+            lilypond_artifacts = iter_lilypond_artifacts(pack, pdf_title, pdf_filename)
+        yield from lilypond_artifacts
+
+    if cover_files is None:
+        cover_files = iter_cover_artifacts(style, key, bpm, cover_title, seed=cover_seed, cover_export=cover_export)
+    yield from cover_files
+
+def _duplicate_error(duplicate_index, tracks_or_bytes, label):
+    # Importado aqui porque loop_fingerprint depende deste módulo
+    import loop_fingerprint
+    if isinstance(tracks_or_bytes, bytes):
+        fingerprint = loop_fingerprint.midi_bytes_fingerprint(tracks_or_bytes)
+    else:
+        fingerprint = loop_fingerprint.tracks_fingerprint(tracks_or_bytes)
+    duplicate_of = duplicate_index.admit(label, fingerprint)
+    if duplicate_of is not None:
+        return f"Pack rejeitado: quase idêntico a '{duplicate_of}'."
+    return None
+
+def _produce_pack_artifacts(style_to_generate, bars, key, scale, bpm, progression_string, cover_title, seed=None, cache=None,
+                            cover_export=None, duplicate_index=None, on_composed=None, groove=None, score_format='pdf',
+                            bass_mode='style', bass_model=None, drum_mode='style'):
+    """
+    Devolve (artefatos, None) ou (None, erro). Com cache e seed, um acerto devolve os artefatos guardados
+    sem gerar nada; uma falha gera o pack e o guarda no cache.
+    Com duplicate_index (um loop_fingerprint.DuplicateIndex), um pack quase idêntico a outro já aceito
+    é rejeitado antes de renderizar partitura e capa.
+    on_composed(pack) é chamado assim que as notas ficam prontas, antes do LilyPond e da capa (prévias na interface).
+    """
+    label = pack_folder_name(style_to_generate, key, bpm) + (f" (seed {seed})" if seed is not None else "")
+    # Opções que mudam os arquivos gerados entram na chave do cache
+    output_options = {name: value for name, value in (('cover_export', cover_export), ('groove', groove)) if value}
+    if score_format != 'pdf':
+        output_options['score_format'] = score_format
+    if bass_mode == 'markov':
+        # O modelo entra na chave do cache pelo hash das contagens, não pelo caminho do arquivo
+        import bass_model as bass_markov
+        bass_model, error = bass_markov.resolve_model(bass_model)
+        if error:
+            return None, error
+        output_options['bass_model'] = bass_model.digest
+    if drum_mode != 'style':
+        output_options['drum_mode'] = drum_mode
+    output_options = output_options or None
+    cache_key = None
+    if cache is not None and seed is not None:
+        cache_key = cache.make_key(style_to_generate, bars, key, scale, bpm, progression_string, cover_title, seed,
+                                   options=output_options)
+        artifacts = cache.get(cache_key)
+        metrics.inc('loopgen_cache_requests_total', result='miss' if artifacts is None else 'hit')
+        if artifacts is not None:
+            print("Pack encontrado no cache; materializando artefatos guardados.")
+            if duplicate_index is not None:
+                full_mix = dict(artifacts)[f"{style_to_generate}_full_mix.mid"]
+                error = _duplicate_error(duplicate_index, full_mix, label)
+                if error:
+                    return None, error
+            return artifacts, None
+
+    with metrics.timed('loopgen_stage_seconds', stage='compose'):
+        pack, error = compose_pack(style_to_generate, bars, key, scale, bpm, progression_string, seed=seed, groove=groove,
+                                   bass_mode=bass_mode, bass_model=bass_model, drum_mode=drum_mode)
+    if error:
+        return None, error
+    if duplicate_index is not None:
+        error = _duplicate_error(duplicate_index, pack['tracks'], label)
+        if error:
+            return None, error
+    if on_composed is not None:
+        on_composed(pack)
+    artifacts = iter_pack_artifacts(pack, cover_title, cover_seed=seed, cover_export=cover_export, score_format=score_format)
+    if cache_key is not None:
+        artifacts = list(artifacts)
+        cache.put(cache_key, artifacts)
+    return artifacts, None
+
+@metrics.measure_pack
+def produce_pack_artifacts(style_to_generate, *args, score_format='pdf', **kwargs):
+    """
+    Gera os artefatos de um pack sem gravá-los, para quem decide onde escrevê-los (ex.: generation_queue).
+    Aceita os argumentos de _produce_pack_artifacts; devolve (lista de (nome_do_arquivo, bytes), None) ou (None, erro).
+    A lista já vem materializada (partitura e capa renderizadas), e o pack é contado nas métricas como em run_generation_process.
+    """
+    if score_format not in SCORE_FORMATS:
+        return None, f"Formato de partitura '{score_format}' inválido. Use {', '.join(repr(f) for f in SCORE_FORMATS)}."
+    artifacts, error = _produce_pack_artifacts(style_to_generate, *args, score_format=score_format, **kwargs)
+    if error:
+        return None, error
+    return list(artifacts), None
+
+@metrics.measure_pack
+def run_generation_process(style_to_generate, bars, key, scale, bpm, progression_string, cover_title,
+                           output_mode='folder', archive_path=None, compression_level=None,
+                           seed=None, cache=None, cover_export=None, duplicate_index=None, on_composed=None, groove=None,
+                           score_format='pdf', bass_mode='style', bass_model=None, drum_mode='style'):
+    """
+    Função principal que executa todo o processo de geração de loops e arquivos.
+
+    output_mode: 'folder' (padrão, uma pasta com arquivos soltos), 'zip' ou 'tar'/'tar.gz'/'tar.bz2'/'tar.xz'
+    (um arquivo compactado gravado em streaming). Com archive_path, o pack é anexado a esse arquivo;
+    sem ele, é criado '<pasta>.zip' / '<pasta>.tar...' no diretório atual.
+    seed torna a geração reprodutível; junto com cache (um pack_cache.PackCache), packs já gerados
+    com os mesmos parâmetros são reaproveitados.
+    cover_export gera a capa em várias resoluções/formatos (veja iter_cover_artifacts).
+    duplicate_index (um loop_fingerprint.DuplicateIndex) rejeita packs quase idênticos aos já aceitos.
+    on_composed(pack) recebe os dados do pack assim que as notas são geradas (ex.: prévia em SVG na interface).
+    groove humaniza as trilhas MIDI (swing, deslocamentos, acentos); 'style' usa o groove do estilo (veja groove.py).
+    score_format: 'pdf' (LilyPond, padrão), 'musicxml' (gerado direto das notas, sem LilyPond) ou 'both'.
+    bass_mode='markov' gera o baixo com o modelo de n-gramas treinado (bass_model: caminho do .npz ou um BassModel).
+    drum_mode='mask' gera a bateria com variações e viradas pelo motor de máscaras (veja drum_engine.py).
+    """
+    print(f"--- Gerando Loop de {style_to_generate.capitalize()} ---")
+
+    if output_mode != 'folder' and output_mode not in pack_archive.ARCHIVE_FORMATS:
+        return None, f"Modo de saída '{output_mode}' inválido. Use 'folder', {', '.join(repr(m) for m in pack_archive.ARCHIVE_FORMATS)}."
+    if score_format not in SCORE_FORMATS:
+        return None, f"Formato de partitura '{score_format}' inválido. Use {', '.join(repr(f) for f in SCORE_FORMATS)}."
+
+    artifacts, error = _produce_pack_artifacts(style_to_generate, bars, key, scale, bpm, progression_string,
+                                               cover_title, seed=seed, cache=cache, cover_export=cover_export,
+                                               duplicate_index=duplicate_index, on_composed=on_composed, groove=groove,
+                                               score_format=score_format, bass_mode=bass_mode, bass_model=bass_model,
+                                               drum_mode=drum_mode)
+    if error:
+        return None, error
+
+    folder_name = pack_folder_name(style_to_generate, key, bpm)
+
+    if output_mode == 'folder':
+        os.makedirs(folder_name, exist_ok=True)
+        for filename, data in artifacts:
+            with open(os.path.join(folder_name, filename), "wb") as f: f.write(data)
+        print(f"\nSucesso! Loop completo gerado e salvo na pasta:\n  --> '{folder_name}'")
+        return folder_name, None
+
+    archive_path = archive_path or folder_name + pack_archive.ARCHIVE_FORMATS[output_mode]
+    archive, error = open_pack_archive(archive_path, output_mode, compression_level)
+    if error:
+        return None, error
+    with archive:
+        folder_name = archive.unique_folder_name(folder_name)
+        archive.add_pack(folder_name, artifacts)
+    print(f"\nSucesso! Loop completo gerado e salvo no arquivo:\n  --> '{archive_path}' ({folder_name}/)")
+    return f"{archive_path}:{folder_name}", None
+
+def open_pack_archive(archive_path: str, output_mode: str, compression_level: int | None = None):
+    """Abre (ou cria) o arquivo de saída: (PackArchive aberto, None) ou (None, "erro"), ex.: anexar a um tar.gz."""
+    try:
+        return pack_archive.PackArchive(archive_path, output_mode, compression_level).open(), None
+    except (ValueError, OSError) as e:
+        return None, f"Não foi possível abrir o arquivo de saída '{archive_path}': {e}"
+
+def run_batch_generation(jobs: list[dict], output_mode='folder', archive_path=None, compression_level=None, cache=None,
+                         reject_duplicates=False, score_format=None):
+    """
+    Gera vários packs em sequência. Cada job é um dicionário com os argumentos de run_generation_process
+    (incluindo, opcionalmente, seed). Nos modos compactados, todos os packs são gravados em streaming
+    em um único arquivo (archive_path).
+    reject_duplicates=True descarta packs quase idênticos a outros do mesmo lote; também aceita um
+    loop_fingerprint.DuplicateIndex já preenchido (ex.: PackLibrary.duplicate_index()) para comparar com a biblioteca.
+    score_format vale para os jobs que não definem o seu (ex.: 'musicxml' para um lote inteiro sem LilyPond).
+    Retorna uma lista de (nome_do_pack, erro), na ordem dos jobs.
+    """
+    if score_format is not None:
+        jobs = [{'score_format': score_format, **job} for job in jobs]
+    duplicate_index = None
+    if reject_duplicates is True:
+        import loop_fingerprint
+        duplicate_index = loop_fingerprint.DuplicateIndex()
+    elif reject_duplicates:
+        duplicate_index = reject_duplicates
+
+    if output_mode == 'folder':
+        return [run_generation_process(**job, cache=cache, duplicate_index=duplicate_index) for job in jobs]
+
+    if output_mode not in pack_archive.ARCHIVE_FORMATS:
+        return [(None, f"Modo de saída '{output_mode}' inválido.")] * len(jobs)
 
-    print(f"\nSucesso! Loop completo gerado e salvo na pasta:\n  --> '{folder_name}'")
-    return folder_name, None
+    archive_path = archive_path or f"batch_{int(time.time())}{pack_archive.ARCHIVE_FORMATS[output_mode]}"
+    archive, error = open_pack_archive(archive_path, output_mode, compression_level)
+    if error:
+        return [(None, error)] * len(jobs)
+    results = []
+    with archive:
+        for job in jobs:
+            print(f"--- Gerando Loop de {job['style_to_generate'].capitalize()} ---")
+            # Pela versão pública (com measure_pack), para os packs do lote entrarem nas métricas como os da pasta
+            artifacts, error = produce_pack_artifacts(**job, cache=cache, duplicate_index=duplicate_index)
+            if error:
+                results.append((None, error))
+                continue
+            folder_name = archive.unique_folder_name(pack_folder_name(job['style_to_generate'], job['key'], job['bpm']))
+            archive.add_pack(folder_name, artifacts)
+            results.append((f"{archive_path}:{folder_name}", None))
+    print(f"\nSucesso! {sum(1 for _, e in results if not e)} packs salvos no arquivo:\n  --> '{archive_path}'")
+    return results
 
 if __name__ == "__main__":
     # Este bloco serve para testar o módulo diretamente, se necessário
@@ -639,5 +1200,6 @@ if __name__ == "__main__":
         key='E',
         scale='minor',
         bpm=140,
-        progression_string='1-minor, 6-major, 7-major, 5-major'
-    )
\ No newline at end of file
+        progression_string='1-minor, 6-major, 7-major, 5-major',
+        cover_title='Heavy Rock Riffs'
+    )
@@ -0,0 +1,136 @@
+import io
+import os
+import random
+from functools import cached_property
+
+import loop_generator
+
+# --- PACK EM MEMÓRIA ---
+
+class LoopPack:
+    """
+    Um pack de loops mantido em memória.
+
+    Os MIDIs (bytes) e o código LilyPond (.ly) são produzidos na criação, pois são baratos.
+    O PDF e a capa só são calculados no primeiro acesso a `pdf` / `cover_image` / `cover_png`,
+    e ficam guardados para os acessos seguintes. Nada é escrito em disco até `save(path)`.
+    """
+
+    def __init__(self, data: dict, cover_title: str, cover_seed: int | None = None, cover_export: dict | None = None,
+                 score_format: str = 'pdf'):
+        self.data = data
+        self.style = data['style']
+        self.key = data['key']
+        self.scale = data['scale']
+        self.bpm = data['bpm']
+        self.bars = data['bars']
+        self.progression = data['progression']
+        self.cover_title = cover_title
+        self.cover_export = cover_export
+        self.score_format = score_format
+        # Fixa o seed da capa agora, para que a renderização tardia gere sempre a mesma imagem
+        self.cover_seed = cover_seed if cover_seed is not None else random.getrandbits(32)
+        self.folder_name = loop_generator.pack_folder_name(self.style, self.key, self.bpm)
+
+        self.midi_files = loop_generator.build_midi_files(self.style, data['tracks'], self.bpm)
+        self.score_title = f"{cover_title} - {self.key.capitalize()}"
+        self.score_filename = f"{self.style}_score"
+        ly = data['lilypond']
+        # Mesmo .ly de iter_lilypond_artifacts (com '\\transpose' em packs transpostos, veja pack_sweep)
+        self.lilypond_source = loop_generator.build_lilypond_source(
+            ly['bass'], ly['drums'], ly['piano'], self.score_title, transpose=data.get('lilypond_transpose', 0)
+        )
+
+    @property
+    def tracks(self) -> dict:
+        return self.data['tracks']
+
+    def midi_buffer(self, filename: str) -> io.BytesIO:
+        return io.BytesIO(self.midi_files[filename])
+
+    @cached_property
+    def score_files(self) -> list[tuple[str, bytes]]:
+        """.ly e PDF da partitura (ou a prévia em SVG, sem LilyPond), via loop_generator.iter_lilypond_artifacts."""
+        return list(loop_generator.iter_lilypond_artifacts(self.data, self.score_title, self.score_filename))
+
+    @cached_property
+    def pdf(self) -> bytes | None:
+        """PDF da partitura (None se o LilyPond não estiver disponível); partituras longas são renderizadas em seções paralelas."""
+        return dict(self.score_files).get(f"{self.score_filename}.pdf")
+
+    @cached_property
+    def score_svg(self) -> str:
+        """Prévia da partitura em SVG (piano-roll), desenhada em Python, sem LilyPond."""
+        import score_preview
+        return score_preview.render_score_svg(self.tracks, self.bars, self.score_title)
+
+    @cached_property
+    def musicxml(self) -> bytes:
+        """Partitura em MusicXML, escrita direto das notas (sem LilyPond)."""
+        import musicxml_export
+        return musicxml_export.render_musicxml(self.tracks, self.key, self.scale, self.bpm, self.bars, self.score_title)
+
+    @cached_property
+    def cover_image(self):
+        """Capa em resolução completa, como imagem PIL."""
+        return loop_generator.render_cover_image(self.style, self.key, self.bpm, self.cover_title, seed=self.cover_seed,
+                                                 **loop_generator.cover_art_options(self.cover_export))
+
+    @cached_property
+    def cover_png(self) -> bytes:
+        return loop_generator.image_to_bytes(self.cover_image)
+
+    @cached_property
+    def cover_files(self) -> list[tuple[str, bytes]]:
+        """Arquivos de capa conforme cover_export (vários tamanhos/formatos); sem ele, só 'cover_art.png'."""
+        if loop_generator.is_single_cover(self.cover_export):
+            return [("cover_art.png", self.cover_png)]
+        return list(loop_generator.iter_cover_artifacts(self.style, self.key, self.bpm, self.cover_title,
+                                                        seed=self.cover_seed, cover_export=self.cover_export))
+
+    @cached_property
+    def preview_wav(self) -> bytes:
+        """Prévia de áudio (WAV mono) do loop, sintetizada em NumPy."""
+        import audio_preview
+        return audio_preview.render_preview_wav(self.tracks, self.bpm, loop_bars=self.bars, seed=self.cover_seed)
+
+    def artifacts(self):
+        """
+        Gera (nome_do_arquivo, bytes) para todos os artefatos, materializando os preguiçosos.
+        A ordem e os nomes são os de loop_generator.iter_pack_artifacts, que recebe as partes já guardadas aqui.
+        """
+        score_files = self.score_files if self.score_format in ('pdf', 'both') else None
+        yield from loop_generator.iter_pack_artifacts(self.data, self.cover_title, self.cover_seed, self.cover_export,
+                                                      self.score_format, midi_files=self.midi_files,
+                                                      lilypond_artifacts=score_files, cover_files=self.cover_files)
+
+    def save(self, path: str | None = None) -> str:
+        """
+        Escreve todos os artefatos de uma vez na pasta `path` (padrão: a pasta nomeada do pack no diretório atual).
+        Retorna o caminho da pasta.
+        """
+        path = path or self.folder_name
+        files = list(self.artifacts())
+        os.makedirs(path, exist_ok=True)
+        for filename, content in files:
+            with open(os.path.join(path, filename), "wb") as f: f.write(content)
+        return path
+
+    def add_to_archive(self, archive, folder_name: str | None = None):
+        """Grava o pack em um pack_archive.PackArchive já aberto."""
+        archive.add_pack(folder_name or self.folder_name, self.artifacts())
+
+def generate_pack(style_to_generate, bars, key, scale, bpm, progression_string, cover_title, seed=None, cover_export=None,
+                  groove=None, score_format='pdf', bass_mode='style', bass_model=None, drum_mode='style'):
+    """
+    Versão em memória de run_generation_process: gera o pack sem tocar o disco.
+    Retorna (LoopPack, None) em caso de sucesso, ou (None, mensagem_de_erro) em caso de falha.
+    """
+    if score_format not in loop_generator.SCORE_FORMATS:
+        return None, f"Formato de partitura '{score_format}' inválido. Use {', '.join(repr(f) for f in loop_generator.SCORE_FORMATS)}."
+    print(f"--- Gerando Loop de {style_to_generate.capitalize()} (em memória) ---")
+    data, error = loop_generator.compose_pack(style_to_generate, bars, key, scale, bpm, progression_string, seed=seed,
+                                              groove=groove, bass_mode=bass_mode, bass_model=bass_model, drum_mode=drum_mode)
+    if error:
+        return None, error
+    return LoopPack(data, cover_title, cover_seed=seed, cover_export=cover_export, score_format=score_format), None
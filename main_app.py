@@ -1,22 +1,42 @@
 import sys
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QPushButton, QComboBox, QSpinBox, 
-                             QLabel, QProgressBar, QTextEdit, QLineEdit)
-from PyQt6.QtCore import QObject, QThread, pyqtSignal
+                             QLabel, QProgressBar, QTextEdit, QLineEdit, QScrollArea)
+from PyQt6.QtCore import QObject, QThread, pyqtSignal, QByteArray
+from PyQt6.QtSvgWidgets import QSvgWidget
 from qt_material import apply_stylesheet
 
 import loop_generator
+import groove
+import pack_rerender
+import score_preview
 
 class Worker(QObject):
     finished = pyqtSignal(object, object)
     progress = pyqtSignal(str)
+    preview = pyqtSignal(str)
 
-    def __init__(self, params):
+    def __init__(self, params, base_folder=None):
         super().__init__()
         self.params = params
+        # Pack anterior que difere só em BPM, tonalidade ou título: re-renderiza em vez de gerar tudo
+        self.base_folder = base_folder
 
     def run(self):
         try:
+            if self.base_folder:
+                self.progress.emit("Reaproveitando o pack anterior (só BPM, tonalidade ou título mudaram)...")
+                folder_name, error = pack_rerender.rerender_pack(
+                    self.base_folder, bpm=self.params['bpm'], key=self.params['key'],
+                    cover_title=self.params['cover_title']
+                )
+                if not error:
+                    self.preview.emit(score_preview.folder_score_svg(folder_name))
+                    self.progress.emit("Processo finalizado!")
+                    self.finished.emit(folder_name, None)
+                    return
+                self.progress.emit(f"Não foi possível re-renderizar ({error}); gerando do zero...")
+
             self.progress.emit("Iniciando geração...")
             
             folder_name, error = loop_generator.run_generation_process(
@@ -26,7 +46,9 @@ class Worker(QObject):
                 scale=self.params['scale'],
                 bpm=self.params['bpm'],
                 progression_string=self.params['progression_string'],
-                cover_title=self.params['cover_title'] # Passa o novo parâmetro
+                cover_title=self.params['cover_title'], # Passa o novo parâmetro
+                on_composed=self.emit_preview,
+                groove=None if self.params['groove'] == 'none' else self.params['groove']
             )
             
             self.progress.emit("Processo finalizado!")
@@ -38,12 +60,20 @@ class Worker(QObject):
             self.progress.emit(f"Ocorreu um erro crítico: {e}")
             self.finished.emit(None, str(e))
 
+    def emit_preview(self, pack):
+        # Chamado assim que as notas ficam prontas: a prévia aparece antes do LilyPond e da capa
+        title = f"{self.params['cover_title']} - {pack['key'].capitalize()}"
+        self.preview.emit(score_preview.render_score_svg(pack['tracks'], pack['bars'], title))
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
 
         self.setWindowTitle("Generator Loops Packs Python")
-        self.setGeometry(100, 100, 500, 550) # Janela um pouco maior
+        self.setGeometry(100, 100, 500, 750) # Altura extra para a prévia da partitura
+        self.last_folder = None
+        self.last_params = None
+        self.pending_params = None
 
         main_layout = QVBoxLayout()
         controls_layout = QVBoxLayout()
@@ -91,6 +121,14 @@ class MainWindow(QMainWindow):
         bpm_layout.addWidget(self.bars_spinbox)
         controls_layout.addLayout(bpm_layout)
 
+        # Groove (humanização): 'none' mantém a grade rígida; o padrão de cada estilo vem de groove.STYLE_GROOVES
+        groove_layout = QHBoxLayout()
+        self.groove_combo = QComboBox()
+        self.groove_combo.addItems(['none'] + list(groove.GROOVE_TEMPLATES))
+        groove_layout.addWidget(QLabel("Groove:"))
+        groove_layout.addWidget(self.groove_combo)
+        controls_layout.addLayout(groove_layout)
+
         main_layout.addLayout(controls_layout)
         main_layout.addStretch() # Adiciona espaço flexível
 
@@ -103,6 +141,14 @@ class MainWindow(QMainWindow):
         self.progress_bar.setVisible(False)
         main_layout.addWidget(self.progress_bar)
 
+        # Prévia da partitura (SVG desenhado em Python; o LilyPond fica só para o PDF final)
+        self.score_view = QSvgWidget()
+        self.score_scroll = QScrollArea()
+        self.score_scroll.setWidget(self.score_view)
+        self.score_scroll.setMinimumHeight(220)
+        self.score_scroll.setVisible(False)
+        main_layout.addWidget(self.score_scroll)
+
         self.status_output = QTextEdit()
         self.status_output.setReadOnly(True)
         main_layout.addWidget(self.status_output)
@@ -125,15 +171,27 @@ class MainWindow(QMainWindow):
             'bpm': self.bpm_spinbox.value(),
             'bars': self.bars_spinbox.value(),
             'progression_string': self.progression_input.text(),
-            'cover_title': self.cover_title_input.text() # Captura o novo título
+            'cover_title': self.cover_title_input.text(), # Captura o novo título
+            'groove': self.groove_combo.currentText()
         }
 
-        self.thread = QThread()
-        self.worker = Worker(params)
+        # Se só BPM, tonalidade ou título mudaram desde o último pack, o worker re-renderiza em vez de gerar tudo
+        incremental_keys = {'bpm', 'key', 'cover_title'}
+        base_folder = None
+        if (self.last_params and all(params[k] == self.last_params[k] for k in params if k not in incremental_keys)
+                and any(params[k] != self.last_params[k] for k in incremental_keys)):
+            base_folder = self.last_folder
+        self.pending_params = params
+
+        # Com a janela como pai, o QThread anterior não é destruído ainda rodando quando uma nova geração
+        # começa logo depois de generation_finished (o quit dele ainda está na fila); deleteLater o libera
+        self.thread = QThread(self)
+        self.worker = Worker(params, base_folder)
         self.worker.moveToThread(self.thread)
 
         self.thread.started.connect(self.worker.run)
         self.worker.progress.connect(self.update_status)
+        self.worker.preview.connect(self.show_preview)
         self.worker.finished.connect(self.generation_finished)
         
         self.worker.finished.connect(self.thread.quit)
@@ -145,6 +203,11 @@ class MainWindow(QMainWindow):
     def update_status(self, message):
         self.status_output.append(message)
 
+    def show_preview(self, svg):
+        self.score_view.load(QByteArray(svg.encode('utf-8')))
+        self.score_view.setFixedSize(self.score_view.renderer().defaultSize())
+        self.score_scroll.setVisible(True)
+
     def generation_finished(self, folder_name, error_message):
         self.progress_bar.setVisible(False)
         self.generate_button.setEnabled(True)
@@ -152,6 +215,7 @@ class MainWindow(QMainWindow):
         if error_message:
             self.status_output.append(f"\nERRO:\n{error_message}")
         else:
+            self.last_folder, self.last_params = folder_name, self.pending_params
             self.status_output.append(f"\nSUCESSO!\nLoop pack gerado na pasta:\n--> {folder_name}")
 
     def update_defaults(self, style):
@@ -171,6 +235,7 @@ class MainWindow(QMainWindow):
             self.bars_spinbox.setValue(config['bars'])
             self.progression_input.setText(config['prog'])
             self.cover_title_input.setText(config['title']) # Atualiza o novo campo de título
+            self.groove_combo.setCurrentText(groove.STYLE_GROOVES[style])
             
             is_blues = (style == 'blues')
             self.progression_input.setReadOnly(is_blues)
@@ -0,0 +1,219 @@
+import bisect
+import functools
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --- MÉTRICAS DE PRODUÇÃO (FORMATO DE TEXTO DO PROMETHEUS) ---
+
+# Desligadas por padrão: cada ponto de medição só testa esta flag e sai (veja enable)
+ENABLED = False
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# nome: (tipo, ajuda, buckets do histograma)
+METRICS = {
+    'loopgen_packs_total': ('counter', "Packs processados por run_generation_process, por estilo e resultado.", None),
+    'loopgen_pack_seconds': ('histogram', "Tempo total de run_generation_process por pack.", LATENCY_BUCKETS),
+    'loopgen_stage_seconds': ('histogram', "Tempo de cada etapa da geração (compose, score, cover).", LATENCY_BUCKETS),
+    'loopgen_lilypond_renders_total': ('counter', "Chamadas ao LilyPond por resultado (ok, error, missing).", None),
+    'loopgen_cache_requests_total': ('counter', "Consultas ao cache de packs por resultado (hit, miss).", None),
+    'loopgen_packs_in_progress': ('gauge', "Packs sendo gerados neste momento.", None),
+    'loopgen_last_pack_timestamp_seconds': ('gauge', "Horário (epoch) do último pack concluído com sucesso.", None),
+}
+
+_lock = threading.Lock()
+# (nome, labels ordenados) -> valor (contadores/gauges) ou [contagens por bucket, soma, total] (histogramas)
+_values: dict[tuple, object] = {}
+_textfile = None
+_server = None
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, amount: float = 1.0, **labels):
+    if not ENABLED:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0.0) + amount
+
+def set_gauge(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    with _lock:
+        _values[_key(name, labels)] = float(value)
+
+def add_gauge(name: str, amount: float, **labels):
+    inc(name, amount, **labels)
+
+def observe(name: str, value: float, **labels):
+    if not ENABLED:
+        return
+    buckets = METRICS[name][2]
+    key = _key(name, labels)
+    with _lock:
+        histogram = _values.get(key)
+        if histogram is None:
+            histogram = _values[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+        histogram[0][bisect.bisect_left(buckets, value)] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+class _Timer:
+    __slots__ = ('name', 'labels', 'started')
+
+    def __init__(self, name: str, labels: dict):
+        self.name, self.labels = name, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        # Etapas que falharam (ex.: LilyPond ausente) não entram na distribuição de latência
+        if exc_type is None:
+            observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+_NULL_TIMER = nullcontext()
+
+def timed(name: str, **labels):
+    """Context manager que observa a duração do bloco no histograma `name`; desligado, não mede nada."""
+    return _Timer(name, labels) if ENABLED else _NULL_TIMER
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+def render() -> str:
+    """Todas as métricas no formato de texto do Prometheus (versão 0.0.4)."""
+    with _lock:
+        items = sorted((key, (list(value[0]), value[1], value[2]) if isinstance(value, list) else value)
+                       for key, value in _values.items())
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for (metric, labels), value in items:
+            if metric != name:
+                continue
+            if kind != 'histogram':
+                lines.append(f"{name}{_format_labels(labels)} {value!r}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float('inf') else f"{bound:g}"
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total!r}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+def write_textfile(path: str | None = None):
+    """
+    Grava as métricas em um arquivo (para o textfile collector do node_exporter), de forma atômica.
+    '{pid}' no caminho vira o PID do processo: cada worker de generation_queue escreve o seu arquivo.
+    """
+    path = (path or _textfile).format(pid=os.getpid())
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding='utf-8') as f: f.write(render())
+    os.replace(tmp_path, path)
+
+def flush():
+    """Regrava o arquivo de métricas, se enable recebeu um; chamado ao fim de cada pack."""
+    if ENABLED and _textfile:
+        write_textfile()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Expõe GET /metrics em uma thread de fundo; devolve o servidor (server.shutdown() encerra)."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
+
+def enable(textfile: str | None = None, port: int | None = None, host: str = "127.0.0.1"):
+    """
+    Liga a coleta. textfile: arquivo regravado ao fim de cada pack; port: servidor HTTP local em /metrics.
+    Sem nenhum dos dois, as métricas ficam só em memória (render()).
+    """
+    global ENABLED, _textfile, _server
+    ENABLED = True
+    _textfile = textfile
+    if port is not None and _server is None:
+        _server = serve(port, host)
+        print(f"Métricas disponíveis em http://{host}:{_server.server_address[1]}/metrics")
+
+def disable():
+    global ENABLED, _server
+    ENABLED = False
+    if _server is not None:
+        _server.shutdown()
+        _server = None
+
+def reset():
+    with _lock:
+        _values.clear()
+
+def measure_pack(function):
+    """
+    Decorador de run_generation_process: conta packs por estilo e resultado, mede a duração total,
+    mantém o gauge de packs em andamento e regrava o arquivo de métricas. Desligado, só chama a função.
+    """
+    @functools.wraps(function)
+    def wrapper(style_to_generate, *args, **kwargs):
+        if not ENABLED:
+            return function(style_to_generate, *args, **kwargs)
+        add_gauge('loopgen_packs_in_progress', 1)
+        started = time.perf_counter()
+        status = 'exception'
+        try:
+            result = function(style_to_generate, *args, **kwargs)
+            status = 'error' if result[1] else 'ok'
+            return result
+        finally:
+            add_gauge('loopgen_packs_in_progress', -1)
+            inc('loopgen_packs_total', style=style_to_generate, status=status)
+            observe('loopgen_pack_seconds', time.perf_counter() - started, style=style_to_generate)
+            if status == 'ok':
+                set_gauge('loopgen_last_pack_timestamp_seconds', time.time())
+            flush()
+    return wrapper
+
+def benchmark(calls: int = 1_000_000):
+    """Custo de um ponto de medição com as métricas desligadas e ligadas."""
+    global ENABLED
+    for state in (False, True):
+        ENABLED = state
+        started = time.perf_counter()
+        for _ in range(calls):
+            with timed('loopgen_stage_seconds', stage='compose'):
+                pass
+            inc('loopgen_cache_requests_total', result='hit')
+        elapsed = (time.perf_counter() - started) / calls
+        print(f"{'Ligadas' if state else 'Desligadas'}: {elapsed * 1e9:.0f} ns por timed() + inc()")
+    ENABLED = False
+    reset()
+
+if __name__ == "__main__":
+    # Uso: python metrics.py -- mede o custo dos pontos de medição
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
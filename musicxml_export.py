@@ -0,0 +1,215 @@
+import json
+import os
+import sys
+import time
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from loop_generator import DRUM_MAP, NOTES, PACK_INFO_FILENAME, TICKS_PER_BEAT
+import note_events
+
+# --- EXPORTAÇÃO MUSICXML (ESCRITA EM STREAMING, SEM DOM) ---
+
+# Divisões por semínima: a partitura fica na grade de semicolcheias (notas humanizadas pelo groove voltam para a grade)
+DIVISIONS = 4
+STEP_TICKS = TICKS_PER_BEAT // DIVISIONS
+MEASURE_STEPS = DIVISIONS * 4
+# Durações escritas (em semicolcheias), da maior para a menor: (tipo, pontuada)
+NOTE_VALUES = [(16, 'whole', False), (12, 'half', True), (8, 'half', False), (6, 'quarter', True),
+               (4, 'quarter', False), (3, 'eighth', True), (2, 'eighth', False), (1, '16th', False)]
+SHARP_SPELLING = [('C', 0), ('C', 1), ('D', 0), ('D', 1), ('E', 0), ('F', 0), ('F', 1), ('G', 0), ('G', 1), ('A', 0), ('A', 1), ('B', 0)]
+FLAT_SPELLING = [('C', 0), ('D', -1), ('D', 0), ('E', -1), ('E', 0), ('F', 0), ('G', -1), ('G', 0), ('A', -1), ('A', 0), ('B', -1), ('B', 0)]
+# Armadura (quintas) de cada tônica maior, pela classe de altura
+MAJOR_FIFTHS = {0: 0, 7: 1, 2: 2, 9: 3, 4: 4, 11: 5, 6: 6, 1: -5, 8: -4, 3: -3, 10: -2, 5: -1}
+# Posição na pauta de percussão (linha/espaço) e cabeça de nota de cada peça
+DRUM_DISPLAY = {'kick': ('F', 4, None), 'snare': ('C', 5, None), 'closed_hat': ('G', 5, 'x'), 'open_hat': ('G', 5, 'circle-x'),
+                'crash': ('A', 5, 'x'), 'ride': ('F', 5, 'x')}
+DRUM_PIECES = {note: name for name, note in DRUM_MAP.items()}
+# id, nome, canal MIDI (1-16), programa (1-128) e clave de cada parte, na ordem da partitura LilyPond
+PARTS = [('P1', 'Piano', 'piano', 1, 1, ('G', 2)), ('P2', 'Bass', 'bass', 2, 34, ('F', 4)), ('P3', 'Drums', 'drums', 10, 1, ('percussion', 2))]
+
+def key_fifths(key: str, scale: str) -> int:
+    """Número de acidentes da armadura (positivo = sustenidos); a menor usa a armadura da relativa maior."""
+    pitch_class = NOTES[key] % 12
+    return MAJOR_FIFTHS[(pitch_class + 3) % 12 if scale == 'minor' else pitch_class]
+
+def quantize_events(events: np.ndarray, total_steps: int) -> list[tuple[int, int, list[int], int]]:
+    """
+    Agrupa as notas de uma trilha em acordes na grade: [(início, duração, alturas, dinâmica), ...] em semicolcheias.
+    Cada acorde dura até o fim da nota mais longa ou até o próximo ataque (uma voz por pauta); notas além do
+    último compasso são cortadas. Tudo em O(n log n) pela ordenação, depois uma passada linear.
+    """
+    if len(events) == 0:
+        return []
+    starts = np.rint(events['start'] / STEP_TICKS).astype(np.int64)
+    ends = np.maximum(np.rint(events['end'] / STEP_TICKS).astype(np.int64), starts + 1)
+    keep = starts < total_steps
+    starts, ends = starts[keep], np.minimum(ends[keep], total_steps)
+    notes, velocities = events['note'][keep], events['velocity'][keep]
+    order = np.lexsort((notes, starts))
+    starts, ends, notes, velocities = starts[order], ends[order], notes[order], velocities[order]
+    onsets, first = np.unique(starts, return_index=True)
+    group_end = np.maximum.reduceat(ends, first) if len(first) else ends
+    next_onset = np.append(onsets[1:], total_steps)
+    durations = np.minimum(group_end, next_onset) - onsets
+    bounds = np.append(first, len(starts)).tolist()
+    notes, velocities = notes.tolist(), velocities.tolist()
+    chords = []
+    for i, (onset, duration) in enumerate(zip(onsets.tolist(), durations.tolist())):
+        pitches = sorted(set(notes[bounds[i]:bounds[i + 1]]))
+        chords.append((onset, duration, pitches, max(velocities[bounds[i]:bounds[i + 1]])))
+    return chords
+
+def _split(position: int, duration: int) -> list[int]:
+    """Quebra uma duração em valores escrevíveis sem cruzar a barra de compasso."""
+    pieces = []
+    while duration > 0:
+        room = min(duration, MEASURE_STEPS - position % MEASURE_STEPS)
+        value = next(steps for steps, _, _ in NOTE_VALUES if steps <= room)
+        pieces.append(value)
+        position += value
+        duration -= value
+    return pieces
+
+_VALUE_TAGS = {steps: f"<type>{kind}</type>" + ("<dot/>" if dotted else "") for steps, kind, dotted in NOTE_VALUES}
+
+def _note_xml(part_id: str, pitches, steps: int, tie_start: bool, tie_stop: bool, velocity: int, spelling) -> str:
+    ties = ('<tie type="stop"/>' if tie_stop else '') + ('<tie type="start"/>' if tie_start else '')
+    tied = ('<tied type="stop"/>' if tie_stop else '') + ('<tied type="start"/>' if tie_start else '')
+    notations = f"<notations>{tied}</notations>" if tied else ""
+    if pitches is None:
+        return f"<note><rest/><duration>{steps}</duration><voice>1</voice>{_VALUE_TAGS[steps]}</note>"
+    out = []
+    for i, pitch in enumerate(pitches):
+        chord = "<chord/>" if i else ""
+        dynamics = round(velocity / 90 * 100)
+        if part_id == 'P3':
+            display_step, display_octave, notehead = DRUM_DISPLAY[DRUM_PIECES.get(pitch, 'snare')]
+            head = f"<notehead>{notehead}</notehead>" if notehead else ""
+            out.append(f'<note dynamics="{dynamics}">{chord}<unpitched><display-step>{display_step}</display-step>'
+                       f'<display-octave>{display_octave}</display-octave></unpitched><duration>{steps}</duration>{ties}'
+                       f'<instrument id="P3-I{pitch + 1}"/><voice>1</voice>{_VALUE_TAGS[steps]}<stem>up</stem>{head}{notations}</note>')
+        else:
+            step, alter = spelling[pitch % 12]
+            alter_tag = f"<alter>{alter}</alter>" if alter else ""
+            out.append(f'<note dynamics="{dynamics}">{chord}<pitch><step>{step}</step>{alter_tag}<octave>{pitch // 12 - 1}</octave></pitch>'
+                       f'<duration>{steps}</duration>{ties}<voice>1</voice>{_VALUE_TAGS[steps]}{notations}</note>')
+    return "".join(out)
+
+def _iter_part(part_id: str, chords: list, bars: int, attributes: str, first_measure_extra: str, spelling):
+    """Gera o XML de uma parte compasso a compasso, preenchendo com pausas os trechos sem notas."""
+    position = 0
+    chord_index = 0
+    total_steps = bars * MEASURE_STEPS
+    for bar in range(bars):
+        measure_end = (bar + 1) * MEASURE_STEPS
+        chunks = [f'<measure number="{bar + 1}">']
+        if bar == 0:
+            chunks.append(attributes + first_measure_extra)
+        while position < measure_end:
+            if chord_index < len(chords) and chords[chord_index][0] < measure_end:
+                onset, duration, pitches, velocity = chords[chord_index]
+                if onset > position:
+                    rest = min(onset, measure_end) - position
+                    for steps in _split(position, rest):
+                        chunks.append(_note_xml(part_id, None, steps, False, False, 0, spelling))
+                    position += rest
+                    continue
+                # Parte do acorde que cabe neste compasso; o resto continua ligado no próximo
+                remaining = onset + duration - position
+                length = min(remaining, measure_end - position)
+                pieces = _split(position, length)
+                for i, steps in enumerate(pieces):
+                    is_last = i == len(pieces) - 1 and length == remaining
+                    chunks.append(_note_xml(part_id, pitches, steps, not is_last, position > onset, velocity, spelling))
+                    position += steps
+                if position >= onset + duration:
+                    chord_index += 1
+            else:
+                for steps in _split(position, measure_end - position):
+                    chunks.append(_note_xml(part_id, None, steps, False, False, 0, spelling))
+                position = measure_end
+        if bar == bars - 1 and position >= total_steps:
+            chunks.append('<barline location="right"><bar-style>light-heavy</bar-style></barline>')
+        chunks.append('</measure>')
+        yield "".join(chunks)
+
+def _part_list() -> str:
+    chunks = ['<part-list>']
+    for part_id, name, _, channel, program, _ in PARTS:
+        chunks.append(f'<score-part id="{part_id}"><part-name>{name}</part-name>')
+        if part_id == 'P3':
+            for note, piece in sorted(DRUM_PIECES.items()):
+                chunks.append(f'<score-instrument id="P3-I{note + 1}"><instrument-name>{piece.replace("_", " ").title()}</instrument-name></score-instrument>')
+            for note in sorted(DRUM_PIECES):
+                chunks.append(f'<midi-instrument id="P3-I{note + 1}"><midi-channel>{channel}</midi-channel>'
+                              f'<midi-unpitched>{note + 1}</midi-unpitched></midi-instrument>')
+        else:
+            chunks.append(f'<score-instrument id="{part_id}-I1"><instrument-name>{name}</instrument-name></score-instrument>'
+                          f'<midi-instrument id="{part_id}-I1"><midi-channel>{channel}</midi-channel>'
+                          f'<midi-program>{program}</midi-program></midi-instrument>')
+        chunks.append('</score-part>')
+    chunks.append('</part-list>')
+    return "".join(chunks)
+
+def iter_musicxml(events: dict, key: str, scale: str, bpm: int, bars: int, title: str = ""):
+    """
+    Gera a partitura MusicXML (score-partwise 4.0) em pedaços de texto, direto dos arrays de notas
+    ({'piano', 'bass', 'drums'} -> NOTE_EVENT_DTYPE): cabeçalho, depois um pedaço por compasso de cada parte.
+    Nenhuma árvore XML é montada; o custo é linear no número de notas e compassos.
+    """
+    fifths = key_fifths(key, scale)
+    spelling = FLAT_SPELLING if fifths < 0 else SHARP_SPELLING
+    yield ('<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n'
+           '<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 4.0 Partwise//EN" '
+           '"http://www.musicxml.org/dtds/partwise.dtd">\n<score-partwise version="4.0">\n')
+    yield (f'<work><work-title>{escape(title)}</work-title></work><identification>'
+           f'<creator type="composer">Generated by LoopGenerator AI</creator>'
+           f'<encoding><software>Generator Loops Packs Python</software></encoding></identification>\n')
+    yield _part_list() + "\n"
+    total_steps = bars * MEASURE_STEPS
+    for part_id, _, track_name, _, _, (clef_sign, clef_line) in PARTS:
+        chords = quantize_events(events.get(track_name, np.zeros(0, dtype=note_events.NOTE_EVENT_DTYPE)), total_steps)
+        key_tag = f"<key><fifths>{fifths}</fifths><mode>{scale}</mode></key>" if part_id != 'P3' else ""
+        attributes = (f'<attributes><divisions>{DIVISIONS}</divisions>{key_tag}<time><beats>4</beats><beat-type>4</beat-type></time>'
+                      f'<clef><sign>{clef_sign}</sign><line>{clef_line}</line></clef></attributes>')
+        tempo = ""
+        if part_id == 'P1':
+            tempo = (f'<direction placement="above"><direction-type><metronome><beat-unit>quarter</beat-unit>'
+                     f'<per-minute>{bpm}</per-minute></metronome></direction-type><sound tempo="{bpm}"/></direction>')
+        yield f'<part id="{part_id}">\n'
+        for measure in _iter_part(part_id, chords, bars, attributes, tempo, spelling):
+            yield measure + "\n"
+        yield '</part>\n'
+    yield '</score-partwise>\n'
+
+def render_musicxml(tracks: dict, key: str, scale: str, bpm: int, bars: int, title: str = "") -> bytes:
+    """MusicXML de um pack a partir das trilhas mido ({'bass', 'drums', 'piano'})."""
+    events = {name: note_events.track_to_events(track) for name, track in tracks.items()}
+    return "".join(iter_musicxml(events, key, scale, bpm, bars, title)).encode('utf-8')
+
+def write_musicxml(path: str, tracks: dict, key: str, scale: str, bpm: int, bars: int, title: str = ""):
+    """Grava o MusicXML em disco à medida que os compassos são gerados."""
+    events = {name: note_events.track_to_events(track) for name, track in tracks.items()}
+    with open(path, "w", encoding='utf-8') as f:
+        for chunk in iter_musicxml(events, key, scale, bpm, bars, title):
+            f.write(chunk)
+
+def folder_musicxml(folder_path: str, output_path: str):
+    """MusicXML de uma pasta de pack existente (tonalidade, escala, compassos e título vêm do pack_info.json)."""
+    tracks, bpm = note_events.load_pack_tracks(folder_path)
+    with open(os.path.join(folder_path, PACK_INFO_FILENAME), encoding='utf-8') as f:
+        info = json.load(f)
+    write_musicxml(output_path, tracks, info['key'], info['scale'], info['bpm'], info['bars'],
+                   f"{info['score_title']} - {info['key'].capitalize()}")
+
+if __name__ == "__main__":
+    # Uso: python musicxml_export.py <pasta_do_pack> [saida.musicxml]
+    if len(sys.argv) < 2:
+        print("Uso: python musicxml_export.py <pasta_do_pack> [saida.musicxml]")
+        sys.exit(1)
+    output = sys.argv[2] if len(sys.argv) > 2 else os.path.join(sys.argv[1], "score.musicxml")
+    started = time.perf_counter()
+    folder_musicxml(sys.argv[1], output)
+    print(f"Partitura MusicXML salva em '{output}' ({(time.perf_counter() - started) * 1000:.1f} ms).")
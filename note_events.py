@@ -0,0 +1,73 @@
+import glob
+import os
+
+import mido
+import numpy as np
+
+from loop_generator import TICKS_PER_BEAT
+
+# --- EVENTOS DE NOTA (REPRESENTAÇÃO EM ARRAY) ---
+
+# Uma nota por linha, tempos em ticks absolutos
+NOTE_EVENT_DTYPE = np.dtype([
+    ('start', np.int64), ('end', np.int64), ('note', np.int16), ('velocity', np.int16), ('channel', np.int8)
+])
+
+def track_to_events(track: mido.MidiTrack) -> np.ndarray:
+    """
+    Converte uma trilha mido (tempos em delta) em um array estruturado de notas (NOTE_EVENT_DTYPE), ordenado pelo início.
+    note_on com velocity 0 conta como note_off; os 'note_on note=1 velocity=0' usados como pausa são ignorados.
+    """
+    open_notes = {}
+    rows = []
+    now = 0
+    for msg in track:
+        now += msg.time
+        if msg.type == 'note_on' and msg.velocity > 0:
+            open_notes.setdefault((msg.channel, msg.note), []).append((now, msg.velocity))
+        elif msg.type in ('note_off', 'note_on'):
+            stack = open_notes.get((msg.channel, msg.note))
+            if stack:
+                start, velocity = stack.pop(0)
+                rows.append((start, max(now, start + 1), msg.note, velocity, msg.channel))
+    for (channel, note), stack in open_notes.items():
+        for start, velocity in stack:
+            rows.append((start, max(now, start + 1), note, velocity, channel))
+    events = np.array(rows, dtype=NOTE_EVENT_DTYPE)
+    return np.sort(events, order=('start', 'note'))
+
+def events_to_track(events: np.ndarray) -> mido.MidiTrack:
+    """Operação inversa de track_to_events: gera uma trilha mido com tempos em delta."""
+    on = [(int(e['start']), 1, int(e['note']), int(e['velocity']), int(e['channel'])) for e in events]
+    off = [(int(e['end']), 0, int(e['note']), 64, int(e['channel'])) for e in events]
+    track = mido.MidiTrack()
+    last_time = 0
+    for time, is_on, note, velocity, channel in sorted(on + off):
+        track.append(mido.Message('note_on' if is_on else 'note_off', channel=channel, note=note,
+                                  velocity=velocity, time=time - last_time))
+        last_time = time
+    return track
+
+def tracks_to_events(tracks: dict) -> dict[str, np.ndarray]:
+    return {name: track_to_events(track) for name, track in tracks.items()}
+
+def find_tempo(mid: mido.MidiFile, default_bpm: int = 120) -> float:
+    for track in mid.tracks:
+        for msg in track:
+            if msg.type == 'set_tempo':
+                return mido.tempo2bpm(msg.tempo)
+    return default_bpm
+
+def load_pack_tracks(folder_path: str) -> tuple[dict, float]:
+    """
+    Lê o '*_full_mix.mid' de uma pasta de pack e devolve ({'bass', 'piano', 'drums'}: trilha, bpm).
+    As trilhas seguem a ordem em que run_generation_process grava o mix (baixo, piano, bateria).
+    """
+    matches = glob.glob(os.path.join(folder_path, "*_full_mix.mid"))
+    if not matches:
+        raise FileNotFoundError(f"Nenhum '*_full_mix.mid' encontrado em '{folder_path}'.")
+    mid = mido.MidiFile(matches[0])
+    if mid.ticks_per_beat != TICKS_PER_BEAT:
+        raise ValueError(f"Resolução inesperada ({mid.ticks_per_beat} ticks por tempo) em '{matches[0]}'.")
+    tracks = dict(zip(('bass', 'piano', 'drums'), mid.tracks))
+    return tracks, find_tempo(mid)
@@ -0,0 +1,96 @@
+import io
+import os
+import tarfile
+import time
+import zipfile
+
+# --- SAÍDA COMPACTADA (ZIP/TAR) PARA PACKS ---
+
+# Modo de saída -> extensão padrão do arquivo
+ARCHIVE_FORMATS = {
+    'zip': '.zip',
+    'tar': '.tar',
+    'tar.gz': '.tar.gz',
+    'tar.bz2': '.tar.bz2',
+    'tar.xz': '.tar.xz',
+}
+
+class PackArchive:
+    """
+    Grava os artefatos de um ou mais packs diretamente em um arquivo zip ou tar, em streaming.
+    Cada artefato é recebido como bytes em memória e escrito como uma entrada do arquivo, sem arquivos temporários.
+    Se o arquivo já existir, os novos packs são anexados (zip e tar sem compressão).
+    """
+
+    def __init__(self, path: str, mode: str = 'zip', compression_level: int | None = None):
+        if mode not in ARCHIVE_FORMATS:
+            raise ValueError(f"Formato de arquivo '{mode}' não suportado. Use um de: {', '.join(ARCHIVE_FORMATS)}.")
+        self.path = path
+        self.mode = mode
+        self.compression_level = compression_level
+        self._folders = set()
+        self._archive = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        if self._archive is not None:
+            return self
+        exists = os.path.exists(self.path)
+        if self.mode == 'zip':
+            self._archive = zipfile.ZipFile(
+                self.path, 'a' if exists else 'w',
+                compression=zipfile.ZIP_DEFLATED, compresslevel=self.compression_level
+            )
+            self._folders.update(name.split('/', 1)[0] for name in self._archive.namelist())
+        elif self.mode == 'tar':
+            self._archive = tarfile.open(self.path, 'a' if exists else 'w')
+            self._folders.update(name.split('/', 1)[0] for name in self._archive.getnames())
+        else:
+            if exists:
+                raise ValueError(f"Não é possível anexar a um tar compactado ('{self.path}'). Use 'zip' ou 'tar' para anexar packs.")
+            compression = self.mode.split('.')[1]
+            options = {}
+            if self.compression_level is not None:
+                options['preset' if compression == 'xz' else 'compresslevel'] = self.compression_level
+            self._archive = tarfile.open(self.path, f'w:{compression}', **options)
+        return self
+
+    def close(self):
+        if self._archive is not None:
+            self._archive.close()
+            self._archive = None
+
+    def has_pack(self, folder_name: str) -> bool:
+        return folder_name.rstrip('/') in self._folders
+
+    def unique_folder_name(self, folder_name: str) -> str:
+        """Evita colisão de nomes quando vários packs iguais caem no mesmo segundo no mesmo arquivo."""
+        candidate, n = folder_name, 1
+        while self.has_pack(candidate):
+            candidate, n = f"{folder_name}_{n}", n + 1
+        return candidate
+
+    def add_file(self, arcname: str, data: bytes):
+        if self.mode == 'zip':
+            self._archive.writestr(arcname, data)
+        else:
+            info = tarfile.TarInfo(arcname)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self._archive.addfile(info, io.BytesIO(data))
+        self._folders.add(arcname.split('/', 1)[0])
+
+    def add_pack(self, folder_name: str, artifacts):
+        """
+        Grava cada (nome_do_arquivo, bytes) de artifacts dentro de '<folder_name>/' no arquivo.
+        artifacts pode ser um gerador: cada artefato é escrito assim que fica pronto.
+        """
+        for filename, data in artifacts:
+            self.add_file(f"{folder_name}/{filename}", data)
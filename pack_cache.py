@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import zipfile
+
+import loop_generator
+
+# --- CACHE PERSISTENTE DE PACKS (LRU) ---
+
+class PackCache:
+    """
+    Cache persistente de packs completos, limitado por tamanho e com política LRU.
+
+    A chave é um hash canônico dos parâmetros de geração, do seed e de GENERATOR_VERSION.
+    Os artefatos de cada pack ficam em um .zip sem compressão (PNG e PDF já são compactados)
+    e o índice (tamanhos, último acesso, estatísticas) fica em um SQLite no mesmo diretório.
+    """
+
+    def __init__(self, directory: str = ".loop_pack_cache", max_bytes: int = 512 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(directory, "index.sqlite3"), timeout=30)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access);
+            CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0), ('evictions', 0);
+        """)
+        self._db.commit()
+
+    @staticmethod
+    def make_key(style_to_generate, bars, key, scale, bpm, progression_string, cover_title, seed, options: dict | None = None) -> str:
+        """Hash canônico dos parâmetros: progressões equivalentes ('1-minor,4-major' e '1-Minor, 4-major') dão a mesma chave."""
+        progression = []
+        if style_to_generate != 'blues':
+            parsed, error = loop_generator.parse_progression_string(progression_string)
+            progression = parsed if not error else progression_string
+        params = {
+            'version': loop_generator.GENERATOR_VERSION,
+            'style': style_to_generate, 'bars': int(bars), 'key': key, 'scale': scale, 'bpm': int(bpm),
+            'progression': progression, 'title': cover_title, 'seed': seed,
+        }
+        if options:
+            params['options'] = options
+        canonical = json.dumps(params, sort_keys=True, separators=(',', ':'), default=list)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _blob_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.zip")
+
+    def _bump(self, counter: str, amount: int = 1):
+        self._db.execute("UPDATE counters SET value = value + ? WHERE name = ?", (amount, counter))
+
+    def get(self, key: str) -> list[tuple[str, bytes]] | None:
+        """Devolve a lista de (nome_do_arquivo, bytes) do pack, ou None se não estiver no cache."""
+        row = self._db.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+        artifacts = None
+        if row is not None:
+            try:
+                with zipfile.ZipFile(self._blob_path(key)) as zf:
+                    artifacts = [(name, zf.read(name)) for name in zf.namelist()]
+            except (OSError, zipfile.BadZipFile):
+                # Arquivo sumiu ou corrompeu: trata como falha e remove a entrada
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+        if artifacts is None:
+            self._bump('misses')
+        else:
+            self._bump('hits')
+            self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time_ns(), key))
+        self._db.commit()
+        return artifacts
+
+    def put(self, key: str, artifacts):
+        path = self._blob_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_STORED) as zf:
+            for name, data in artifacts:
+                zf.writestr(name, data)
+        os.replace(tmp_path, path)
+        now = time.time_ns()
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries (key, size, created, last_access) VALUES (?, ?, ?, ?)",
+            (key, os.path.getsize(path), time.time(), now)
+        )
+        self._db.commit()
+        self.evict()
+
+    def evict(self, max_bytes: int | None = None) -> int:
+        """Remove as entradas menos usadas recentemente até caber em max_bytes. Retorna quantas foram removidas."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        removed = 0
+        if total > limit:
+            for key, size in self._db.execute("SELECT key, size FROM entries ORDER BY last_access").fetchall():
+                if total <= limit:
+                    break
+                try:
+                    os.remove(self._blob_path(key))
+                except FileNotFoundError:
+                    pass
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+                removed += 1
+            self._bump('evictions', removed)
+            self._db.commit()
+        return removed
+
+    def clear(self):
+        self.evict(max_bytes=0)
+
+    def stats(self) -> dict:
+        counters = dict(self._db.execute("SELECT name, value FROM counters").fetchall())
+        entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = counters['hits'] + counters['misses']
+        return {
+            'entries': entries, 'size_bytes': size, 'max_bytes': self.max_bytes,
+            'hits': counters['hits'], 'misses': counters['misses'], 'evictions': counters['evictions'],
+            'hit_rate': counters['hits'] / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,305 @@
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+import loop_fingerprint
+import loop_generator
+from loop_generator import TICKS_PER_BEAT
+import note_events
+import pack_rerender
+
+# --- BIBLIOTECA INDEXADA DE PACKS (SQLITE) ---
+
+PACK_FOLDER_PATTERN = re.compile(r'^(?P<style>[a-z]+)_loop_(?P<key>[a-g]s?)_(?P<bpm>\d+)bpm_(?P<timestamp>\d+)(?:_\d+)?$')
+LIBRARY_TRACKS = ('bass', 'piano', 'drums')
+TRACK_STATS = ('notes', 'density', 'pitch_min', 'pitch_max', 'mean_velocity', 'syncopation')
+# Acima disso (notas por compasso), o baixo é considerado "movimentado"
+BUSY_BASS_DENSITY = 8.0
+# guess_scale só decide se a escala vencedora tiver pelo menos esta fração das notas a mais que a outra
+SCALE_GUESS_MARGIN = 0.05
+
+_PACK_COLUMNS = ['path', 'folder', 'style', 'key', 'bpm', 'created', 'bars', 'scale_guess', 'has_pdf', 'has_cover', 'mtime']
+_STAT_COLUMNS = [f"{track}_{stat}" for track in LIBRARY_TRACKS for stat in TRACK_STATS]
+SEARCHABLE_COLUMNS = set(_PACK_COLUMNS + _STAT_COLUMNS)
+
+def parse_pack_folder_name(folder: str) -> dict | None:
+    """Extrai estilo, tonalidade, BPM e timestamp de um nome '{style}_loop_{key}_{bpm}bpm_{timestamp}'."""
+    match = PACK_FOLDER_PATTERN.match(folder)
+    if not match:
+        return None
+    key = match['key'].upper().replace('S', '#')
+    return {'style': match['style'], 'key': key, 'bpm': int(match['bpm']), 'created': int(match['timestamp'])}
+
+def syncopation(starts: np.ndarray) -> float:
+    """
+    Fração das notas que começam fora das colcheias (peso 1) ou fora dos tempos (peso 0.5).
+    Os inícios são arredondados para a semicolcheia, para o groove (swing, deslocamentos) não contar como síncope.
+    """
+    if len(starts) == 0:
+        return 0.0
+    starts = np.rint(starts / (TICKS_PER_BEAT // 4)).astype(np.int64) * (TICKS_PER_BEAT // 4)
+    off_eighth = (starts % (TICKS_PER_BEAT // 2)) != 0
+    off_beat = (starts % TICKS_PER_BEAT) != 0
+    return float(np.mean(np.where(off_eighth, 1.0, np.where(off_beat, 0.5, 0.0))))
+
+def guess_scale(pitches: np.ndarray, key: str) -> str | None:
+    """
+    Compara o histograma de classes de altura com as escalas maior e menor a partir da tônica.
+    As duas escalas têm quatro graus em comum (tônica, 2ª, 4ª e 5ª), então empates são frequentes:
+    com empate ou diferença menor que SCALE_GUESS_MARGIN das notas, devolve None em vez de escolher uma.
+    """
+    if len(pitches) == 0:
+        return None
+    root = loop_generator.NOTES[key] % 12
+    histogram = np.bincount((pitches - root) % 12, minlength=12)
+    scores = {}
+    for scale, intervals in loop_generator.SCALES.items():
+        degrees = np.cumsum([0] + intervals[:-1])
+        scores[scale] = histogram[degrees].sum()
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    if scores[ranked[0]] - scores[ranked[1]] < max(1, SCALE_GUESS_MARGIN * len(pitches)):
+        return None
+    return ranked[0]
+
+def pack_scale(folder_path: str, pitches: np.ndarray, key: str) -> str | None:
+    """A escala gravada no pack_info.json; packs sem ele (anteriores à versão 1.2.0) caem em guess_scale."""
+    info, _ = pack_rerender.load_pack_info(folder_path)
+    if info is not None and info.get('scale') in loop_generator.SCALES:
+        return info['scale']
+    return guess_scale(pitches, key)
+
+def pack_statistics(folder_path: str) -> dict:
+    """Lê o MIDI combinado do pack e calcula as estatísticas de cada trilha e a impressão digital (MinHash)."""
+    tracks, _ = note_events.load_pack_tracks(folder_path)
+    events = {name: note_events.track_to_events(track) for name, track in tracks.items()}
+    # Pelo início da última nota do baixo/bateria: notas ligadas e os acordes do piano funk podem passar do fim do loop
+    rhythm = [events[name] for name in ('bass', 'drums') if name in events and len(events[name])] or list(events.values())
+    last_start = max((int(e['start'].max()) for e in rhythm if len(e)), default=0)
+    bars = last_start // (TICKS_PER_BEAT * 4) + 1
+    stats = {'bars': bars}
+    for name in LIBRARY_TRACKS:
+        e = events.get(name, np.zeros(0, dtype=note_events.NOTE_EVENT_DTYPE))
+        stats[f"{name}_notes"] = len(e)
+        stats[f"{name}_density"] = len(e) / bars
+        stats[f"{name}_pitch_min"] = int(e['note'].min()) if len(e) else None
+        stats[f"{name}_pitch_max"] = int(e['note'].max()) if len(e) else None
+        stats[f"{name}_mean_velocity"] = float(e['velocity'].mean()) if len(e) else None
+        stats[f"{name}_syncopation"] = syncopation(e['start'])
+    tonal = np.concatenate([events[name]['note'] for name in ('bass', 'piano') if name in events]).astype(np.int64)
+    stats['tonal_pitches'] = tonal
+    stats['fingerprint'] = loop_fingerprint.events_fingerprint(events)
+    return stats
+
+def _folder_mtime(folder_path: str) -> float:
+    # A pasta muda de mtime quando arquivos são criados/removidos; os MIDIs cobrem a regravação no lugar
+    mtimes = [os.path.getmtime(folder_path)]
+    for entry in os.scandir(folder_path):
+        if entry.name.endswith('.mid'):
+            mtimes.append(entry.stat().st_mtime)
+    return max(mtimes)
+
+class PackLibrary:
+    """
+    Índice SQLite das pastas de packs. scan() só reprocessa pastas novas ou alteradas (pelo mtime)
+    e remove do índice as que sumiram; search() consulta os metadados e as estatísticas de notas
+    usando os índices da tabela.
+    """
+
+    def __init__(self, db_path: str = "pack_library.sqlite3"):
+        self.db_path = db_path
+        self._db = sqlite3.connect(db_path)
+        self._db.row_factory = sqlite3.Row
+        stat_columns = ",\n".join(f"{column} REAL" for column in _STAT_COLUMNS)
+        self._db.executescript(f"""
+            CREATE TABLE IF NOT EXISTS packs (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                folder TEXT NOT NULL,
+                style TEXT NOT NULL,
+                key TEXT NOT NULL,
+                bpm INTEGER NOT NULL,
+                created INTEGER,
+                bars INTEGER,
+                scale_guess TEXT,
+                has_pdf INTEGER,
+                has_cover INTEGER,
+                mtime REAL NOT NULL,
+                fingerprint BLOB,
+                {stat_columns}
+            );
+            CREATE INDEX IF NOT EXISTS idx_packs_style_key_bpm ON packs(style, key, bpm);
+            CREATE INDEX IF NOT EXISTS idx_packs_style_scale_bpm ON packs(style, scale_guess, bpm);
+            CREATE INDEX IF NOT EXISTS idx_packs_bpm ON packs(bpm);
+            CREATE INDEX IF NOT EXISTS idx_packs_bass_density ON packs(bass_density);
+            CREATE INDEX IF NOT EXISTS idx_packs_created ON packs(created);
+        """)
+        # Índices criados antes das impressões digitais: a coluna é adicionada e as pastas são reprocessadas no próximo scan
+        if 'fingerprint' not in {row['name'] for row in self._db.execute("PRAGMA table_info(packs)")}:
+            self._db.execute("ALTER TABLE packs ADD COLUMN fingerprint BLOB")
+        # Índices anteriores à leitura da escala do pack_info.json: zera o mtime para as pastas serem reprocessadas
+        if self._db.execute("PRAGMA user_version").fetchone()[0] < 1:
+            self._db.execute("UPDATE packs SET mtime = -1")
+            self._db.execute("PRAGMA user_version = 1")
+        self._db.commit()
+
+    def scan(self, root: str, verbose: bool = True) -> dict:
+        """Indexa as pastas de packs diretamente dentro de root. Retorna contadores (added, updated, unchanged, removed, errors)."""
+        started = time.perf_counter()
+        known = {row['path']: row['mtime'] for row in self._db.execute("SELECT path, mtime FROM packs WHERE fingerprint IS NOT NULL")}
+        known_paths = {row['path'] for row in self._db.execute("SELECT path FROM packs")}
+        root = os.path.abspath(root)
+        seen = set()
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0, 'removed': 0, 'errors': 0}
+        for entry in os.scandir(root):
+            if not entry.is_dir():
+                continue
+            info = parse_pack_folder_name(entry.name)
+            if info is None:
+                continue
+            path = entry.path
+            seen.add(path)
+            mtime = _folder_mtime(path)
+            if known.get(path) == mtime:
+                counts['unchanged'] += 1
+                continue
+            try:
+                stats = pack_statistics(path)
+            except (OSError, ValueError, EOFError) as e:
+                counts['errors'] += 1
+                if verbose: print(f"Aviso: não foi possível indexar '{entry.name}': {e}")
+                continue
+            files = os.listdir(path)
+            row = {
+                'path': path, 'folder': entry.name, **info, 'bars': stats['bars'],
+                'scale_guess': pack_scale(path, stats['tonal_pitches'], info['key']),
+                'has_pdf': any(f.endswith('.pdf') for f in files),
+                'has_cover': any(f.startswith('cover_art') for f in files),
+                'mtime': mtime,
+                'fingerprint': stats['fingerprint'].tobytes(),
+                **{column: stats[column] for column in _STAT_COLUMNS},
+            }
+            columns = list(row)
+            self._db.execute(
+                f"INSERT OR REPLACE INTO packs ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                [row[c] for c in columns]
+            )
+            counts['updated' if path in known_paths else 'added'] += 1
+
+        removed = [path for path in known_paths if path.startswith(root + os.sep) and path not in seen]
+        self._db.executemany("DELETE FROM packs WHERE path = ?", [(path,) for path in removed])
+        counts['removed'] = len(removed)
+        self._db.commit()
+        if verbose:
+            print(f"Biblioteca atualizada em {time.perf_counter() - started:.2f}s: {counts}")
+        return counts
+
+    def search(self, order_by: str = 'created', descending: bool = True, limit: int | None = None, **filters) -> list[dict]:
+        """
+        Consulta a biblioteca. Cada filtro é uma coluna: um valor exato (style='funk') ou um intervalo
+        (bpm=(100, 115), bass_density=(10, None)), com extremos inclusivos e None para aberto.
+        """
+        clauses, values = [], []
+        for column, value in filters.items():
+            if column not in SEARCHABLE_COLUMNS:
+                raise ValueError(f"Coluna de busca desconhecida: '{column}'.")
+            if isinstance(value, (tuple, list)):
+                low, high = value
+                if low is not None:
+                    clauses.append(f"{column} >= ?"); values.append(low)
+                if high is not None:
+                    clauses.append(f"{column} <= ?"); values.append(high)
+            else:
+                clauses.append(f"{column} = ?"); values.append(value)
+        if order_by not in SEARCHABLE_COLUMNS:
+            raise ValueError(f"Coluna de ordenação desconhecida: '{order_by}'.")
+        sql = "SELECT * FROM packs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'}"
+        if limit:
+            sql += " LIMIT ?"; values.append(limit)
+        return [dict(row) for row in self._db.execute(sql, values)]
+
+    def duplicate_index(self, threshold: float = loop_fingerprint.DEFAULT_THRESHOLD, **filters) -> loop_fingerprint.DuplicateIndex:
+        """
+        Monta um índice LSH com as impressões digitais dos packs da biblioteca (opcionalmente filtrados como em search),
+        rotulados pelo nome da pasta. Pode ser passado a run_batch_generation(reject_duplicates=...).
+        """
+        index = loop_fingerprint.DuplicateIndex(threshold)
+        shape = (len(loop_fingerprint.FINGERPRINT_TRACKS), loop_fingerprint.NUM_PERM)
+        for row in self.search(order_by='created', descending=False, **filters):
+            if row['fingerprint'] is not None:
+                index.add(row['folder'], np.frombuffer(row['fingerprint'], dtype=np.uint32).reshape(shape))
+        return index
+
+    def near_duplicates(self, threshold: float = loop_fingerprint.DEFAULT_THRESHOLD, **filters) -> list[tuple[str, str, float]]:
+        """Pares de pastas quase idênticas: (pasta_a, pasta_b, menor similaridade entre as trilhas)."""
+        return self.duplicate_index(threshold, **filters).duplicate_pairs()
+
+    def count(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM packs").fetchone()[0]
+
+    def close(self):
+        self._db.close()
+
+def _parse_range(text: str | None):
+    if not text:
+        return None
+    low, _, high = text.partition('-')
+    return (float(low) if low else None, float(high) if high else None) if _ else (float(low), float(low))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Índice SQLite das pastas de loop packs.")
+    parser.add_argument('--db', default="pack_library.sqlite3", help="arquivo do índice")
+    sub = parser.add_subparsers(dest='command', required=True)
+    scan_parser = sub.add_parser('scan', help="indexa pastas novas ou alteradas")
+    scan_parser.add_argument('root', nargs='?', default='.')
+    query_parser = sub.add_parser('query', help="consulta o índice")
+    query_parser.add_argument('--style')
+    query_parser.add_argument('--key', help="tonalidade, ex.: E, C#")
+    query_parser.add_argument('--scale', help="major ou minor (estimada a partir das notas)")
+    query_parser.add_argument('--bpm', help="intervalo, ex.: 100-115")
+    query_parser.add_argument('--bass-density', help="notas por compasso, ex.: 10- (mínimo)")
+    query_parser.add_argument('--busy-bass', action='store_true', help=f"baixo com pelo menos {BUSY_BASS_DENSITY:g} notas por compasso")
+    query_parser.add_argument('--syncopation', help="sincopa do baixo (0-1), ex.: 0.3-")
+    query_parser.add_argument('--limit', type=int, default=50)
+    duplicates_parser = sub.add_parser('duplicates', help="lista os pares de packs quase idênticos")
+    duplicates_parser.add_argument('--style')
+    duplicates_parser.add_argument('--threshold', type=float, default=loop_fingerprint.DEFAULT_THRESHOLD,
+                                   help="similaridade mínima (0-1) em todas as trilhas")
+    args = parser.parse_args(argv)
+
+    library = PackLibrary(args.db)
+    if args.command == 'scan':
+        library.scan(args.root)
+        return
+    if args.command == 'duplicates':
+        started = time.perf_counter()
+        pairs = library.near_duplicates(args.threshold, **({'style': args.style} if args.style else {}))
+        for folder_a, folder_b, score in pairs:
+            print(f"{score:.2f}  {folder_a}  {folder_b}")
+        print(f"{len(pairs)} par(es) quase idêntico(s) em {time.perf_counter() - started:.2f}s.")
+        return
+    filters = {}
+    if args.style: filters['style'] = args.style
+    if args.key: filters['key'] = args.key.upper()
+    if args.scale: filters['scale_guess'] = args.scale
+    if args.bpm: filters['bpm'] = _parse_range(args.bpm)
+    if args.bass_density: filters['bass_density'] = _parse_range(args.bass_density)
+    if args.busy_bass: filters['bass_density'] = (BUSY_BASS_DENSITY, None)
+    if args.syncopation: filters['bass_syncopation'] = _parse_range(args.syncopation)
+    started = time.perf_counter()
+    results = library.search(limit=args.limit, **filters)
+    elapsed = (time.perf_counter() - started) * 1000
+    for row in results:
+        print(f"{row['folder']}  {row['style']:<6} {row['key']:<2} {row['scale_guess'] or '?':<5} {row['bpm']:>3} BPM  "
+              f"{row['bars']:>3} comp.  baixo {row['bass_density']:.1f} notas/comp.")
+    print(f"{len(results)} resultado(s) em {elapsed:.1f} ms.")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
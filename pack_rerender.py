@@ -0,0 +1,214 @@
+import io
+import json
+import os
+import shutil
+import sys
+import time
+
+import mido
+
+import loop_generator
+import score_preview
+
+# --- RE-RENDERIZAÇÃO INCREMENTAL (BPM, TONALIDADE, TÍTULO) ---
+
+DRUM_CHANNEL = 9
+
+def load_pack_info(folder_path: str) -> tuple[dict | None, str | None]:
+    """Lê o pack_info.json de uma pasta de pack. Retorna (info, None) ou (None, erro)."""
+    path = os.path.join(folder_path, loop_generator.PACK_INFO_FILENAME)
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f), None
+    except FileNotFoundError:
+        return None, f"'{folder_path}' não tem {loop_generator.PACK_INFO_FILENAME} (packs anteriores à versão 1.2.0 precisam ser gerados de novo)."
+    except (OSError, json.JSONDecodeError) as e:
+        return None, f"Não foi possível ler '{path}': {e}"
+
+def key_offset(from_key: str, to_key: str) -> int:
+    """Menor intervalo, em semitons (-5 a +6), de from_key até to_key."""
+    semitones = (loop_generator.NOTES[to_key] - loop_generator.NOTES[from_key]) % 12
+    return semitones - 12 if semitones > 6 else semitones
+
+def _is_pitched_note(msg) -> bool:
+    """Notas transponíveis: a bateria (canal 10) e as pausas 'note_on note=1 velocity=0' ficam de fora."""
+    return (msg.type in ('note_on', 'note_off') and msg.channel != DRUM_CHANNEL
+            and not (msg.type == 'note_on' and msg.velocity == 0 and msg.note == 1))
+
+def transpose_track(track: mido.MidiTrack, semitones: int) -> mido.MidiTrack:
+    """Cópia da trilha com as notas transpostas em semitons."""
+    return mido.MidiTrack(msg.copy(note=msg.note + semitones) if semitones and _is_pitched_note(msg) else msg for msg in track)
+
+def _skip_varlen(data: bytes, i: int) -> tuple[int, int]:
+    """Lê um inteiro de tamanho variável do MIDI a partir de i; devolve (valor, posição seguinte)."""
+    value = 0
+    while True:
+        byte = data[i]
+        value = (value << 7) | (byte & 0x7F)
+        i += 1
+        if not byte & 0x80:
+            return value, i
+
+def transpose_midi_bytes(data: bytes, semitones: int) -> bytes:
+    """
+    Transpõe as notas de um MIDI direto nos bytes, sem decodificar as mensagens (muito mais rápido que
+    rewrite_midi quando o mesmo arquivo é transposto para várias tonalidades; veja pack_sweep).
+    Segue as mesmas regras de _is_pitched_note e entende running status, metas e sysex.
+    """
+    if not semitones:
+        return data
+    out = bytearray(data)
+    pos = 14 + int.from_bytes(out[4:8], 'big') - 6
+    while pos + 8 <= len(out):
+        end = pos + 8 + int.from_bytes(out[pos + 4:pos + 8], 'big')
+        i, status = pos + 8, None
+        while i < end:
+            _, i = _skip_varlen(out, i)
+            byte = out[i]
+            if byte == 0xFF:
+                length, i = _skip_varlen(out, i + 2)
+                i += length
+                status = None
+                continue
+            if byte in (0xF0, 0xF7):
+                length, i = _skip_varlen(out, i + 1)
+                i += length
+                status = None
+                continue
+            if byte & 0x80:
+                status = byte
+                i += 1
+            kind, channel = status & 0xF0, status & 0x0F
+            if kind in (0x80, 0x90) and channel != DRUM_CHANNEL and not (kind == 0x90 and out[i] == 1 and out[i + 1] == 0):
+                out[i] += semitones
+            i += 1 if kind in (0xC0, 0xD0) else 2
+        pos = end
+    return bytes(out)
+
+def rewrite_midi(data: bytes, bpm: int | None = None, semitones: int = 0) -> bytes:
+    """
+    Troca o andamento (metas set_tempo) e/ou transpõe as notas de um MIDI já gravado.
+    A bateria (canal 10) e as pausas 'note_on note=1 velocity=0' não são transpostas.
+    """
+    mid = mido.MidiFile(file=io.BytesIO(data))
+    for track in mid.tracks:
+        for i, msg in enumerate(track):
+            if bpm is not None and msg.type == 'set_tempo':
+                track[i] = msg.copy(tempo=mido.bpm2tempo(bpm))
+            elif semitones and _is_pitched_note(msg):
+                track[i] = msg.copy(note=msg.note + semitones)
+    return loop_generator.midi_file_to_bytes(mid)
+
+def _unique_folder(path: str) -> str:
+    candidate, n = path, 1
+    while os.path.exists(candidate):
+        candidate = f"{path}_{n}"
+        n += 1
+    return candidate
+
+def rerender_pack(folder_path: str, bpm: int | None = None, key: str | None = None, cover_title: str | None = None,
+                  output_folder: str | None = None, render_score: bool = False) -> tuple[str | None, str | None]:
+    """
+    Cria uma cópia do pack com outro BPM, tonalidade e/ou título, refazendo só o que muda:
+    - BPM: reescreve as metas set_tempo dos MIDIs e o subtítulo da capa;
+    - tonalidade: transpõe as notas dos MIDIs e a partitura ('\\transpose' sobre os trechos originais), que é
+      a única mudança que chama o LilyPond; um .musicxml, se houver, é refeito das notas em trocas de BPM ou tonalidade;
+    - título: redesenha o texto sobre o fundo da capa (em cache na memória; veja loop_generator.cover_background).
+    A partitura mantém o título anterior em trocas só de título/BPM, a menos que render_score=True.
+    Os demais arquivos são copiados. Retorna (pasta_nova, None) ou (None, erro).
+    """
+    info, error = load_pack_info(folder_path)
+    if error:
+        return None, error
+    style = info['style']
+    new_bpm = int(bpm) if bpm is not None else info['bpm']
+    new_key = key.upper() if key else info['key']
+    new_title = cover_title if cover_title is not None else info['cover_title']
+    if new_key not in loop_generator.NOTES:
+        return None, f"Tonalidade '{new_key}' inválida."
+    bpm_changed, key_changed = new_bpm != info['bpm'], new_key != info['key']
+    title_changed = new_title != info['cover_title']
+
+    print(f"--- Re-renderizando '{os.path.basename(os.path.normpath(folder_path))}' ---")
+    started = time.perf_counter()
+    outputs, removed = {}, set()
+
+    # MIDIs e partitura ficam sempre no mesmo deslocamento em relação a 'lilypond_key': transpor a partir de
+    # info['key'] acumularia a diferença entre key_offset(a, b) + key_offset(b, c) e key_offset(a, c) a cada troca
+    midi_transpose = info.get('midi_transpose', key_offset(info['lilypond_key'], info['key']))
+    new_transpose = key_offset(info['lilypond_key'], new_key) if key_changed else midi_transpose
+    if bpm_changed or key_changed:
+        semitones = new_transpose - midi_transpose
+        for filename in os.listdir(folder_path):
+            if filename.endswith('.mid'):
+                with open(os.path.join(folder_path, filename), "rb") as f:
+                    outputs[filename] = rewrite_midi(f.read(), new_bpm if bpm_changed else None, semitones)
+
+    score_filename = f"{style}_score"
+    has_lilypond = os.path.exists(os.path.join(folder_path, f"{score_filename}.ly"))
+    if os.path.exists(os.path.join(folder_path, f"{score_filename}.musicxml")) and (bpm_changed or key_changed or render_score):
+        # O MusicXML sai direto das notas em milissegundos: é refeito a partir do mix já transposto
+        import musicxml_export
+        full_mix = outputs.get(f"{style}_full_mix.mid")
+        if full_mix is None:
+            with open(os.path.join(folder_path, f"{style}_full_mix.mid"), "rb") as f: full_mix = f.read()
+        tracks = dict(zip(('bass', 'piano', 'drums'), mido.MidiFile(file=io.BytesIO(full_mix)).tracks))
+        outputs[f"{score_filename}.musicxml"] = musicxml_export.render_musicxml(
+            tracks, new_key, info['scale'], new_bpm, info['bars'], f"{new_title} - {new_key.capitalize()}")
+        if not has_lilypond:
+            info['score_title'] = new_title
+
+    if has_lilypond and (key_changed or render_score):
+        ly = info['lilypond']
+        score_title = f"{new_title} - {new_key.capitalize()}"
+        lilypond_content = loop_generator.build_lilypond_source(
+            ly['bass'], ly['drums'], ly['piano'], score_title,
+            transpose=new_transpose
+        )
+        outputs[f"{score_filename}.ly"] = lilypond_content.encode('utf-8')
+        pdf_bytes = loop_generator.render_pdf_bytes(lilypond_content, score_filename)
+        if pdf_bytes is not None:
+            outputs[f"{score_filename}.pdf"] = pdf_bytes
+        else:
+            # Sem LilyPond, o PDF antigo ficaria na tonalidade errada: vai só a prévia em SVG, com as notas novas
+            removed.add(f"{score_filename}.pdf")
+            full_mix = outputs.get(f"{style}_full_mix.mid")
+            if full_mix is None:
+                with open(os.path.join(folder_path, f"{style}_full_mix.mid"), "rb") as f: full_mix = f.read()
+            mid = mido.MidiFile(file=io.BytesIO(full_mix))
+            tracks = dict(zip(('bass', 'piano', 'drums'), mid.tracks))
+            outputs[f"{score_filename}_preview.svg"] = score_preview.render_score_svg(tracks, info['bars'], score_title).encode('utf-8')
+        info['score_title'] = new_title
+
+    if bpm_changed or key_changed or title_changed:
+        removed.update(f for f in os.listdir(folder_path) if f.startswith("cover_art"))
+        outputs.update(loop_generator.iter_cover_artifacts(style, new_key, new_bpm, new_title, seed=info['cover_seed'],
+                                                           cover_export=info['cover_export']))
+
+    info.update({'bpm': new_bpm, 'key': new_key, 'cover_title': new_title, 'midi_transpose': new_transpose})
+    outputs[loop_generator.PACK_INFO_FILENAME] = json.dumps(info, indent=2, ensure_ascii=False).encode('utf-8')
+
+    parent = os.path.dirname(os.path.normpath(folder_path))
+    output_folder = output_folder or _unique_folder(
+        os.path.join(parent, loop_generator.pack_folder_name(style, new_key, new_bpm))
+    )
+    os.makedirs(output_folder, exist_ok=True)
+    for filename in os.listdir(folder_path):
+        if filename not in outputs and filename not in removed:
+            shutil.copy2(os.path.join(folder_path, filename), os.path.join(output_folder, filename))
+    for filename, data in outputs.items():
+        with open(os.path.join(output_folder, filename), "wb") as f: f.write(data)
+    print(f"\nSucesso! Pack re-renderizado em {time.perf_counter() - started:.2f}s:\n  --> '{output_folder}'")
+    return output_folder, None
+
+if __name__ == "__main__":
+    # Uso: python pack_rerender.py <pasta_do_pack> [--bpm N] [--key E] [--title "Novo Título"]
+    if len(sys.argv) < 2:
+        print('Uso: python pack_rerender.py <pasta_do_pack> [--bpm N] [--key E] [--title "Novo Título"]')
+        sys.exit(1)
+    options = dict(zip(sys.argv[2::2], sys.argv[3::2]))
+    folder, error = rerender_pack(sys.argv[1], bpm=options.get('--bpm'), key=options.get('--key'),
+                                  cover_title=options.get('--title'))
+    if error:
+        print(f"Erro: {error}")
+        sys.exit(1)
@@ -0,0 +1,186 @@
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import time
+
+import mido
+
+import loop_generator
+import pack_archive
+import pack_rerender
+
+# --- VARREDURA DE PARÂMETROS (GRADE DE PACKS COM TRABALHO COMPARTILHADO) ---
+
+# Tonalidade em que cada esqueleto é composto; as outras são transposições para cima (0 a 11 semitons),
+# o mesmo registro que os geradores usam para cada tonalidade (NOTES vai de C a B na mesma oitava)
+REFERENCE_KEY = 'C'
+# Parâmetros que não mudam as notas: variantes que só diferem neles compartilham o mesmo esqueleto
+VARIANT_PARAMS = ('key', 'bpm', 'cover_title')
+# Posição dos 3 bytes do set_tempo nos MIDIs de build_midi_files: cabeçalho (14) + 'MTrk' e tamanho (8) + delta 0 + FF 51 03
+_TEMPO_EVENT = slice(22, 26)
+_TEMPO_BYTES = slice(26, 29)
+
+def expand_grid(grid: dict, **base) -> list[dict]:
+    """
+    Produto cartesiano da grade ({parâmetro: [valores]}) sobre os parâmetros fixos de base, na ordem
+    dos parâmetros de run_generation_process. Ex.: expand_grid({'style_to_generate': ['rock', 'funk'],
+    'key': list(NOTES), 'bpm': [90, 120]}, bars=8, scale='minor', ...) -> 48 jobs.
+    """
+    names = list(grid)
+    return [{**base, **dict(zip(names, values))} for values in itertools.product(*(grid[name] for name in names))]
+
+def _skeleton_key(job: dict) -> str:
+    return json.dumps({name: value for name, value in job.items() if name not in VARIANT_PARAMS}, sort_keys=True, default=str)
+
+def plan_sweep(jobs: list[dict]) -> list[dict]:
+    """
+    Agrupa os jobs por esqueleto (tudo menos tonalidade, BPM e título) e, dentro dele, por tonalidade.
+    Jobs sem seed recebem um seed por esqueleto, para que notas e fundo da capa possam ser reaproveitados.
+    Retorna [{'job': job_do_esqueleto, 'keys': {tonalidade: [(índice_do_job, job), ...]}}, ...].
+    """
+    skeletons = {}
+    for index, job in enumerate(jobs):
+        entry = skeletons.setdefault(_skeleton_key(job), {'job': job, 'keys': {}})
+        entry['keys'].setdefault(job['key'], []).append((index, job))
+    for entry in skeletons.values():
+        if entry['job'].get('seed') is None:
+            entry['job'] = {**entry['job'], 'seed': random.getrandbits(32)}
+    return list(skeletons.values())
+
+def key_semitones(from_key: str, to_key: str) -> int:
+    return (loop_generator.NOTES[to_key] - loop_generator.NOTES[from_key]) % 12
+
+def transpose_pack(pack: dict, key: str, transpose_tracks: bool = True) -> dict:
+    """
+    Variante do pack (composto em REFERENCE_KEY) em outra tonalidade, com '\\transpose' na partitura.
+    As trilhas mido só são transpostas com transpose_tracks (MusicXML e prévia SVG); os MIDIs gravados
+    são transpostos direto nos bytes (veja pack_rerender.transpose_midi_bytes).
+    """
+    semitones = key_semitones(pack['key'], key)
+    tracks = pack['tracks']
+    if transpose_tracks:
+        tracks = {name: pack_rerender.transpose_track(track, semitones) for name, track in tracks.items()}
+    return {**pack, 'key': key, 'tracks': tracks, 'lilypond_key': pack['key'], 'lilypond_transpose': semitones}
+
+def with_tempo(data: bytes, bpm: int) -> bytes:
+    """Troca o andamento de um MIDI de build_midi_files direto nos bytes (o set_tempo é sempre o primeiro evento)."""
+    if data[_TEMPO_EVENT] != b'\x00\xff\x51\x03':
+        return pack_rerender.rewrite_midi(data, bpm=bpm)
+    return data[:_TEMPO_BYTES.start] + mido.bpm2tempo(bpm).to_bytes(3, 'big') + data[_TEMPO_BYTES.stop:]
+
+def format_report(report: dict) -> str:
+    lines = [f"{report['variants']} packs em {report['elapsed']:.1f} s ({report['skeletons']} esqueletos)."]
+    for label, name in (("Composições", 'compositions'), ("Serializações MIDI", 'midi_serializations'),
+                        ("Partituras LilyPond", 'lilypond_scores'), ("Fundos de capa", 'cover_backgrounds')):
+        done, naive = report[name]
+        saved = naive - done
+        lines.append(f"  {label}: {done} de {naive} ({saved} a menos, {100 * saved / naive if naive else 0:.0f}%)")
+    return "\n".join(lines)
+
+def run_sweep(jobs: list[dict], output_root: str = ".", output_mode: str = 'folder', archive_path: str | None = None,
+              compression_level: int | None = None) -> tuple[list, dict]:
+    """
+    Gera uma grade de packs (veja expand_grid) reaproveitando o que as variantes têm em comum:
+    - as notas são compostas uma vez por esqueleto, em REFERENCE_KEY, e transpostas para cada tonalidade;
+    - os MIDIs são serializados uma vez por esqueleto, transpostos nos bytes para cada tonalidade e só o
+      andamento é trocado para cada BPM;
+    - a partitura LilyPond (que não depende do BPM) é renderizada uma vez por tonalidade e título;
+    - o fundo da capa é renderizado uma vez por esqueleto (estilo e seed) e só o texto muda por variante.
+    As variantes de uma tonalidade são transposições do esqueleto: com o mesmo seed, podem diferir do
+    pack que run_generation_process comporia direto nela (ex.: voicings escolhidos para o registro de C).
+    Retorna ([(pasta_ou_arquivo:pasta, erro), ...] na ordem dos jobs, relatório) — format_report(relatório) descreve a economia.
+    """
+    if output_mode != 'folder' and output_mode not in pack_archive.ARCHIVE_FORMATS:
+        return [(None, f"Modo de saída '{output_mode}' inválido.")] * len(jobs), {}
+    started = time.perf_counter()
+    timestamp = int(time.time())
+    plan = plan_sweep(jobs)
+    results = [None] * len(jobs)
+    counts = {'compositions': 0, 'midi_serializations': 0, 'lilypond_scores': 0}
+    cover_misses = loop_generator._cached_cover_background.cache_info().misses
+    lilypond_missing = shutil.which("lilypond") is None
+    archive = None
+    if output_mode != 'folder':
+        archive_path = archive_path or f"sweep_{timestamp}{pack_archive.ARCHIVE_FORMATS[output_mode]}"
+        archive, error = loop_generator.open_pack_archive(archive_path, output_mode, compression_level)
+        if error:
+            return [(None, error)] * len(jobs), {}
+    try:
+        for entry in plan:
+            skeleton = entry['job']
+            print(f"--- Compondo esqueleto {skeleton['style_to_generate']} (seed {skeleton['seed']}) para "
+                  f"{sum(len(v) for v in entry['keys'].values())} variantes ---")
+            pack, error = loop_generator.compose_pack(
+                skeleton['style_to_generate'], skeleton['bars'], REFERENCE_KEY, skeleton['scale'], skeleton['bpm'],
+                skeleton['progression_string'], seed=skeleton['seed'], groove=skeleton.get('groove'),
+                bass_mode=skeleton.get('bass_mode', 'style'), bass_model=skeleton.get('bass_model'),
+                drum_mode=skeleton.get('drum_mode', 'style'))
+            counts['compositions'] += 1
+            if error:
+                for variants in entry['keys'].values():
+                    for index, _ in variants:
+                        results[index] = (None, error)
+                continue
+            reference_midi = loop_generator.build_midi_files(pack['style'], pack['tracks'], pack['bpm'])
+            counts['midi_serializations'] += 1
+            for key, variants in entry['keys'].items():
+                # As trilhas transpostas só são usadas pelo MusicXML e pela prévia SVG (quando não há LilyPond)
+                needs_tracks = lilypond_missing or any(job.get('score_format', 'pdf') != 'pdf' for _, job in variants)
+                keyed = transpose_pack(pack, key, transpose_tracks=needs_tracks)
+                semitones = keyed['lilypond_transpose']
+                midi_files = {name: pack_rerender.transpose_midi_bytes(data, semitones) for name, data in reference_midi.items()}
+                lilypond_artifacts = {}
+                for index, job in variants:
+                    variant = {**keyed, 'bpm': job['bpm']}
+                    score_format = job.get('score_format', 'pdf')
+                    lilypond = None
+                    if score_format in ('pdf', 'both'):
+                        # A partitura só depende da tonalidade e do título
+                        title = job['cover_title']
+                        if title not in lilypond_artifacts:
+                            lilypond_artifacts[title] = list(loop_generator.iter_lilypond_artifacts(
+                                variant, f"{title} - {key.capitalize()}", f"{variant['style']}_score"))
+                            counts['lilypond_scores'] += 1
+                        lilypond = lilypond_artifacts[title]
+                    # Mesmo layout de um pack gerado direto, montado a partir das partes compartilhadas
+                    artifacts = loop_generator.iter_pack_artifacts(
+                        variant, job['cover_title'], skeleton['seed'], job.get('cover_export'), score_format,
+                        midi_files={name: with_tempo(data, job['bpm']) for name, data in midi_files.items()},
+                        lilypond_artifacts=lilypond)
+                    folder_name = f"{loop_generator.pack_folder_name(variant['style'], key, job['bpm'], timestamp)}_{index}"
+                    if archive is not None:
+                        archive.add_pack(folder_name, artifacts)
+                        results[index] = (f"{archive_path}:{folder_name}", None)
+                    else:
+                        folder_path = os.path.join(output_root, folder_name)
+                        os.makedirs(folder_path, exist_ok=True)
+                        for filename, data in artifacts:
+                            with open(os.path.join(folder_path, filename), "wb") as f: f.write(data)
+                        results[index] = (folder_path, None)
+    finally:
+        if archive is not None:
+            archive.close()
+
+    naive_scores = sum(1 for job in jobs if job.get('score_format', 'pdf') in ('pdf', 'both'))
+    report = {
+        'variants': len(jobs), 'skeletons': len(plan), 'elapsed': time.perf_counter() - started,
+        'compositions': (counts['compositions'], len(jobs)),
+        'midi_serializations': (counts['midi_serializations'], len(jobs)),
+        'lilypond_scores': (counts['lilypond_scores'], naive_scores),
+        'cover_backgrounds': (loop_generator._cached_cover_background.cache_info().misses - cover_misses, len(jobs)),
+    }
+    print(f"\nVarredura concluída. {format_report(report)}")
+    return results, report
+
+if __name__ == "__main__":
+    # Uso: python pack_sweep.py <pasta_de_saída> [estilos separados por vírgula] [BPMs separados por vírgula]
+    output = sys.argv[1] if len(sys.argv) > 1 else "sweep"
+    styles = sys.argv[2].split(',') if len(sys.argv) > 2 else ['rock', 'funk', 'jazz', 'blues', 'reggae']
+    bpms = [int(bpm) for bpm in sys.argv[3].split(',')] if len(sys.argv) > 3 else [90, 120]
+    os.makedirs(output, exist_ok=True)
+    jobs = expand_grid({'style_to_generate': styles, 'key': list(loop_generator.NOTES), 'bpm': bpms},
+                       bars=8, scale='minor', progression_string='1-minor,4-minor,5-minor,1-minor', cover_title="Sweep")
+    run_sweep(jobs, output)
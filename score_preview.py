@@ -0,0 +1,122 @@
+import json
+import os
+import sys
+import time
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from loop_generator import DRUM_MAP, LILYPOND_NOTE_NAMES, PACK_INFO_FILENAME, TICKS_PER_BEAT
+import note_events
+
+# --- PRÉVIA DE PARTITURA EM SVG (PIANO-ROLL, SEM LILYPOND) ---
+
+STEP_TICKS = TICKS_PER_BEAT // 4
+STEP_WIDTH = 10
+SEMITONE_HEIGHT = 4
+DRUM_ROW_HEIGHT = 10
+LANE_GAP = 18
+LEFT_MARGIN = 64
+TOP_MARGIN = 34
+LANE_COLORS = {'piano': '#4a90d9', 'bass': '#d9534f', 'drums': '#3fa34d'}
+LANE_LABELS = {'piano': 'Piano', 'bass': 'Bass', 'drums': 'Drums'}
+DRUM_NAMES = {note: name for name, note in DRUM_MAP.items()}
+# Ordem de cima para baixo na pauta de bateria: pratos em cima, bumbo embaixo
+DRUM_ROWS = [DRUM_MAP[name] for name in ('crash', 'ride', 'open_hat', 'closed_hat', 'snare', 'kick')]
+
+def _pitch_label(note: int) -> str:
+    return f"{LILYPOND_NOTE_NAMES[note % 12].replace('is', '#').upper()}{note // 12 - 1}"
+
+def _rects(events: np.ndarray, x0: float, rows: np.ndarray, row_height: float, max_ticks: int, color: str) -> list[str]:
+    """Um <rect> por nota; a opacidade acompanha a dinâmica. Coordenadas calculadas em lote com NumPy."""
+    visible = events['start'] < max_ticks
+    events, rows = events[visible], rows[visible]
+    xs = x0 + events['start'] / STEP_TICKS * STEP_WIDTH
+    widths = np.maximum((np.minimum(events['end'], max_ticks) - events['start']) / STEP_TICKS * STEP_WIDTH - 1, 2)
+    opacity = 0.35 + 0.65 * events['velocity'] / 127
+    return [
+        f'<rect x="{x:.1f}" y="{y:.1f}" width="{w:.1f}" height="{row_height - 1:.1f}" rx="1.5" fill="{color}" fill-opacity="{o:.2f}"/>'
+        for x, y, w, o in zip(xs.tolist(), rows.tolist(), widths.tolist(), opacity.tolist())
+    ]
+
+def _grid(x0: float, y0: float, height: float, bars: int) -> list[str]:
+    lines = []
+    for beat in range(bars * 4 + 1):
+        x = x0 + beat * 4 * STEP_WIDTH
+        stroke, width = ('#555', 1.2) if beat % 4 == 0 else ('#ccc', 0.6)
+        lines.append(f'<line x1="{x}" y1="{y0}" x2="{x}" y2="{y0 + height}" stroke="{stroke}" stroke-width="{width}"/>')
+    return lines
+
+def events_score_svg(events: dict, bars: int, title: str = "") -> str:
+    """
+    Desenha piano, baixo e bateria como um piano-roll em SVG, a partir dos arrays de notas (NOTE_EVENT_DTYPE).
+    Cada pauta tem a extensão das suas notas; a bateria usa uma linha por peça. Notas além de `bars` são cortadas.
+    """
+    max_ticks = bars * 4 * TICKS_PER_BEAT
+    grid_width = bars * 16 * STEP_WIDTH
+    x0 = LEFT_MARGIN
+    y = TOP_MARGIN
+    body = []
+    for name in ('piano', 'bass', 'drums'):
+        lane = events.get(name, np.zeros(0, dtype=note_events.NOTE_EVENT_DTYPE))
+        color = LANE_COLORS[name]
+        if name == 'drums':
+            present = [note for note in DRUM_ROWS if np.any(lane['note'] == note)] or DRUM_ROWS[-1:]
+            row_of = {note: i for i, note in enumerate(present)}
+            lane = lane[np.isin(lane['note'], present)]
+            height = len(present) * DRUM_ROW_HEIGHT
+            rows = y + np.array([row_of[int(n)] for n in lane['note']], dtype=np.float64) * DRUM_ROW_HEIGHT
+            labels = [(y + i * DRUM_ROW_HEIGHT + DRUM_ROW_HEIGHT - 2, DRUM_NAMES[note].replace('_', ' ')) for i, note in enumerate(present)]
+            row_height = DRUM_ROW_HEIGHT
+        else:
+            low, high = (int(lane['note'].min()), int(lane['note'].max())) if len(lane) else (60, 60)
+            low, high = low - 1, high + 1
+            height = (high - low + 1) * SEMITONE_HEIGHT
+            rows = y + (high - lane['note'].astype(np.float64)) * SEMITONE_HEIGHT
+            labels = [(y + (high - n) * SEMITONE_HEIGHT + SEMITONE_HEIGHT, _pitch_label(n)) for n in range(low, high + 1) if n % 12 == 0]
+            row_height = SEMITONE_HEIGHT
+
+        body.append(f'<rect x="{x0}" y="{y}" width="{grid_width}" height="{height}" fill="#fafafa" stroke="#999"/>')
+        body.extend(_grid(x0, y, height, bars))
+        body.append(f'<text x="4" y="{y - 4}" font-size="11" font-weight="bold" fill="{color}">{LANE_LABELS[name]}</text>')
+        body.extend(f'<text x="{x0 - 4}" y="{ly:.1f}" font-size="8" text-anchor="end" fill="#666">{escape(text)}</text>' for ly, text in labels)
+        body.extend(_rects(lane, x0, rows, row_height, max_ticks, color))
+        y += height + LANE_GAP
+
+    for bar in range(bars):
+        body.append(f'<text x="{x0 + bar * 16 * STEP_WIDTH + 2}" y="{TOP_MARGIN - 4}" font-size="8" fill="#888">{bar + 1}</text>')
+    width, height = x0 + grid_width + 10, y
+    header = (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}" '
+              f'font-family="sans-serif">')
+    title_text = f'<text x="{width / 2}" y="14" font-size="13" text-anchor="middle" fill="#222">{escape(title)}</text>' if title else ""
+    return "\n".join([header, f'<rect width="{width}" height="{height}" fill="white"/>', title_text, *body, '</svg>'])
+
+def render_score_svg(tracks: dict, bars: int, title: str = "") -> str:
+    """Igual a events_score_svg, a partir das trilhas mido de um pack ({'bass', 'drums', 'piano'})."""
+    return events_score_svg({name: note_events.track_to_events(track) for name, track in tracks.items()}, bars, title)
+
+def folder_score_svg(folder_path: str) -> str:
+    """SVG de uma pasta de pack existente (compassos e título vêm do pack_info.json, quando houver)."""
+    tracks, _ = note_events.load_pack_tracks(folder_path)
+    events = {name: note_events.track_to_events(track) for name, track in tracks.items()}
+    title, bars = "", None
+    info_path = os.path.join(folder_path, PACK_INFO_FILENAME)
+    if os.path.exists(info_path):
+        with open(info_path, encoding='utf-8') as f:
+            info = json.load(f)
+        title, bars = f"{info['score_title']} - {info['key'].capitalize()}", info['bars']
+    if bars is None:
+        last_start = max((int(e['start'].max()) for e in (events.get('bass'), events.get('drums')) if e is not None and len(e)), default=0)
+        bars = last_start // (4 * TICKS_PER_BEAT) + 1
+    return events_score_svg(events, bars, title)
+
+if __name__ == "__main__":
+    # Uso: python score_preview.py <pasta_do_pack> [saida.svg]
+    if len(sys.argv) < 2:
+        print("Uso: python score_preview.py <pasta_do_pack> [saida.svg]")
+        sys.exit(1)
+    output = sys.argv[2] if len(sys.argv) > 2 else os.path.join(sys.argv[1], "score_preview.svg")
+    started = time.perf_counter()
+    svg = folder_score_svg(sys.argv[1])
+    with open(output, "w", encoding='utf-8') as f: f.write(svg)
+    print(f"Prévia da partitura salva em '{output}' ({(time.perf_counter() - started) * 1000:.1f} ms).")
@@ -0,0 +1,207 @@
+import sys
+import time
+
+import numpy as np
+
+import groove as groove_engine
+import loop_generator
+from loop_generator import TICKS_PER_BEAT, DRUM_MAP, DRUM_MIDI_PATTERNS
+import note_events
+
+# --- MOTOR DE VARIAÇÕES (SORTEIOS VETORIZADOS) ---
+
+BAR_TICKS = TICKS_PER_BEAT * 4
+S16 = TICKS_PER_BEAT // 4
+BLUES_DEGREES = [0, 0, 0, 0, 3, 3, 0, 0, 4, 3, 0, 4]
+
+def _bar_roots(style: str, key: str, scale: str, bars: int, progression: list, octave: int) -> np.ndarray:
+    if style == 'blues':
+        notes = loop_generator.get_scale_notes(key, 'major', octave=octave)
+        return np.array([notes[BLUES_DEGREES[i % 12]] for i in range(bars)])
+    scale_notes = loop_generator.get_scale_notes(key, scale, octave=octave)
+    return np.array([scale_notes[degree - 1] for degree, _ in progression[:bars]])
+
+def _funk_bass(rng, k, key, scale, bars, progression):
+    """Mesma distribuição de generate_funk_bassline: colcheia na tônica e 14 semicolcheias sorteadas."""
+    scale_notes = np.array(loop_generator.get_scale_notes(key, scale, octave=2))
+    roots = _bar_roots('funk', key, scale, bars, progression, octave=2)[np.newaxis, :, np.newaxis]
+    shape = (k, bars, 14)
+    play = rng.random(shape) < 0.7
+    u = rng.random(shape)
+    other = scale_notes[rng.integers(0, len(scale_notes), shape)]
+    notes = np.where(u < 0.5, roots, np.where(u < 0.75, roots + 7, other))
+    velocities = rng.integers(85, 106, shape)
+
+    steps = np.arange(2, 16)
+    starts = np.broadcast_to(np.arange(bars)[:, np.newaxis] * BAR_TICKS + steps * S16, shape)
+    # A colcheia inicial é fixa: entra como o passo 0, sempre ativo
+    head = (np.ones((k, bars, 1), bool), np.broadcast_to(roots, (k, bars, 1)),
+            np.full((k, bars, 1), 100), np.broadcast_to(np.arange(bars)[:, np.newaxis] * BAR_TICKS, (k, bars, 1)),
+            np.full((k, bars, 1), S16 * 2))
+    body = (play, notes, velocities, starts, np.full(shape, S16))
+    return tuple(np.concatenate([h, b], axis=2) for h, b in zip(head, body))
+
+def _rock_bass(rng, k, key, scale, bars, progression):
+    """Mesma distribuição de generate_rock_bassline: 8 colcheias, tônica nos tempos 1 e 3."""
+    roots = _bar_roots('rock', key, scale, bars, progression, octave=1)[np.newaxis, :, np.newaxis]
+    shape = (k, bars, 8)
+    keep_root = (rng.random(shape) < 0.8) | (np.arange(8) % 4 == 0)
+    alternative = np.where(rng.integers(0, 2, shape) == 0, roots + 12, roots + 7)
+    notes = np.where(keep_root, roots, alternative)
+    velocities = rng.integers(100, 116, shape)
+    starts = np.broadcast_to(np.arange(bars)[:, np.newaxis] * BAR_TICKS + np.arange(8) * (TICKS_PER_BEAT // 2), shape)
+    return np.ones(shape, bool), notes, velocities, starts, np.full(shape, TICKS_PER_BEAT // 2)
+
+def _jazz_bass(rng, k, key, scale, bars, progression):
+    """Mesma distribuição de generate_jazz_walking_bassline: tônica, duas notas da escala e aproximação cromática."""
+    scale_notes = loop_generator.get_scale_notes(key, scale, octave=2)
+    full_scale = np.array(scale_notes + [n + 12 for n in scale_notes])
+    roots = _bar_roots('jazz', key, scale, bars, progression, octave=2)
+    next_roots = np.roll(roots, -1)
+    shape = (k, bars, 4)
+    notes = np.empty(shape, dtype=np.int64)
+    notes[:, :, 0] = roots
+    notes[:, :, 1:3] = full_scale[rng.integers(0, len(full_scale), (k, bars, 2))]
+    notes[:, :, 3] = next_roots + rng.choice([-1, 1], (k, bars))
+    velocities = rng.integers(80, 96, shape)
+    starts = np.broadcast_to(np.arange(bars)[:, np.newaxis] * BAR_TICKS + np.arange(4) * TICKS_PER_BEAT, shape)
+    return np.ones(shape, bool), notes, velocities, starts, np.full(shape, TICKS_PER_BEAT)
+
+def _blues_bass(rng, k, key, scale, bars, progression):
+    """Mesma distribuição de generate_blues_bassline: um dos dois padrões de walking por compasso."""
+    roots = _bar_roots('blues', key, scale, bars, progression, octave=2)[np.newaxis, :, np.newaxis]
+    patterns = np.array([[0, 7, 9, 7], [0, 7, 12, 7]])
+    shape = (k, bars, 4)
+    notes = roots + patterns[(rng.random((k, bars)) <= 0.5).astype(int)]
+    velocities = rng.integers(90, 101, shape)
+    starts = np.broadcast_to(np.arange(bars)[:, np.newaxis] * BAR_TICKS + np.arange(4) * TICKS_PER_BEAT, shape)
+    return np.ones(shape, bool), notes, velocities, starts, np.full(shape, TICKS_PER_BEAT)
+
+def _reggae_bass(rng, k, key, scale, bars, progression):
+    """Mesma distribuição de generate_reggae_bassline: um dos dois padrões one-drop por compasso."""
+    roots = _bar_roots('reggae', key, scale, bars, progression, octave=2)
+    thirds = roots + np.array([4 if chord_type == 'major' else 3 for _, chord_type in progression[:bars]])
+    shape = (k, bars, 4)
+    choice = rng.integers(0, 2, (k, bars))[:, :, np.newaxis]
+    beat = np.arange(4)
+    # Padrão 0: pausa de mínima, tônica, quinta. Padrão 1: pausa, tônica, terça, quinta.
+    active = np.where(choice == 0, beat >= 2, beat >= 1)
+    by_beat = np.stack([roots, roots, thirds, roots + 7], axis=-1)[np.newaxis]
+    notes = np.where((choice == 0) & (beat == 2), roots[np.newaxis, :, np.newaxis], by_beat)
+    starts = np.broadcast_to(np.arange(bars)[:, np.newaxis] * BAR_TICKS + beat * TICKS_PER_BEAT, shape)
+    return active, np.broadcast_to(notes, shape), np.full(shape, 90), starts, np.full(shape, TICKS_PER_BEAT)
+
+BASS_SAMPLERS = {'funk': _funk_bass, 'rock': _rock_bass, 'jazz': _jazz_bass, 'blues': _blues_bass, 'reggae': _reggae_bass}
+
+def _split_variations(k, active, notes, velocities, starts, durations, channel=0) -> list[np.ndarray]:
+    """Converte os arrays (K, compassos, passos) em K arrays de note_events (ordem de compasso/passo = ordem no tempo)."""
+    active = np.broadcast_to(active, notes.shape)
+    flat = np.zeros(int(active.sum()), dtype=note_events.NOTE_EVENT_DTYPE)
+    starts = np.broadcast_to(starts, notes.shape)[active]
+    flat['start'] = starts
+    flat['end'] = starts + np.broadcast_to(durations, notes.shape)[active]
+    flat['note'] = notes[active]
+    flat['velocity'] = np.broadcast_to(velocities, notes.shape)[active]
+    flat['channel'] = channel
+    counts = active.reshape(k, -1).sum(axis=1)
+    return np.split(flat, np.cumsum(counts)[:-1])
+
+def _drum_variations(rng, k, style, bars) -> list[np.ndarray]:
+    """Mesmas posições de generate_drum_track; só as dinâmicas (caixa 90-110, demais 100-120) variam."""
+    rows = []
+    for instrument, active_16ths in DRUM_MIDI_PATTERNS[style].items():
+        for step in np.flatnonzero(active_16ths):
+            rows.append((step * S16, DRUM_MAP[instrument], instrument == 'snare'))
+    steps, drum_notes, is_snare = (np.array(col) for col in zip(*rows))
+    starts = (np.arange(bars)[:, np.newaxis] * BAR_TICKS + steps).ravel()
+    order = np.argsort(starts, kind='stable')
+    base = np.zeros(len(starts), dtype=note_events.NOTE_EVENT_DTYPE)
+    base['start'] = starts[order]
+    base['end'] = base['start'] + S16 - 1
+    base['note'] = np.tile(drum_notes, bars)[order]
+    base['channel'] = 9
+    snare = np.tile(is_snare, bars)[order]
+    low = np.where(snare, 90, 100)
+    velocities = rng.integers(low, low + 21, (k, len(base)))
+    variations = np.repeat(base[np.newaxis], k, axis=0)
+    variations['velocity'] = velocities
+    return list(variations)
+
+def generate_variations(style: str, key: str, scale: str, bars: int, progression_string: str, k: int,
+                        seed: int | np.random.SeedSequence | None = None, groove=None):
+    """
+    Gera K variações do mesmo esqueleto harmônico em uma só chamada. Todos os sorteios (pausas,
+    escolha tônica/quinta/outra, notas e dinâmicas) são feitos de uma vez por um numpy.random.Generator.
+    O piano é determinístico e é gerado uma vez e compartilhado (sem groove; com groove, cada variação
+    recebe a sua humanização, veja groove.py).
+    Retorna (lista de {'bass', 'drums', 'piano'} -> note_events, None) ou (None, mensagem_de_erro).
+    """
+    progression = []
+    if style != 'blues':
+        progression, error = loop_generator.parse_progression_string(progression_string)
+        if error:
+            return None, error
+    progression = loop_generator.expand_progression(progression, bars)
+    rng = np.random.default_rng(seed)
+
+    bass = _split_variations(k, *BASS_SAMPLERS[style](rng, k, key, scale, bars, progression))
+    drums = _drum_variations(rng, k, style, bars)
+    if style == 'blues':
+        piano_track = loop_generator.PIANO_MIDI_GENERATORS['blues'](key, bars)
+    else:
+        piano_track = loop_generator.PIANO_MIDI_GENERATORS[style](key, scale, bars, progression)
+    piano = note_events.track_to_events(piano_track)
+    variations = [{'bass': bass[i], 'drums': drums[i], 'piano': piano} for i in range(k)]
+    if groove:
+        template, error = groove_engine.resolve_groove(style, groove)
+        if error:
+            return None, error
+        variations = [groove_engine.groove_events(variation, template, seed=rng) for variation in variations]
+    return variations, None
+
+def variation_tracks(variation: dict) -> dict:
+    """Converte uma variação em trilhas mido (para build_midi_files, prévia de áudio etc.)."""
+    tracks = {name: note_events.events_to_track(events) for name, events in variation.items()}
+    tracks['drums'].insert(0, loop_generator.mido.Message('program_change', channel=9, program=0, time=0))
+    return tracks
+
+def benchmark(style: str = 'funk', bars: int = 16, k: int = 200, progression_string: str = '1-minor, 4-minor, 5-dominant7, 1-minor',
+              key: str = 'E', scale: str = 'minor') -> dict:
+    """Compara notas/segundo (baixo + bateria) entre os geradores atuais, um loop por vez, e o motor vetorizado."""
+    progression = []
+    if style != 'blues':
+        progression, _ = loop_generator.parse_progression_string(progression_string)
+    progression = loop_generator.expand_progression(progression, bars)
+
+    start = time.perf_counter()
+    loop_notes = 0
+    for _ in range(k):
+        if style == 'blues':
+            bass = loop_generator.BASS_MIDI_GENERATORS['blues'](key, bars)
+        else:
+            bass = loop_generator.BASS_MIDI_GENERATORS[style](key, scale, bars, progression)
+        drums = loop_generator.DRUM_MIDI_GENERATORS[style](bars)
+        loop_notes += sum(1 for track in (bass, drums) for msg in track if msg.type == 'note_on' and msg.velocity > 0)
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    variations, _ = generate_variations(style, key, scale, bars, progression_string, k, seed=0)
+    engine_seconds = time.perf_counter() - start
+    engine_notes = sum(len(v['bass']) + len(v['drums']) for v in variations)
+
+    return {
+        'loops_notes_per_second': loop_notes / loop_seconds,
+        'engine_notes_per_second': engine_notes / engine_seconds,
+        'speedup': (engine_notes / engine_seconds) / (loop_notes / loop_seconds),
+    }
+
+if __name__ == "__main__":
+    # Uso: python variation_engine.py [estilo] [compassos] [variações]
+    style = sys.argv[1] if len(sys.argv) > 1 else 'funk'
+    bars = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    k = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    progressions = {'rock': '1-minor, 6-major, 7-major, 5-major', 'funk': '1-minor, 4-minor, 5-dominant7, 1-minor',
+                    'jazz': '2-minor7, 5-dominant7, 1-major7, 1-major7', 'blues': '', 'reggae': '1-minor, 1-minor, 4-minor, 4-minor'}
+    result = benchmark(style, bars, k, progressions[style])
+    print(f"{style}: laços atuais {result['loops_notes_per_second']:,.0f} notas/s | "
+          f"motor vetorizado {result['engine_notes_per_second']:,.0f} notas/s | {result['speedup']:.1f}x")
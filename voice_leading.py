@@ -0,0 +1,136 @@
+import sys
+import time
+from functools import lru_cache
+
+import numpy as np
+
+import loop_generator
+
+# --- CONDUÇÃO DE VOZES (PROGRAMAÇÃO DINÂMICA SOBRE VOICINGS) ---
+
+# Região do piano onde os voicings podem ficar (E3 a G5) e o centro preferido
+VOICING_LOW = 52
+VOICING_HIGH = 79
+VOICING_CENTER = 64
+# Pesos do custo: afastamento do centro, extensões (9ª/13ª) e salto da voz mais aguda, por semitom
+REGISTER_WEIGHT = 0.15
+EXTENSION_PENALTY = 1.0
+TOP_VOICE_WEIGHT = 0.5
+# Acordes de sétima: variações com extensões (intervalo substituído -> intervalo novo, a partir da fundamental)
+EXTENSIONS = {
+    'dominant7': [(0, 14), (7, 21)],   # 9ª no lugar da fundamental (sem fundamental; o baixo já toca), 13ª no lugar da 5ª
+    'minor7': [(0, 14)],
+    'major7': [(0, 14)],
+}
+
+def _close_positions(pitch_classes: tuple[int, ...]) -> list[tuple[int, ...]]:
+    """Todas as inversões em posição fechada, em todas as oitavas que cabem na região."""
+    voicings = []
+    n = len(pitch_classes)
+    for inversion in range(n):
+        rotated = pitch_classes[inversion:] + pitch_classes[:inversion]
+        chord = [rotated[0]]
+        for pc in rotated[1:]:
+            chord.append(chord[-1] + (pc - chord[-1]) % 12)
+        for octave in range(VOICING_LOW // 12, VOICING_HIGH // 12 + 1):
+            notes = tuple(note + 12 * octave for note in chord)
+            if notes[0] >= VOICING_LOW and notes[-1] <= VOICING_HIGH:
+                voicings.append(notes)
+    return voicings
+
+@lru_cache(maxsize=None)
+def candidate_voicings(root: int, chord_type: str, extensions: bool = True) -> tuple[tuple[int, ...], ...]:
+    """
+    Voicings possíveis de um acorde dentro da região: inversões em posição fechada, drop-2 dos acordes de
+    quatro notas e, com extensions, as variações com 9ª/13ª de EXTENSIONS. Cada voicing é uma tupla
+    ordenada de notas MIDI; o custo estático (registro e extensões) é calculado em voicing_cost.
+    """
+    intervals = [note - root for note in loop_generator.get_chord_notes(root, chord_type)]
+    interval_sets = [(tuple(intervals), False)]
+    if extensions:
+        for replaced, added in EXTENSIONS.get(chord_type, []):
+            interval_sets.append((tuple(added if i == replaced else i for i in intervals), True))
+    result = set()
+    for interval_set, _ in interval_sets:
+        pitch_classes = tuple(sorted({(root + i) % 12 for i in interval_set}))
+        for close in _close_positions(pitch_classes):
+            result.add(close)
+            if len(close) == 4:
+                # Drop-2: a segunda voz de cima desce uma oitava
+                drop2 = tuple(sorted(close[:2] + (close[2] - 12,) + close[3:]))
+                if drop2[0] >= VOICING_LOW:
+                    result.add(drop2)
+    return tuple(sorted(result))
+
+@lru_cache(maxsize=None)
+def voicing_cost(voicing: tuple[int, ...], root: int, chord_type: str) -> float:
+    """Custo estático: distância do centro da região e penalidade para voicings com extensões."""
+    chord_classes = {note % 12 for note in loop_generator.get_chord_notes(root, chord_type)}
+    extended = any(note % 12 not in chord_classes for note in voicing)
+    return REGISTER_WEIGHT * abs(sum(voicing) / len(voicing) - VOICING_CENTER) + (EXTENSION_PENALTY if extended else 0.0)
+
+@lru_cache(maxsize=None)
+def transition_cost(a: tuple[int, ...], b: tuple[int, ...]) -> float:
+    """
+    Movimento total das vozes entre dois voicings (em semitons). Com o mesmo número de notas, as vozes
+    são pareadas em ordem (a mais grave com a mais grave...); com tamanhos diferentes, cada nota vai até a
+    mais próxima do outro acorde. O salto da voz mais aguda (a melodia que se ouve) pesa um pouco mais.
+    """
+    if len(a) == len(b):
+        movement = sum(abs(x - y) for x, y in zip(a, b))
+    else:
+        movement = (sum(min(abs(x - y) for y in b) for x in a) + sum(min(abs(x - y) for x in a) for y in b)) / 2
+    return movement + TOP_VOICE_WEIGHT * abs(a[-1] - b[-1])
+
+def voice_progression(chords: list[tuple[int, str]], extensions: bool = True) -> list[list[int]]:
+    """
+    Escolhe um voicing para cada acorde [(fundamental_midi, tipo), ...] minimizando o custo total
+    (movimento das vozes + registro + extensões) ao longo de toda a progressão.
+
+    Programação dinâmica (Viterbi): para cada acorde, o melhor custo acumulado de cada candidato vem do
+    melhor candidato do acorde anterior. Com C candidatos por acorde, o custo é O(n * C²), linear no número
+    de acordes; os custos de transição ficam em cache, e progressões que se repetem quase não recalculam nada.
+    """
+    if not chords:
+        return []
+    candidates = [candidate_voicings(root, chord_type, extensions) for root, chord_type in chords]
+    static = [np.array([voicing_cost(v, root, chord_type) for v in options])
+              for options, (root, chord_type) in zip(candidates, chords)]
+    cost = static[0]
+    back = []
+    for i in range(1, len(chords)):
+        previous, current = candidates[i - 1], candidates[i]
+        transitions = np.array([[transition_cost(p, c) for c in current] for p in previous])
+        total = cost[:, None] + transitions
+        best = total.argmin(axis=0)
+        back.append(best)
+        cost = total[best, np.arange(len(current))] + static[i]
+    choice = int(cost.argmin())
+    path = [choice]
+    for best in reversed(back):
+        choice = int(best[choice])
+        path.append(choice)
+    path.reverse()
+    return [list(candidates[i][j]) for i, j in enumerate(path)]
+
+def total_movement(voicings: list[list[int]]) -> float:
+    return sum(transition_cost(tuple(a), tuple(b)) for a, b in zip(voicings, voicings[1:]))
+
+def benchmark(n: int = 500):
+    """Vozeia uma progressão longa e compara o movimento total com os acordes em posição fundamental."""
+    scale_notes = loop_generator.get_scale_notes('C', 'major', octave=4)
+    cycle = [(2, 'minor7'), (5, 'dominant7'), (1, 'major7'), (6, 'minor7'), (4, 'major7'), (7, 'minor7'), (3, 'minor7'), (6, 'dominant7')]
+    chords = [(scale_notes[degree - 1], chord_type) for degree, chord_type in (cycle * (n // len(cycle) + 1))[:n]]
+    for length in (n // 4, n // 2, n):
+        candidate_voicings.cache_clear(); voicing_cost.cache_clear(); transition_cost.cache_clear()
+        started = time.perf_counter()
+        voicings = voice_progression(chords[:length])
+        elapsed = time.perf_counter() - started
+        print(f"{length:>5} acordes: {elapsed * 1000:.1f} ms ({elapsed / length * 1e6:.0f} µs/acorde)")
+    root_position = [loop_generator.get_chord_notes(root, chord_type) for root, chord_type in chords]
+    print(f"Movimento médio por troca: {total_movement(voicings) / (n - 1):.1f} semitons "
+          f"(posição fundamental: {total_movement(root_position) / (n - 1):.1f}).")
+
+if __name__ == "__main__":
+    # Uso: python voice_leading.py [acordes]
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500)